@@ -4,18 +4,19 @@ from sqlalchemy import pool
 from alembic import context
 
 from image_bot.database.base import Base
-from image_bot.config import Config
+from image_bot.config import get_config
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
 
 # Load our project configuration
-project_config = Config()
+project_config = get_config()
 db_config = project_config.database
 
 # Override sqlalchemy.url in alembic.ini
-config.set_main_option('sqlalchemy.url', db_config.url.replace('+asyncpg', ''))
+# (% from the quoted password is doubled: alembic.ini options use configparser interpolation)
+config.set_main_option('sqlalchemy.url', db_config.url.replace('+asyncpg', '').replace('%', '%%'))
 
 # Interpret the config file for Python logging.
 if config.config_file_name is not None:
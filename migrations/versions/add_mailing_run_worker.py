@@ -0,0 +1,25 @@
+"""add_mailing_run_worker
+
+Revision ID: add_mailing_run_worker
+Revises: add_scheduler_leases
+Create Date: 2026-10-17 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_mailing_run_worker'
+down_revision = 'add_scheduler_leases'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Воркер, выполняющий рассылку: прерванные рассылки выбывших воркеров забирают живые
+    op.add_column('mailing_runs', sa.Column('worker_id', sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('mailing_runs', 'worker_id')
@@ -0,0 +1,63 @@
+"""add_mailing_runs
+
+Revision ID: add_mailing_runs
+Revises: messages_to_jsonb
+Create Date: 2026-10-17 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_mailing_runs'
+down_revision = 'messages_to_jsonb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Изображения хранятся один раз на срабатывание группы, рассылки в каналы ссылаются на набор
+    op.create_table(
+        'mailing_batches',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.Column('images', postgresql.ARRAY(sa.LargeBinary()), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('digest')
+    )
+    # Шаги рассылок: продолжение после перезапуска и защита от повторной отправки
+    op.create_table(
+        'mailing_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('idempotency_key', sa.String(), nullable=False),
+        sa.Column('schedule_id', sa.Integer(), nullable=True),
+        sa.Column('channel_id', sa.Integer(), nullable=False),
+        sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+        sa.Column('fire_at', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('params', postgresql.JSONB(), nullable=False),
+        sa.Column('plan', postgresql.JSONB(), nullable=True),
+        sa.Column('batch_id', sa.Integer(), nullable=True),
+        sa.Column('next_step', sa.Integer(), nullable=False),
+        sa.Column('sending_step', sa.Integer(), nullable=True),
+        sa.Column('message_ids', postgresql.JSONB(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['schedule_id'], ['schedules.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['batch_id'], ['mailing_batches.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('idempotency_key')
+    )
+    op.create_index(
+        'ix_mailing_runs_running', 'mailing_runs', ['fire_at'],
+        postgresql_where=sa.text("status = 'running'")
+    )
+
+
+def downgrade():
+    op.drop_index('ix_mailing_runs_running', table_name='mailing_runs')
+    op.drop_table('mailing_runs')
+    op.drop_table('mailing_batches')
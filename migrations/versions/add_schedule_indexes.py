@@ -0,0 +1,31 @@
+"""add_schedule_indexes
+
+Revision ID: add_schedule_indexes
+Revises: add_template_field
+Create Date: 2026-10-17 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_schedule_indexes'
+down_revision = 'add_template_field'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Частичный индекс для выборки активных расписаний планировщиком
+    op.create_index(
+        'ix_schedules_enabled_time_of_day', 'schedules', ['time_of_day'],
+        postgresql_where=sa.text('enabled')
+    )
+    # Расписания канала; покрывает и внешний ключ channel_id (каскадное удаление канала)
+    op.create_index('ix_schedules_channel_id_time_of_day', 'schedules', ['channel_id', 'time_of_day'])
+
+
+def downgrade():
+    op.drop_index('ix_schedules_channel_id_time_of_day', table_name='schedules')
+    op.drop_index('ix_schedules_enabled_time_of_day', table_name='schedules')
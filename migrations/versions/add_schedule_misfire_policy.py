@@ -0,0 +1,35 @@
+"""add_schedule_misfire_policy
+
+Revision ID: add_schedule_misfire_policy
+Revises: add_mailing_run_worker
+Create Date: 2026-10-17 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_schedule_misfire_policy'
+down_revision = 'add_mailing_run_worker'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Политика пропущенных рассылок и время последней выполненной рассылки
+    op.add_column('schedules', sa.Column('misfire_policy', sa.String(length=16), nullable=True))
+    op.add_column('schedules', sa.Column('misfire_grace_seconds', sa.Integer(), nullable=True))
+    op.add_column('schedules', sa.Column('last_fired_at', sa.DateTime(), nullable=True))
+    # Уже выполненные рассылки не должны считаться пропущенными после обновления
+    op.execute(
+        "UPDATE schedules SET last_fired_at = runs.fire_at "
+        "FROM (SELECT schedule_id, max(fire_at) AS fire_at FROM mailing_runs GROUP BY schedule_id) AS runs "
+        "WHERE runs.schedule_id = schedules.id"
+    )
+
+
+def downgrade():
+    op.drop_column('schedules', 'last_fired_at')
+    op.drop_column('schedules', 'misfire_grace_seconds')
+    op.drop_column('schedules', 'misfire_policy')
@@ -0,0 +1,31 @@
+"""add_scheduler_leases
+
+Revision ID: add_scheduler_leases
+Revises: add_mailing_runs
+Create Date: 2026-10-17 13:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_scheduler_leases'
+down_revision = 'add_mailing_runs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Аренда роли лидера планировщика между репликами бота
+    op.create_table(
+        'scheduler_leases',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('holder', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('scheduler_leases')
@@ -0,0 +1,63 @@
+"""messages_to_jsonb
+
+Revision ID: messages_to_jsonb
+Revises: add_schedule_indexes
+Create Date: 2026-10-17 11:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'messages_to_jsonb'
+down_revision = 'add_schedule_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Сообщения хранились строкой с JSON; строки, которые не разбираются как
+    # JSON-массив (в том числе "[VIP] ..." - начинаются с "[", но не JSON),
+    # переносятся так же, как их раньше разбирала рассылка: [текст, "", ""].
+    # Приведение к jsonb в USING нельзя обернуть в обработку ошибок, поэтому
+    # разбор идет через временную функцию
+    op.execute("""
+        CREATE FUNCTION messages_to_jsonb(messages text) RETURNS jsonb AS $$
+        DECLARE
+            parsed jsonb;
+        BEGIN
+            IF messages IS NULL THEN
+                RETURN NULL;
+            END IF;
+            BEGIN
+                parsed := messages::jsonb;
+            EXCEPTION WHEN invalid_text_representation OR untranslatable_character THEN
+                parsed := NULL;
+            END;
+            IF parsed IS NOT NULL AND jsonb_typeof(parsed) = 'array' THEN
+                RETURN parsed;
+            END IF;
+            RETURN jsonb_build_array(messages, '', '');
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE
+    """)
+    op.alter_column(
+        'schedules', 'messages',
+        type_=postgresql.JSONB(),
+        existing_type=sa.String(),
+        existing_nullable=True,
+        postgresql_using='messages_to_jsonb(messages)'
+    )
+    op.execute('DROP FUNCTION messages_to_jsonb(text)')
+
+
+def downgrade():
+    op.alter_column(
+        'schedules', 'messages',
+        type_=sa.String(),
+        existing_type=postgresql.JSONB(),
+        existing_nullable=True,
+        postgresql_using='messages::text'
+    )
@@ -0,0 +1,127 @@
+"""Бенчмарк запросов планировщика и обработчиков на синтетических данных
+
+Создает во временной схеме 10k каналов, 100k расписаний и пользователей,
+выполняет EXPLAIN ANALYZE для основных запросов без индексов и с индексами
+из миграции add_schedule_indexes, затем удаляет схему.
+
+Запуск (подключение из переменных DB_* как у бота):
+    PYTHONPATH=src python scripts/benchmark_queries.py --channels 10000 --schedules 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from image_bot.config import get_config
+from image_bot.database.base import Base
+import image_bot.database.models  # noqa: F401 - регистрирует модели в Base.metadata
+
+INDEXES = ('ix_schedules_enabled_time_of_day', 'ix_schedules_channel_id_time_of_day')
+
+QUERIES = {
+    # SchedulerService.load_schedules -> MailingService.get_active_schedules
+    'active schedules': "SELECT * FROM schedules WHERE enabled",
+    # Окно ближайших рассылок с telegram_id канала
+    'due window': (
+        "SELECT s.id, s.time_of_day, c.telegram_id FROM schedules s JOIN channels c ON c.id = s.channel_id "
+        "WHERE s.enabled AND s.time_of_day >= '12:00' AND s.time_of_day < '12:01'"
+    ),
+    # list_schedules_command -> fetch_schedule_page: keyset по id, страница из середины списка
+    'list schedules': (
+        "SELECT * FROM schedules s JOIN channels c ON s.channel_id = c.id "
+        "WHERE s.id > 50000 ORDER BY s.id LIMIT 11"
+    ),
+    # Расписания одного канала
+    'channel schedules': "SELECT * FROM schedules WHERE channel_id = 5000 ORDER BY time_of_day",
+    # Проверка авторизации на каждое обновление
+    'user by telegram_id': "SELECT * FROM users WHERE telegram_id = 1000500",
+}
+
+
+async def seed(conn, channels: int, schedules: int, users: int):
+    await conn.execute(text(
+        "INSERT INTO channels (telegram_id, title, is_active) "
+        "SELECT -1000000000000 - g, 'Channel ' || g, true FROM generate_series(1, :n) g"
+    ), {'n': channels})
+    await conn.execute(text(
+        "INSERT INTO schedules (channel_id, time_of_day, messages, message_delay_seconds, image_delay_seconds, "
+        "images_count, bet_amount, enabled, template) "
+        "SELECT 1 + (g % :channels), make_time((g % 1440) / 60, g % 60, 0), '[\"a\",\"b\",\"c\"]', 60, 60, 5, 100, "
+        "g % 10 <> 0, 'lkr' FROM generate_series(1, :n) g"
+    ), {'n': schedules, 'channels': channels})
+    await conn.execute(text(
+        "INSERT INTO users (telegram_id, username, is_admin, is_authorized) "
+        "SELECT 1000000 + g, 'user' || g, false, g % 2 = 0 FROM generate_series(1, :n) g"
+    ), {'n': users})
+    await conn.execute(text("ANALYZE"))
+
+
+def scan_nodes(plan: dict) -> list:
+    """Узлы чтения таблиц в плане: 'Index Scan on schedules' и т.п."""
+    nodes = []
+    if plan['Node Type'].endswith('Scan') and 'Relation Name' in plan:
+        nodes.append(f"{plan['Node Type']} on {plan['Relation Name']}")
+    for child in plan.get('Plans', []):
+        nodes.extend(scan_nodes(child))
+    return nodes
+
+
+async def explain(conn, sql: str, runs: int) -> tuple:
+    """Медиана Execution Time (мс) и способы чтения таблиц"""
+    timings = []
+    plan = None
+    for _ in range(runs):
+        result = await conn.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}"))
+        plan = result.scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        timings.append(plan[0]['Execution Time'])
+    return statistics.median(timings), ', '.join(scan_nodes(plan[0]['Plan']))
+
+
+async def report(conn, title: str, runs: int):
+    print(f"\n{title}")
+    for name, sql in QUERIES.items():
+        timing, node = await explain(conn, sql, runs)
+        print(f"  {name:<22} {timing:9.3f} ms  {node}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--channels', type=int, default=10000)
+    parser.add_argument('--schedules', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    schema = f"bench_{os.getpid()}"
+    engine = create_async_engine(
+        get_config().database.url,
+        connect_args={'server_settings': {'search_path': schema}}
+    )
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"CREATE SCHEMA {schema}"))
+            await conn.run_sync(Base.metadata.create_all)
+            for index in INDEXES:
+                await conn.execute(text(f"DROP INDEX {index}"))
+            await seed(conn, args.channels, args.schedules, args.users)
+
+        async with engine.begin() as conn:
+            await report(conn, "Without schedule indexes", args.runs)
+            await conn.run_sync(lambda sync_conn: [
+                index.create(sync_conn) for index in Base.metadata.tables['schedules'].indexes
+            ])
+            await conn.execute(text("ANALYZE schedules"))
+            await report(conn, "With schedule indexes", args.runs)
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -17,6 +17,7 @@ from image_bot.database.base import init_db, get_session
 from image_bot.services.mailing_service import MailingService
 from image_bot.services.scheduler_service import SchedulerService
 from image_bot.utils.logger import logger
+from image_bot.utils.rate_limiter import TelegramRateLimiter
 
 
 class Bot:
@@ -215,7 +216,13 @@ class Bot:
             await init_db()
 
             # Создаем приложение
-            self.application = Application.builder().token(self.config.bot.token).build()
+            rate_limit = self.config.rate_limit
+            self.application = Application.builder().token(self.config.bot.token).rate_limiter(TelegramRateLimiter(
+                global_rate=rate_limit.global_rate,
+                chat_rate_per_minute=rate_limit.chat_rate_per_minute,
+                interactive_reserve=rate_limit.interactive_reserve,
+                max_retries=rate_limit.max_retries
+            )).build()
 
             # Инициализируем сервисы
             # Передаем фабрику сессий (Session), чтобы сервисы создавали короткоживущие сессии сами
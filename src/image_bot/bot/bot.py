@@ -1,15 +1,22 @@
 import asyncio
 from telegram.ext import ApplicationBuilder
-from image_bot.config import Config
+from image_bot.config import get_config
 from image_bot.handlers import setup_handlers
 from image_bot.services.scheduler_service import SchedulerService
 from image_bot.database.base import Session
+from image_bot.utils.rate_limiter import TelegramRateLimiter
 
-config = Config()
+config = get_config()
 bot_token = config.config_data['telegram']['token']
 
-# Создаем приложение
-bot = ApplicationBuilder().token(bot_token).build()
+# Создаем приложение (все запросы к Bot API проходят через общий ограничитель)
+rate_limit = config.rate_limit
+bot = ApplicationBuilder().token(bot_token).rate_limiter(TelegramRateLimiter(
+    global_rate=rate_limit.global_rate,
+    chat_rate_per_minute=rate_limit.chat_rate_per_minute,
+    interactive_reserve=rate_limit.interactive_reserve,
+    max_retries=rate_limit.max_retries
+)).build()
 
 # Настраиваем обработчики
 setup_handlers(bot)
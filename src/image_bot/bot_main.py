@@ -1,41 +1,100 @@
 import asyncio
 from loguru import logger
-from image_bot.database.base import Base, engine, Session
+from image_bot.database.base import Base, engine, Session, log_engine_settings
 from image_bot.bot.bot import bot
 from image_bot.services.scheduler_service import SchedulerService
-from image_bot.config import Config
+from image_bot.services.render_service import get_render_service
+from image_bot.config import get_config
 from image_bot.utils.cleanup import schedule_cleanup
+from image_bot.services.channel_titles import get_channel_title_cache
+from image_bot.services.leader_election import get_leader_election, get_polling_election
+from image_bot.services.sharding import get_shard_membership
+from image_bot.services.change_events import get_change_listener, ENTITY_CHANNEL, ENTITY_USER
+from image_bot.services.auth_cache import get_auth_cache
 
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+async def poll_while_leader(updater, election):
+    """Опрашивает Telegram, пока держит аренду getUpdates или база недоступна (SINGLE_POLLER)
+
+    Параллельные getUpdates получают 409 Conflict, а состояние диалогов
+    (ConversationHandler, user_data) хранится в памяти процесса, поэтому
+    обновления обрабатывает одна реплика. Если аренду нельзя проверить,
+    реплика опрашивает сама: лучше 409 между репликами, чем бот без ответов.
+    """
+    try:
+        while True:
+            should_poll = election.is_leader or not election.reachable
+            if should_poll and not updater.running:
+                await updater.start_polling()
+                logger.info("Polling Telegram updates on this replica")
+            elif not should_poll and updater.running:
+                await updater.stop()
+                logger.info("Stopped polling: updates lease is held by another replica")
+            await asyncio.sleep(election.renew_interval)
+    finally:
+        if updater.running:
+            await updater.stop()
+
 async def main():
     try:
         # Create tables
+        log_engine_settings()
         await init_db()
         logger.info("Database tables created successfully")
 
+        # Start render workers (templates and fonts are loaded once per worker)
+        await get_render_service().start()
+
         # Start the bot
         await bot.initialize()
         await bot.start()
         logger.info("Bot started successfully")
         
         # Initialize scheduler (передаём фабрику сессий)
-        config = Config()
-        scheduler = SchedulerService(bot, Session, config)
+        config = get_config()
+        # Рассылки выполняет лидер (или все реплики, каждая для своих каналов)
+        if config.scheduler_sharding:
+            election = get_shard_membership()
+        elif config.leader_election:
+            election = get_leader_election()
+        else:
+            election = None
+        election_task = asyncio.create_task(election.run()) if election else None
+        # Изменения от других реплик: индекс расписаний, права пользователей, названия каналов
+        listener = get_change_listener() if config.change_notifications else None
+        listener_task = None
+        if listener:
+            listener.subscribe(ENTITY_USER, get_auth_cache().on_change)
+            listener.subscribe(ENTITY_CHANNEL, get_channel_title_cache().on_change)
+            listener_task = asyncio.create_task(listener.run())
+        scheduler = SchedulerService(bot, Session, config, election, listener)
         
         # Start scheduler in background
         scheduler_task = asyncio.create_task(scheduler.run())
         logger.info("Scheduler started successfully")
         
-        # Start cleanup scheduler in background (очистка в 00:00)
-        cleanup_task = asyncio.create_task(schedule_cleanup(hour=0, minute=0))
-        logger.info("Cleanup scheduler started successfully")
+        # Start cleanup scheduler in background (очистка в 00:00) - только если изображения пишутся на диск
+        cleanup_task = None
+        if config.save_generated_images:
+            cleanup_task = asyncio.create_task(schedule_cleanup(hour=0, minute=0))
+            logger.info("Cleanup scheduler started successfully")
+
+        # Keep channel titles warm for the channels menu
+        titles_task = asyncio.create_task(get_channel_title_cache().run(bot.bot))
         
         # Run the bot
         logger.info("Bot is running...")
-        await bot.updater.start_polling()
+        polling_task = polling_election_task = None
+        if config.single_poller:
+            # Опрос не зависит от аренды планировщика
+            polling_election = get_polling_election()
+            polling_election_task = asyncio.create_task(polling_election.run())
+            polling_task = asyncio.create_task(poll_while_leader(bot.updater, polling_election))
+        else:
+            await bot.updater.start_polling()
 
         # Wait for termination
         stop_signal = asyncio.Event()
@@ -43,10 +102,20 @@ async def main():
         
         # Cancel scheduler task
         scheduler_task.cancel()
-        cleanup_task.cancel()
+        if cleanup_task:
+            cleanup_task.cancel()
+        titles_task.cancel()
+        if polling_task:
+            polling_task.cancel()
+            polling_election_task.cancel()
+        if election_task:
+            election_task.cancel()
+        if listener_task:
+            listener_task.cancel()
         try:
             await scheduler_task
-            await cleanup_task
+            if cleanup_task:
+                await cleanup_task
         except asyncio.CancelledError:
             pass
 
@@ -60,6 +129,7 @@ async def main():
             await bot.updater.stop()
         if bot.running:
             await bot.stop()
+        get_render_service().shutdown()
         logger.info("Bot stopped successfully")
 
 def run():
@@ -1,16 +1,24 @@
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Mapping
+from types import MappingProxyType
+from functools import lru_cache
 import os
+import time
+from urllib.parse import quote
 from yaml import safe_load
 from dotenv import load_dotenv
 from dataclasses import dataclass
 
 load_dotenv()
 
-@dataclass
+# Как часто (в секундах) проверять mtime config.yaml для горячей перезагрузки
+CONFIG_RELOAD_INTERVAL = 5
+
+
+@dataclass(frozen=True)
 class BotConfig:
     token: str
-    admin_ids: list[int]
+    admin_ids: tuple[int, ...]
 
 @dataclass
 class DatabaseConfig:
@@ -19,21 +27,125 @@ class DatabaseConfig:
     name: str
     user: str
     password: str
+    pool_size: int = 10  # постоянные соединения пула
+    max_overflow: int = 20  # дополнительные соединения при всплеске рассылок
+    pool_timeout: float = 30  # сколько ждать свободное соединение, секунд
+    pool_recycle: int = 1800  # пересоздавать соединения старше N секунд
+    pool_pre_ping: bool = True  # проверять соединение перед выдачей из пула
+    statement_cache_size: int = 100  # кеш подготовленных выражений asyncpg (0 - для pgbouncer)
+    statement_timeout_ms: int = 0  # statement_timeout на сервере, 0 - без ограничения
+    echo: bool = False  # логировать SQL (только для отладки)
+
+    def _credentials(self) -> str:
+        """Логин и пароль для URL
+
+        Экранируются: символы @, / и : в пароле иначе ломают разбор URL.
+        Не заданные DB_USER/DB_PASSWORD дают пустую строку.
+        """
+        return f"{quote(self.user or '', safe='')}:{quote(self.password or '', safe='')}"
 
     @property
     def url(self) -> str:
-        return f"postgresql+asyncpg://{self.user}:{self.password}@{self.host}:{self.port}/{self.name}"
+        return f"postgresql+asyncpg://{self._credentials()}@{self.host}:{self.port}/{self.name}"
+
+    @property
+    def dsn(self) -> str:
+        """DSN для прямого подключения asyncpg (LISTEN на отдельном соединении)"""
+        return f"postgresql://{self._credentials()}@{self.host}:{self.port}/{self.name}"
+
+    @property
+    def safe_url(self) -> str:
+        """URL без пароля для логов"""
+        return f"postgresql+asyncpg://{quote(self.user or '', safe='')}@{self.host}:{self.port}/{self.name}"
+
+@dataclass(frozen=True)
+class RateLimitConfig:
+    """Лимиты Bot API для исходящих сообщений"""
+    global_rate: float  # сообщений в секунду на весь бот
+    chat_rate_per_minute: float  # сообщений в минуту в одну группу/канал
+    interactive_reserve: float  # токены общего лимита, которые рассылки оставляют для ответов пользователям
+    max_retries: int  # сколько раз повторять запрос после RetryAfter
+
+@dataclass(frozen=True)
+class NumberRange:
+    min: int
+    max: int
+
+@dataclass(frozen=True)
+class NumberRanges:
+    """Диапазоны для генерации основного числа в формате 9.99x"""
+    first_number: NumberRange
+    second_number: NumberRange
+
+
+def _freeze(value):
+    """Recursively convert parsed YAML into read-only mappings and tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class _ConfigFile:
+    """YAML file parsed once and re-read only when its mtime changes"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._data = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    @property
+    def data(self) -> Mapping[str, Any]:
+        now = time.monotonic()
+        if self._data is not None and now - self._checked_at < CONFIG_RELOAD_INTERVAL:
+            return self._data
+
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            if self._data is not None:
+                # Файл временно недоступен - продолжаем работать со старой версией
+                return self._data
+            raise
+
+        if mtime != self._mtime:
+            with open(self.path, 'r') as f:
+                self._data = _freeze(safe_load(f))
+            self._mtime = mtime
+        return self._data
+
+
+@lru_cache(maxsize=None)
+def _config_file(path: str) -> _ConfigFile:
+    return _ConfigFile(Path(path))
+
 
 class Config:
     def __init__(self):
         self.BASE_DIR = Path(__file__).parent
-        self.config_data = self._load_config()
+        self.config_path = os.getenv('CONFIG_PATH', self.BASE_DIR / "static/config.yaml")
+        self._derived = {}
+
+    @property
+    def config_data(self) -> Mapping[str, Any]:
+        """Read-only snapshot of config.yaml, shared by all Config instances"""
+        return _config_file(str(self.config_path)).data
 
     def _load_config(self) -> Dict[str, Any]:
         """Load configuration from YAML file"""
-        config_path = os.getenv('CONFIG_PATH', self.BASE_DIR / "static/config.yaml")
-        with open(config_path, 'r') as f:
-            return safe_load(f)
+        return self.config_data
+
+    def _derive(self, name: str, factory):
+        """Cache value built from the current config snapshot until the file changes"""
+        data = self.config_data
+        cached = self._derived.get(name)
+        if cached is None or cached[0] is not data:
+            cached = (data, factory(data))
+            self._derived[name] = cached
+        return cached[1]
 
     @property
     def base_image_path(self) -> Path:
@@ -44,42 +156,169 @@ class Config:
         return Path(os.getenv('OUTPUT_DIR', self.BASE_DIR / "output"))
 
     @property
-    def generation_settings(self) -> Dict[str, Any]:
+    def save_generated_images(self) -> bool:
+        """Сохранять ли сгенерированные изображения в output_dir (для отладки/аудита)"""
+        return os.getenv('SAVE_GENERATED_IMAGES', '').lower() in ('1', 'true', 'yes')
+
+    @property
+    def auth_cache_ttl(self) -> float:
+        """Сколько секунд хранить права пользователя в памяти"""
+        return float(os.getenv('AUTH_CACHE_TTL', '300'))
+
+    @property
+    def channel_title_ttl(self) -> float:
+        """Сколько секунд считать название канала из Telegram актуальным"""
+        return float(os.getenv('CHANNEL_TITLE_TTL', '600'))
+
+    @property
+    def channel_refresh_concurrency(self) -> int:
+        """Сколько запросов get_chat выполнять одновременно при обновлении названий каналов"""
+        return int(os.getenv('CHANNEL_REFRESH_CONCURRENCY', '10'))
+
+    @property
+    def photo_cache_size(self) -> int:
+        """Сколько file_id загруженных изображений держать в памяти"""
+        return int(os.getenv('PHOTO_CACHE_SIZE', '1000'))
+
+    @property
+    def mailing_resume_minutes(self) -> int:
+        """Сколько минут после запланированного времени прерванную рассылку можно продолжить"""
+        return int(os.getenv('MAILING_RESUME_MINUTES', '30'))
+
+    @property
+    def mailing_runs_keep_days(self) -> int:
+        """Сколько дней хранить завершенные записи mailing_runs"""
+        return int(os.getenv('MAILING_RUNS_KEEP_DAYS', '7'))
+
+    @property
+    def leader_election(self) -> bool:
+        """Выбирать одного лидера планировщика среди реплик (через таблицу scheduler_leases)"""
+        return os.getenv('SCHEDULER_LEADER_ELECTION', '').lower() in ('1', 'true', 'yes')
+
+    @property
+    def single_poller(self) -> bool:
+        """Опрашивать Telegram только с одной реплики (держатель аренды 'updates')"""
+        return os.getenv('SINGLE_POLLER', '').lower() in ('1', 'true', 'yes')
+
+    @property
+    def leader_lease_seconds(self) -> float:
+        """Срок аренды лидера: за это время реплика заменяет упавшего лидера"""
+        return float(os.getenv('LEADER_LEASE_SECONDS', '15'))
+
+    @property
+    def scheduler_sharding(self) -> bool:
+        """Распределять расписания между всеми репликами по channel_id (вместо одного лидера)"""
+        return os.getenv('SCHEDULER_SHARDING', '').lower() in ('1', 'true', 'yes')
+
+    @property
+    def shard_virtual_nodes(self) -> int:
+        """Количество точек каждого воркера на кольце консистентного хеширования"""
+        return int(os.getenv('SHARD_VIRTUAL_NODES', '64'))
+
+    @property
+    def change_notifications(self) -> bool:
+        """Получать изменения расписаний, каналов и пользователей через LISTEN/NOTIFY"""
+        return os.getenv('CHANGE_NOTIFICATIONS', 'true').lower() in ('1', 'true', 'yes')
+
+    @property
+    def fire_dedupe_hours(self) -> float:
+        """Сколько часов помнить выполненные срабатывания расписаний"""
+        return float(os.getenv('FIRE_DEDUPE_HOURS', '26'))
+
+    @property
+    def misfire_policy(self) -> str:
+        """Политика для пропущенных рассылок по умолчанию: skip, fire_late или next_slot"""
+        from image_bot.services.misfire import validate_policy
+        return validate_policy(os.getenv('MISFIRE_POLICY', 'skip'))
+
+    @property
+    def misfire_grace_seconds(self) -> int:
+        """Допустимое опоздание пропущенной рассылки по умолчанию, секунд"""
+        return int(os.getenv('MISFIRE_GRACE_SECONDS', '900'))
+
+    @property
+    def render_workers(self) -> int:
+        """Количество процессов для генерации изображений"""
+        default = max(1, (os.cpu_count() or 2) - 1)
+        return int(os.getenv('RENDER_WORKERS', default))
+
+    @property
+    def render_queue_size(self) -> int:
+        """Максимум наборов изображений в очереди на рендеринг (0 - по числу воркеров x2)"""
+        return int(os.getenv('RENDER_QUEUE_SIZE', '0'))
+
+    @property
+    def prerender_minutes(self) -> int:
+        """За сколько минут до рассылки заранее генерировать изображения (0 - отключено)"""
+        return int(os.getenv('PRERENDER_MINUTES', '0'))
+
+    @property
+    def schedule_reload_minutes(self) -> int:
+        """Как часто (в минутах) планировщик полностью перечитывает расписания из базы (0 - только при старте)"""
+        return int(os.getenv('SCHEDULE_RELOAD_MINUTES', '10'))
+
+    @property
+    def generation_settings(self) -> Mapping[str, Any]:
         return self.config_data['generation_settings']
 
     @property
-    def main_number_settings(self) -> Dict[str, Any]:
+    def number_ranges(self) -> NumberRanges:
+        """Typed number ranges from generation_settings"""
+        def build(data):
+            ranges = data['generation_settings']['number_ranges']
+            return NumberRanges(
+                first_number=NumberRange(**ranges['first_number']),
+                second_number=NumberRange(**ranges['second_number'])
+            )
+        return self._derive('number_ranges', build)
+
+    @property
+    def main_number_settings(self) -> Mapping[str, Any]:
         return self.config_data['main_number']
 
     @property
-    def subtracted_number_settings(self) -> Dict[str, Any]:
+    def subtracted_number_settings(self) -> Mapping[str, Any]:
         return self.config_data['subtracted_number']
 
     @property
-    def multiplied_number_settings(self) -> Dict[str, Any]:
+    def multiplied_number_settings(self) -> Mapping[str, Any]:
         return self.config_data['multiplied_number']
 
     @property
-    def fail_image_settings(self) -> Dict[str, Any]:
+    def fail_image_settings(self) -> Mapping[str, Any]:
         return self.config_data['fail_image']
 
     @property
     def bot(self) -> BotConfig:
         """Настройки бота"""
+        return self._derive('bot', self._build_bot_config)
+
+    @staticmethod
+    def _build_bot_config(data) -> BotConfig:
         # Получаем токен из конфига или переменной окружения
-        token = os.getenv('BOT_TOKEN', self.config_data['telegram']['token'])
-        
+        token = os.getenv('BOT_TOKEN', data['telegram']['token'])
+
         # Получаем список админов из переменной окружения
         admin_ids_str = os.getenv('BOT_ADMIN_IDS', '')
         admin_ids = [int(id.strip()) for id in admin_ids_str.split(',') if id.strip()]
-        
+
         # Если список пуст, берем из конфига
-        if not admin_ids and 'admin_ids' in self.config_data['telegram']:
-            admin_ids = self.config_data['telegram']['admin_ids']
-        
+        if not admin_ids and 'admin_ids' in data['telegram']:
+            admin_ids = data['telegram']['admin_ids']
+
         return BotConfig(
             token=token,
-            admin_ids=admin_ids
+            admin_ids=tuple(admin_ids)
+        )
+
+    @property
+    def rate_limit(self) -> RateLimitConfig:
+        """Лимиты отправки сообщений из переменных окружения"""
+        return RateLimitConfig(
+            global_rate=float(os.getenv('TELEGRAM_GLOBAL_RATE', '30')),
+            chat_rate_per_minute=float(os.getenv('TELEGRAM_CHAT_RATE_PER_MINUTE', '20')),
+            interactive_reserve=float(os.getenv('TELEGRAM_INTERACTIVE_RESERVE', '5')),
+            max_retries=int(os.getenv('TELEGRAM_RETRY_AFTER_ATTEMPTS', '3'))
         )
 
     @property
@@ -90,5 +329,19 @@ class Config:
             port=int(os.getenv('DB_PORT', '5432')),
             name=os.getenv('DB_NAME'),
             user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD')
+            password=os.getenv('DB_PASSWORD'),
+            pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '20')),
+            pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+            pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '1800')),
+            pool_pre_ping=os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+            statement_cache_size=int(os.getenv('DB_STATEMENT_CACHE_SIZE', '100')),
+            statement_timeout_ms=int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0')),
+            echo=os.getenv('DB_ECHO', '').lower() in ('1', 'true', 'yes')
         )
+
+
+@lru_cache(maxsize=None)
+def get_config() -> Config:
+    """Возвращает общий для всего процесса экземпляр Config"""
+    return Config()
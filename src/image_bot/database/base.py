@@ -1,13 +1,44 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
 from sqlalchemy.orm import declarative_base, sessionmaker
-from image_bot.config import Config
+from image_bot.config import get_config, DatabaseConfig
+from image_bot.utils.logger import logger
 
-config = Config()
+config = get_config()
 db_config = config.database
 
 DATABASE_URL = db_config.url
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+
+def create_engine(db_config: DatabaseConfig) -> AsyncEngine:
+    """Создает движок базы данных с настройками пула и asyncpg из DatabaseConfig"""
+    connect_args = {'statement_cache_size': db_config.statement_cache_size}
+    if db_config.statement_timeout_ms > 0:
+        connect_args['server_settings'] = {'statement_timeout': str(db_config.statement_timeout_ms)}
+
+    return create_async_engine(
+        db_config.url,
+        echo=db_config.echo,
+        pool_size=db_config.pool_size,
+        max_overflow=db_config.max_overflow,
+        pool_timeout=db_config.pool_timeout,
+        pool_recycle=db_config.pool_recycle,
+        pool_pre_ping=db_config.pool_pre_ping,
+        connect_args=connect_args
+    )
+
+
+def log_engine_settings(db_config: DatabaseConfig = db_config):
+    """Пишет в лог действующие настройки подключения (без пароля)"""
+    logger.info(
+        f"[DATABASE] {db_config.safe_url}: pool_size={db_config.pool_size}, "
+        f"max_overflow={db_config.max_overflow}, pool_timeout={db_config.pool_timeout}s, "
+        f"pool_recycle={db_config.pool_recycle}s, pre_ping={db_config.pool_pre_ping}, "
+        f"statement_cache_size={db_config.statement_cache_size}, "
+        f"statement_timeout={db_config.statement_timeout_ms or 'off'}ms, echo={db_config.echo}"
+    )
+
+
+engine = create_engine(db_config)
 Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
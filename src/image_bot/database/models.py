@@ -1,7 +1,8 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, BigInteger, ForeignKey, Time
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, BigInteger, ForeignKey, Time, Index, LargeBinary, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from .base import Base
 
 
@@ -43,7 +44,7 @@ class Schedule(Base):
     id = Column(Integer, primary_key=True)
     channel_id = Column(Integer, ForeignKey('channels.id'), nullable=False)
     time_of_day = Column(Time, nullable=False)  # Время рассылки
-    messages = Column(String, nullable=True)  # Список сообщений в формате JSON
+    messages = Column(JSONB, nullable=True)  # Список из трех сообщений (приветствие, сигнал, итог)
     message_delay_seconds = Column(Integer, default=60)  # Задержка между сообщениями
     image_delay_seconds = Column(Integer, default=60)  # Задержка перед отправкой изображений
     images_count = Column(Integer, default=5)  # Количество изображений для отправки
@@ -54,10 +55,76 @@ class Schedule(Base):
     between_signals_seconds = Column(Integer, default=25)  # Задержка между сигналами
     last_signal_to_summary_seconds = Column(Integer, default=40)  # Задержка между последним сигналом и итогами
     template = Column(String, default="lkr")  # Шаблон страны для генерации изображений
+    misfire_policy = Column(String(16), nullable=True)  # skip/fire_late/next_slot, None - MISFIRE_POLICY из конфига
+    misfire_grace_seconds = Column(Integer, nullable=True)  # Допустимое опоздание, None - MISFIRE_GRACE_SECONDS
+    last_fired_at = Column(DateTime, nullable=True)  # Запланированное время последней выполненной рассылки
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     channel = relationship('Channel', backref='schedules')
 
+    __table_args__ = (
+        # Планировщик выбирает только активные расписания по времени
+        Index('ix_schedules_enabled_time_of_day', 'time_of_day', postgresql_where=text('enabled')),
+        # Расписания канала (список, удаление канала)
+        Index('ix_schedules_channel_id_time_of_day', 'channel_id', 'time_of_day'),
+    )
+
     def __repr__(self):
         return f"<Schedule(channel_id={self.channel_id}, time={self.time_of_day}, messages={self.messages})>"
+
+
+class MailingBatch(Base):
+    """Набор изображений одного срабатывания, общий для всех каналов группы рассылки"""
+    __tablename__ = 'mailing_batches'
+
+    id = Column(Integer, primary_key=True)
+    digest = Column(String(64), unique=True, nullable=False)  # sha256 изображений набора
+    images = Column(ARRAY(LargeBinary), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<MailingBatch(id={self.id}, images={len(self.images or ())})>"
+
+
+class MailingRun(Base):
+    """Ход одной рассылки в канал: выполненные шаги, чтобы продолжить ее после перезапуска"""
+    __tablename__ = 'mailing_runs'
+
+    id = Column(Integer, primary_key=True)
+    idempotency_key = Column(String, unique=True, nullable=False)  # "<schedule_id>:<время рассылки>"
+    schedule_id = Column(Integer, ForeignKey('schedules.id', ondelete='SET NULL'), nullable=True)
+    channel_id = Column(Integer, nullable=False)  # channels.id
+    telegram_id = Column(BigInteger, nullable=False)  # ID канала в Telegram
+    fire_at = Column(DateTime, nullable=False)  # Запланированное время рассылки (локальное)
+    status = Column(String(16), nullable=False, default='running')  # running/completed/failed/abandoned
+    worker_id = Column(String, nullable=True)  # Процесс, который выполняет рассылку
+    params = Column(JSONB, nullable=False)  # Сообщения и параметры расписания на момент запуска
+    plan = Column(JSONB, nullable=True)  # Шаги рассылки с готовыми текстами (после генерации изображений)
+    # Изображения незавершенной рассылки (набор удаляется, когда его рассылки завершены)
+    batch_id = Column(Integer, ForeignKey('mailing_batches.id', ondelete='SET NULL'), nullable=True)
+    next_step = Column(Integer, nullable=False, default=0)  # Номер следующего шага
+    sending_step = Column(Integer, nullable=True)  # Шаг, отправка которого начата, но не подтверждена
+    message_ids = Column(JSONB, nullable=False, default=dict)  # Номер шага -> message_id (null - не отправлено)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # Незавершенные рассылки при старте
+        Index('ix_mailing_runs_running', 'fire_at', postgresql_where=text("status = 'running'")),
+    )
+
+    def __repr__(self):
+        return f"<MailingRun(key={self.idempotency_key}, status={self.status}, next_step={self.next_step})>"
+
+
+class SchedulerLease(Base):
+    """Аренда роли (например, лидера планировщика) между репликами бота"""
+    __tablename__ = 'scheduler_leases'
+
+    name = Column(String, primary_key=True)  # Название роли
+    holder = Column(String, nullable=False)  # Идентификатор процесса-владельца
+    expires_at = Column(DateTime(timezone=True), nullable=False)  # До какого времени (по часам базы) аренда действует
+
+    def __repr__(self):
+        return f"<SchedulerLease(name={self.name}, holder={self.holder}, expires_at={self.expires_at})>"
@@ -5,6 +5,8 @@ from sqlalchemy import select
 from image_bot.database.base import Session
 from image_bot.database.models import User
 from image_bot.keyboards.keyboards import get_authorized_keyboard
+from image_bot.services.auth_cache import get_auth_cache
+from image_bot.services.change_events import publish_change, ENTITY_USER
 
 
 async def authorize_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -12,15 +14,9 @@ async def authorize_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     async with Session() as session:
         try:
             # Проверяем, является ли отправитель админом
-            result = await session.execute(
-                select(User).where(
-                    User.telegram_id == update.effective_user.id,
-                    User.is_admin == True
-                )
-            )
-            admin = result.scalar_one_or_none()
+            admin = await get_auth_cache().get(update.effective_user.id)
 
-            if not admin:
+            if not admin or not admin.is_admin:
                 await update.message.reply_text("У вас нет прав для выполнения этой команды.")
                 return
 
@@ -50,12 +46,16 @@ async def authorize_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     is_authorized=True  # Сразу авторизуем
                 )
                 session.add(user)
+                await publish_change(session, ENTITY_USER, user_id)
                 await session.commit()
+                get_auth_cache().invalidate(user_id)
                 logger.info(f"Created and authorized new user with ID {user_id}")
             else:
                 # Авторизуем существующего пользователя
                 user.is_authorized = True
+                await publish_change(session, ENTITY_USER, user_id)
                 await session.commit()
+                get_auth_cache().invalidate(user_id)
                 logger.info(f"Authorized existing user with ID {user_id}")
 
             # Отправляем сообщение админу
@@ -86,15 +86,9 @@ async def manage_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     async with Session() as session:
         try:
             # Проверяем права администратора
-            result = await session.execute(
-                select(User).where(
-                    User.telegram_id == update.effective_user.id,
-                    User.is_admin == True
-                )
-            )
-            admin = result.scalar_one_or_none()
+            admin = await get_auth_cache().get(update.effective_user.id)
 
-            if not admin:
+            if not admin or not admin.is_admin:
                 await update.message.reply_text("У вас нет прав для выполнения этой команды.")
                 return
 
@@ -5,24 +5,30 @@ from sqlalchemy import select
 from image_bot.database.base import Session
 from image_bot.database.models import User
 from image_bot.keyboards.keyboards import get_base_keyboard, get_admin_keyboard, get_authorized_keyboard
-from image_bot.config import Config
+from image_bot.config import get_config
 from image_bot.utils.decorators import admin_required
+from image_bot.services.auth_cache import get_auth_cache
+from image_bot.services.change_events import publish_change, ENTITY_USER
 from image_bot.handlers.schedule_list import list_schedules_command
 
 # Загружаем конфигурацию
-config = Config()
+config = get_config()
 
 logger = logging.getLogger(__name__)
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
+    auth_cache = get_auth_cache()
     async with Session() as session:
         try:
-            # Проверяем, существует ли пользователь
-            result = await session.execute(
-                select(User).where(User.telegram_id == update.effective_user.id)
-            )
-            user = result.scalar_one_or_none()
+            # Проверяем, существует ли пользователь (без запроса к базе, если права в кеше
+            # и username не изменился)
+            user = await auth_cache.get(update.effective_user.id)
+            if user is None or user.username != update.effective_user.username:
+                result = await session.execute(
+                    select(User).where(User.telegram_id == update.effective_user.id)
+                )
+                user = result.scalar_one_or_none()
 
             if not user:
                 # Создаем нового пользователя
@@ -34,7 +40,9 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     is_authorized=is_admin  # Админы автоматически авторизованы
                 )
                 session.add(user)
+                await publish_change(session, ENTITY_USER, user.telegram_id)
                 await session.commit()
+                auth_cache.put(user)
 
                 if is_admin:
                     message = "Добро пожаловать! Вы зарегистрированы как администратор бота."
@@ -49,7 +57,9 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 # Обновляем username пользователя, если он изменился
                 if user.username != update.effective_user.username:
                     user.username = update.effective_user.username
+                    await publish_change(session, ENTITY_USER, user.telegram_id)
                     await session.commit()
+                    auth_cache.put(user)
                     logger.info(f"Updated username for user {user.telegram_id} to {user.username}")
 
                 if user.is_admin:
@@ -80,21 +90,17 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /help"""
-    async with Session() as session:
-        try:
-            # Проверяем, является ли пользователь администратором
-            result = await session.execute(
-                select(User).where(User.telegram_id == update.effective_user.id)
-            )
-            user = result.scalar_one_or_none()
+    try:
+        # Проверяем, является ли пользователь администратором
+        user = await get_auth_cache().get(update.effective_user.id)
 
-            base_help_text = """
+        base_help_text = """
     Доступные команды:
 
     Сгенерировать изображение - создать новое изображение
     Помощь - показать это сообщение"""
 
-            authorized_help_text = """
+        authorized_help_text = """
 
     Для авторизованных пользователей:
     Управление каналами - добавление и управление каналами
@@ -102,30 +108,30 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     /list_schedules - показать список всех расписаний
     /delete_schedule SCHEDULE_ID - удалить расписание"""
 
-            admin_help_text = """
+        admin_help_text = """
 
     Для администраторов:
     Управление пользователями - управление правами пользователей
     /authorize <user_id> - авторизовать пользователя"""
 
-            help_text = base_help_text
-            if user:
-                if user.is_authorized:
-                    help_text += authorized_help_text
-                if user.is_admin:
-                    help_text += admin_help_text
-
-            if update.callback_query:
-                await update.callback_query.message.reply_text(help_text)
-            else:
-                await update.message.reply_text(help_text)
-        except Exception as e:
-            logger.error(f"Error in help command: {e}")
-            error_message = "Произошла ошибка при обработке команды."
-            if update.callback_query:
-                await update.callback_query.message.reply_text(error_message)
-            else:
-                await update.message.reply_text(error_message)
+        help_text = base_help_text
+        if user:
+            if user.is_authorized:
+                help_text += authorized_help_text
+            if user.is_admin:
+                help_text += admin_help_text
+
+        if update.callback_query:
+            await update.callback_query.message.reply_text(help_text)
+        else:
+            await update.message.reply_text(help_text)
+    except Exception as e:
+        logger.error(f"Error in help command: {e}")
+        error_message = "Произошла ошибка при обработке команды."
+        if update.callback_query:
+            await update.callback_query.message.reply_text(error_message)
+        else:
+            await update.message.reply_text(error_message)
 
 
 @admin_required
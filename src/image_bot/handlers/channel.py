@@ -3,8 +3,11 @@ from telegram.ext import ContextTypes
 from loguru import logger
 from sqlalchemy import select
 from image_bot.database.base import Session
-from image_bot.database.models import User, Channel
+from image_bot.database.models import Channel
 from image_bot.keyboards.keyboards import get_channel_management_keyboard, get_channels_list_keyboard
+from image_bot.services.schedule_index import get_schedule_index
+from image_bot.services.auth_cache import get_auth_cache
+from image_bot.services.change_events import publish_change, ENTITY_CHANNEL, OP_DELETE
 
 
 async def manage_channels(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -12,11 +15,8 @@ async def manage_channels(update: Update, context: ContextTypes.DEFAULT_TYPE):
     async with Session() as session:
         try:
             # Проверяем права пользователя
-            result = await session.execute(
-                select(User).where(User.telegram_id == update.effective_user.id)
-            )
-            user = result.scalar_one_or_none()
-            
+            user = await get_auth_cache().get(update.effective_user.id)
+
             if not user or not user.is_authorized:
                 error_text = "У вас нет прав для управления каналами."
                 if update.callback_query:
@@ -220,7 +220,9 @@ async def handle_channel_callback(update: Update, context: ContextTypes.DEFAULT_
                     
                     # Теперь удаляем сам канал
                     await session.delete(channel)
+                    await publish_change(session, ENTITY_CHANNEL, channel.id, OP_DELETE, telegram_id=channel.telegram_id)
                     await session.commit()
+                    get_schedule_index().remove_channel(channel.id)
                     await query.message.edit_text(f"Канал {channel.title} и все его расписания успешно удалены.")
                 else:
                     await query.message.edit_text("Канал не найден.")
@@ -1,11 +1,10 @@
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import ContextTypes
 from loguru import logger
-from image_bot.database.base import Session
-from image_bot.database.models import User
 from image_bot.keyboards.keyboards import get_base_keyboard, get_admin_keyboard, get_authorized_keyboard
 from image_bot.image_generation.generator import ImageGenerator
-from sqlalchemy import select
+from image_bot.config import get_config
+from image_bot.services.auth_cache import get_auth_cache
 
 
 async def generate_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -17,15 +16,11 @@ async def generate_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
         message = update.message
 
     # Проверяем права пользователя
-    async with Session() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == update.effective_user.id)
-        )
-        user = result.scalar_one_or_none()
-        if not user or not user.is_authorized:
-            await message.reply_text("У вас нет прав на генерацию изображений. Обратитесь к администратору.")
-            return
-        
+    user = await get_auth_cache().get(update.effective_user.id)
+    if not user or not user.is_authorized:
+        await message.reply_text("У вас нет прав на генерацию изображений. Обратитесь к администратору.")
+        return
+
     if 'state' in context.user_data:
         await message.reply_text(
             "Сначала завершите текущее действие."
@@ -34,17 +29,16 @@ async def generate_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         # Создаем генератор изображений
-        generator = ImageGenerator()
+        generator = ImageGenerator(save_to_disk=get_config().save_generated_images)
         
-        # Генерируем изображение
-        image_path = generator.generate_image()
+        # Генерируем изображение сразу в память
+        photo, _ = generator.generate_normal_image(in_memory=True)
         
         # Отправляем изображение
-        with open(image_path, 'rb') as photo:
-            await message.reply_photo(
-                photo=photo,
-                caption="Сгенерированное изображение с числами"
-            )
+        await message.reply_photo(
+            photo=photo,
+            caption="Сгенерированное изображение с числами"
+        )
         
         # Возвращаем клавиатуру в зависимости от прав пользователя
         keyboard = get_admin_keyboard() if user.is_admin else get_authorized_keyboard()
@@ -64,13 +58,9 @@ async def handle_image_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE
     await update.message.reply_text("Используйте кнопку 'Сгенерировать изображение' для создания нового изображения.")
     
     # Возвращаем основную клавиатуру
-    async with Session() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == update.effective_user.id)
-        )
-        user = result.scalar_one_or_none()
-        keyboard = get_admin_keyboard() if user and user.is_admin else get_authorized_keyboard()
-        await update.message.reply_text("Выберите действие:", reply_markup=keyboard)
+    user = await get_auth_cache().get(update.effective_user.id)
+    keyboard = get_admin_keyboard() if user and user.is_admin else get_authorized_keyboard()
+    await update.message.reply_text("Выберите действие:", reply_markup=keyboard)
     
     if 'state' in context.user_data:
         del context.user_data['state']
@@ -82,13 +72,9 @@ async def cancel_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
         del context.user_data['state']
         
         # Возвращаем соответствующую клавиатуру
-        async with Session() as session:
-            result = await session.execute(
-                select(User).where(User.telegram_id == update.effective_user.id)
-            )
-            user = result.scalar_one_or_none()
-            keyboard = get_admin_keyboard() if user and user.is_admin else get_authorized_keyboard()
-            
+        user = await get_auth_cache().get(update.effective_user.id)
+        keyboard = get_admin_keyboard() if user and user.is_admin else get_authorized_keyboard()
+
         await update.message.reply_text(
             "Действие отменено.",
             reply_markup=keyboard
@@ -64,7 +64,7 @@ def register_schedule_handlers(application):
     
     # Обработчики для списка расписаний
     application.add_handler(CommandHandler("list_schedules", list_schedules_command), group=2)
-    application.add_handler(CallbackQueryHandler(list_schedules_command, pattern="^delete_schedule$|^confirm_delete_schedule_|^back_to_schedules$"), group=2)
+    application.add_handler(CallbackQueryHandler(list_schedules_command, pattern="^delete_schedule$|^confirm_delete_schedule_|^back_to_schedules$|^schedules_page:|^delete_schedule_page:"), group=2)
     
     # Остальные обработчики
     application.add_handler(CommandHandler("delete_schedule", delete_schedule_command), group=2)
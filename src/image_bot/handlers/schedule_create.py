@@ -1,4 +1,3 @@
-import json
 from datetime import datetime, time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
@@ -9,6 +8,7 @@ from image_bot.database.base import Session
 from image_bot.database.models import Channel, Schedule
 from image_bot.utils.decorators import admin_required
 from image_bot.services.mailing_service import MailingService
+from image_bot.services.message_templates import TemplateError
 from image_bot.keyboards.keyboards import create_schedule_keyboard, get_admin_keyboard, get_authorized_keyboard
 
 # Состояния диалога
@@ -543,18 +543,23 @@ async def add_schedule_messages_command(update: Update, context: ContextTypes.DE
             # Создаем расписание через mailing_service (используем фабрику сессий)
             from image_bot.database.base import Session as SessionFactory
             mailing_service = MailingService(context.bot, SessionFactory)
-            schedule = await mailing_service.create_schedule(
-                channel_id=channel.telegram_id,
-                schedule_time=schedule_time,
-                messages=messages,
-                message_delay_seconds=message_delay,
-                image_delay_seconds=image_delay,
-                images_count=images_count,
-                welcome_to_first_signal_seconds=welcome_to_first_signal,
-                signal_to_win_seconds=signal_to_win,
-                between_signals_seconds=between_signals,
-                last_signal_to_summary_seconds=last_signal_to_summary
-            )
+            try:
+                # Переменные в шаблонах проверяет create_schedule
+                schedule = await mailing_service.create_schedule(
+                    channel_id=channel.telegram_id,
+                    schedule_time=schedule_time,
+                    messages=messages,
+                    message_delay_seconds=message_delay,
+                    image_delay_seconds=image_delay,
+                    images_count=images_count,
+                    welcome_to_first_signal_seconds=welcome_to_first_signal,
+                    signal_to_win_seconds=signal_to_win,
+                    between_signals_seconds=between_signals,
+                    last_signal_to_summary_seconds=last_signal_to_summary
+                )
+            except TemplateError as e:
+                await update.message.reply_text(f"❌ {e}")
+                return ConversationHandler.END
 
             # Получаем информацию о канале
             result = await session.execute(
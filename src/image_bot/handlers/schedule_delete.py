@@ -6,6 +6,8 @@ from loguru import logger
 from image_bot.database.base import Session
 from image_bot.database.models import Schedule, Channel
 from image_bot.utils.decorators import admin_required
+from image_bot.services.schedule_index import get_schedule_index
+from image_bot.services.change_events import publish_change, ENTITY_SCHEDULE, OP_DELETE
 
 
 @admin_required
@@ -89,7 +91,9 @@ async def delete_schedule_command(update: Update, context: ContextTypes.DEFAULT_
 
             # Удаляем расписание
             await session.delete(schedule)
+            await publish_change(session, ENTITY_SCHEDULE, schedule.id, OP_DELETE)
             await session.commit()
+            get_schedule_index().remove(schedule.id)
 
             await update.message.reply_text(
                 f"Расписание для канала {channel.title} "
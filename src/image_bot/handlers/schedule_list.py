@@ -1,4 +1,3 @@
-import json
 from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
@@ -8,7 +7,141 @@ from loguru import logger
 from image_bot.database.base import Session
 from image_bot.database.models import Schedule, Channel
 from image_bot.utils.decorators import admin_required
-from image_bot.keyboards.keyboards import get_schedule_management_keyboard
+from image_bot.keyboards.keyboards import get_schedule_management_keyboard, get_page_navigation
+from image_bot.services.schedule_index import get_schedule_index
+from image_bot.services.change_events import publish_change, ENTITY_SCHEDULE, OP_DELETE
+
+# Размер страницы списка расписаний и клавиатуры удаления
+SCHEDULES_PAGE_SIZE = 10
+DELETE_PAGE_SIZE = 20
+# Сколько символов каждого сообщения показывать в списке
+MESSAGE_PREVIEW_LENGTH = 150
+MAX_MESSAGE_LENGTH = 4096
+
+
+async def fetch_schedule_page(session, limit: int, after_id: int = None, before_id: int = None):
+    """Получает страницу расписаний с каналами (keyset по Schedule.id)
+
+    Returns:
+        tuple[list, bool, bool]: Строки (Schedule, Channel), есть ли предыдущая и следующая страница.
+    """
+    query = select(Schedule, Channel).join(Channel, Schedule.channel_id == Channel.id)
+    if before_id is not None:
+        # Предыдущая страница: берем limit + 1 строк перед before_id в обратном порядке
+        result = await session.execute(
+            query.where(Schedule.id < before_id).order_by(Schedule.id.desc()).limit(limit + 1)
+        )
+        rows = result.all()
+        has_prev = len(rows) > limit
+        return list(reversed(rows[:limit])), has_prev, True
+
+    if after_id is not None:
+        query = query.where(Schedule.id > after_id)
+    result = await session.execute(query.order_by(Schedule.id).limit(limit + 1))
+    rows = result.all()
+    return rows[:limit], after_id is not None, len(rows) > limit
+
+
+def parse_page_callback(data: str):
+    """Разбирает callback_data вида "<prefix>:<направление>:<id>" в (after_id, before_id)"""
+    _, direction, schedule_id = data.split(":")
+    if direction == "<":
+        return None, int(schedule_id)
+    return int(schedule_id), None
+
+
+def preview(text: str) -> str:
+    """Сокращает текст сообщения для списка"""
+    if len(text) <= MESSAGE_PREVIEW_LENGTH:
+        return text
+    return text[:MESSAGE_PREVIEW_LENGTH] + "…"
+
+
+def channel_label(channel: Channel) -> str:
+    channel_text = f"{channel.title}"
+    if channel.username:
+        channel_text += f" (@{channel.username})"
+    return channel_text
+
+
+def render_schedule(schedule: Schedule, channel: Channel) -> str:
+    """Текст одного расписания для списка"""
+    messages = schedule.messages or []
+    text = (
+        f"ID: {schedule.id}\n"
+        f"Канал: {channel_label(channel)}\n"
+        f"Время: {schedule.time_of_day.strftime('%H:%M')}\n"
+        f"⌛️ Задержка между сообщениями: {schedule.message_delay_seconds} сек\n"
+        f"⏱ Задержка перед изображениями: {schedule.image_delay_seconds} сек\n"
+        f"Количество изображений: {schedule.images_count}\n"
+    )
+    if messages:
+        text += "Сообщения:\n"
+        text += f"1. Приветствие: {preview(messages[0])}\n"
+        text += f"2. Перед картинкой: {preview(messages[1])}\n"
+        text += f"3. Итог: {preview(messages[2])}\n"
+    return text + "\n"
+
+
+async def show_schedules_page(update: Update, after_id: int = None, before_id: int = None):
+    """Показывает одну страницу списка расписаний"""
+    async with Session() as session:
+        rows, has_prev, has_next = await fetch_schedule_page(session, SCHEDULES_PAGE_SIZE, after_id, before_id)
+
+    if not rows and (after_id is not None or before_id is not None):
+        # Страница опустела (расписания удалены) - показываем первую
+        return await show_schedules_page(update)
+
+    if not rows:
+        text = "Нет активных расписаний."
+        keyboard = get_schedule_management_keyboard(False)
+    else:
+        text = "📋 Список активных расписаний:\n\n"
+        for schedule, channel in rows:
+            text += render_schedule(schedule, channel)
+        if len(text) > MAX_MESSAGE_LENGTH:
+            text = text[:MAX_MESSAGE_LENGTH - 1] + "…"
+        navigation = get_page_navigation("schedules_page", rows[0][0].id, rows[-1][0].id, has_prev, has_next)
+        keyboard = get_schedule_management_keyboard(True, navigation)
+
+    if update.callback_query:
+        await update.callback_query.message.edit_text(text, reply_markup=keyboard)
+    else:
+        await update.message.reply_text(text, reply_markup=keyboard)
+
+
+async def show_delete_page(query, after_id: int = None, before_id: int = None):
+    """Показывает страницу клавиатуры выбора расписания для удаления"""
+    async with Session() as session:
+        rows, has_prev, has_next = await fetch_schedule_page(session, DELETE_PAGE_SIZE, after_id, before_id)
+
+    if not rows and (after_id is not None or before_id is not None):
+        return await show_delete_page(query)
+
+    if not rows:
+        await query.message.edit_text(
+            "Нет активных расписаний для удаления.",
+            reply_markup=get_schedule_management_keyboard(False)
+        )
+        return
+
+    # Создаем клавиатуру с кнопками для каждого расписания на странице
+    keyboard = []
+    for schedule, channel in rows:
+        button_text = f"{schedule.time_of_day.strftime('%H:%M')} - {channel_label(channel)}"
+        keyboard.append([InlineKeyboardButton(
+            button_text,
+            callback_data=f"confirm_delete_schedule_{schedule.id}"
+        )])
+    navigation = get_page_navigation("delete_schedule_page", rows[0][0].id, rows[-1][0].id, has_prev, has_next)
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("« К списку", callback_data="back_to_schedules")])
+
+    await query.message.edit_text(
+        "Выберите расписание для удаления:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
 
 
 @admin_required
@@ -19,38 +152,17 @@ async def list_schedules_command(update: Update, context: ContextTypes.DEFAULT_T
         await query.answer()
 
         if query.data == "delete_schedule":
-            # Получаем список расписаний для удаления
-            async with Session() as session:
-                result = await session.execute(
-                    select(Schedule, Channel).join(Channel, Schedule.channel_id == Channel.id)
-                )
-                schedules = result.all()
+            # Первая страница списка расписаний для удаления
+            await show_delete_page(query)
+            return
 
-                if not schedules:
-                    await query.message.edit_text(
-                        "Нет активных расписаний для удаления.",
-                        reply_markup=get_schedule_management_keyboard(False)
-                    )
-                    return
-
-                # Создаем клавиатуру с кнопками для каждого расписания
-                keyboard = []
-                for schedule, channel in schedules:
-                    channel_text = f"{channel.title}"
-                    if channel.username:
-                        channel_text += f" (@{channel.username})"
-                    button_text = f"{schedule.time_of_day.strftime('%H:%M')} - {channel_text}"
-                    keyboard.append([InlineKeyboardButton(
-                        button_text,
-                        callback_data=f"confirm_delete_schedule_{schedule.id}"
-                    )])
-                keyboard.append([InlineKeyboardButton("« Назад", callback_data="back_to_schedules")])
-
-                await query.message.edit_text(
-                    "Выберите расписание для удаления:",
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-                return
+        elif query.data.startswith("delete_schedule_page:"):
+            await show_delete_page(query, *parse_page_callback(query.data))
+            return
+
+        elif query.data.startswith("schedules_page:"):
+            await show_schedules_page(update, *parse_page_callback(query.data))
+            return
 
         elif query.data.startswith("confirm_delete_schedule_"):
             schedule_id = int(query.data.replace("confirm_delete_schedule_", ""))
@@ -65,7 +177,9 @@ async def list_schedules_command(update: Update, context: ContextTypes.DEFAULT_T
                     if schedule:
                         # Удаляем расписание
                         await session.delete(schedule)
+                        await publish_change(session, ENTITY_SCHEDULE, schedule.id, OP_DELETE)
                         await session.commit()
+                        get_schedule_index().remove(schedule.id)
                         await query.message.edit_text(
                             f"✅ Расписание успешно удалено!",
                             reply_markup=get_schedule_management_keyboard(True)
@@ -84,70 +198,11 @@ async def list_schedules_command(update: Update, context: ContextTypes.DEFAULT_T
                 return
 
         elif query.data == "back_to_schedules":
-            # Возвращаемся к списку расписаний
-            await list_schedules_command(update, context)
+            # Возвращаемся к первой странице списка расписаний
+            await show_schedules_page(update)
             return
     try:
-        async with Session() as session:
-            # Получаем все расписания с информацией о каналах
-            result = await session.execute(
-                select(Schedule, Channel).join(Channel, Schedule.channel_id == Channel.id)
-            )
-            schedules = result.all()
-
-            # Подготавливаем клавиатуру
-            keyboard = get_schedule_management_keyboard(bool(schedules))
-
-            if not schedules:
-                await update.message.reply_text(
-                    "Нет активных расписаний.",
-                    reply_markup=keyboard
-                )
-                return
-
-            message = "📋 Список активных расписаний:\n\n"
-            for schedule, channel in schedules:
-                channel_text = f"{channel.title}"
-                if channel.username:
-                    channel_text += f" (@{channel.username})"
-                
-                messages = json.loads(schedule.messages) if schedule.messages else []
-                message += (
-                    f"ID: {schedule.id}\n"
-                    f"Канал: {channel_text}\n"
-                    f"Время: {schedule.time_of_day.strftime('%H:%M')}\n"
-                    f"⌛️ Задержка между сообщениями: {schedule.message_delay_seconds} сек\n"
-                    f"⏱ Задержка перед изображениями: {schedule.image_delay_seconds} сек\n"
-                    f"Количество изображений: {schedule.images_count}\n"
-                )
-                if messages:
-                    message += "Сообщения:\n"
-                    message += f"1. Приветствие: {messages[0]}\n"
-                    message += f"2. Перед картинкой: {messages[1]}\n"
-                    message += f"3. Итог: {messages[2]}\n"
-                message += "\n"
-
-            # Разбиваем сообщение на части, если оно слишком длинное
-            max_length = 4096
-            messages = []
-            while len(message) > 0:
-                if len(message) <= max_length:
-                    messages.append(message)
-                    break
-                split_index = message[:max_length].rfind('\n\n')
-                if split_index == -1:
-                    split_index = max_length
-                messages.append(message[:split_index])
-                message = message[split_index:].lstrip()
-
-            # Отправляем каждую часть сообщения
-            for i, msg in enumerate(messages):
-                # Добавляем клавиатуру только к последнему сообщению
-                if i == len(messages) - 1:
-                    await update.message.reply_text(msg, reply_markup=keyboard)
-                else:
-                    await update.message.reply_text(msg)
-
+        await show_schedules_page(update)
     except Exception as e:
         logger.error(f"Error in list_schedules: {e}")
-        await update.message.reply_text(f"Произошла ошибка: {str(e)}")
+        await update.effective_message.reply_text(f"Произошла ошибка: {str(e)}")
@@ -1,4 +1,3 @@
-import json
 from datetime import datetime, time
 from telegram import Update
 from telegram.ext import ContextTypes
@@ -8,6 +7,9 @@ from loguru import logger
 from image_bot.database.base import Session
 from image_bot.database.models import Channel, Schedule
 from image_bot.utils.decorators import admin_required
+from image_bot.services.schedule_index import get_schedule_index
+from image_bot.services.change_events import publish_change, ENTITY_SCHEDULE
+from image_bot.services.message_templates import TemplateError, compile_messages
 
 
 @admin_required
@@ -59,6 +61,13 @@ async def add_schedule_messages_command(update: Update, context: ContextTypes.DE
             )
             return
 
+        # Проверяем переменные в шаблонах один раз при сохранении
+        try:
+            messages = compile_messages(messages).messages
+        except TemplateError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+
         # Создаем расписание
         channel_id = context.user_data["selected_channel"]  # Теперь это id из базы
         time_str = context.user_data["schedule_time"]
@@ -104,7 +113,7 @@ async def add_schedule_messages_command(update: Update, context: ContextTypes.DE
             new_schedule = Schedule(
                 channel_id=channel.id,
                 time_of_day=schedule_time,
-                messages=json.dumps(messages),
+                messages=messages,
                 message_delay_seconds=message_delay,
                 image_delay_seconds=image_delay,
                 images_count=count,
@@ -118,7 +127,10 @@ async def add_schedule_messages_command(update: Update, context: ContextTypes.DE
             )
 
             session.add(new_schedule)
+            await session.flush()
+            await publish_change(session, ENTITY_SCHEDULE, new_schedule.id)
             await session.commit()
+            get_schedule_index().upsert(new_schedule)
 
             logger.info(f"Schedule created successfully: {new_schedule.id=}, bet_amount={bet_amount}")
 
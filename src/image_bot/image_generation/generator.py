@@ -1,3 +1,4 @@
+import io
 import json
 import random
 import yaml
@@ -7,8 +8,9 @@ from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 import shutil
 
+from image_bot.config import get_config
+
 BASE_DIR = Path(__file__).parent
-CONFIG_PATH = BASE_DIR.parent / "static" / "config.yaml"
 
 # Пути к шаблонам изображений для разных стран
 TEMPLATE_PATHS = {
@@ -34,18 +36,23 @@ BASE_FAIL_IMAGE_PATH = BASE_DIR.parent / "static" / "base_fail.png"
 
 
 def load_config():
-    """Load configuration from YAML file"""
-    with open(CONFIG_PATH, 'r') as f:
-        return yaml.safe_load(f)
+    """Return shared read-only configuration (parsed once, reloaded on change)"""
+    return get_config().config_data
 
 
-def generate_random_number():
-    """Generate random number in format 9.99x"""
-    config = load_config()
-    ranges = config['generation_settings']['number_ranges']
-    
-    first_num = str(random.randint(ranges['first_number']['min'], ranges['first_number']['max']))
-    second_num = str(random.randint(ranges['second_number']['min'], ranges['second_number']['max'])).zfill(2)
+def generate_random_number(number_ranges=None):
+    """Generate random number in format 9.99x
+
+    Args:
+        number_ranges (NumberRanges, optional): Ranges to use. Defaults to
+                                                the ranges from shared config.
+    """
+    if number_ranges is None:
+        number_ranges = get_config().number_ranges
+    first, second = number_ranges.first_number, number_ranges.second_number
+
+    first_num = str(random.randint(first.min, first.max))
+    second_num = str(random.randint(second.min, second.max)).zfill(2)
     return f"{first_num}.{second_num}x"
 
 
@@ -125,15 +132,26 @@ def draw_text_with_shadow(draw, img, text, position, font, color, shadow_config)
     draw.text(position, text, font=font, fill=color)
 
 
-def draw_text(draw, img, text, font_settings, position_config):
-    """Draw text using provided configuration"""
+def load_font(font_settings):
+    """Load font from static directory, falling back to the default PIL font"""
+    # Получаем путь к шрифту относительно BASE_DIR
+    font_path = BASE_DIR.parent / "static" / font_settings['path']
     try:
-        # Получаем путь к шрифту относительно BASE_DIR
-        font_path = BASE_DIR.parent / "static" / font_settings['path']
-        font = ImageFont.truetype(str(font_path), font_settings['size'])
+        return ImageFont.truetype(str(font_path), font_settings['size'])
     except Exception as e:
         print(f"Warning: Could not load font {font_path}: {e}")
-        font = ImageFont.load_default()
+        return ImageFont.load_default()
+
+
+def draw_text(draw, img, text, font_settings, position_config, font=None):
+    """Draw text using provided configuration
+
+    Args:
+        font (FreeTypeFont, optional): Already loaded font. If not passed,
+                                       the font is loaded from font_settings.
+    """
+    if font is None:
+        font = load_font(font_settings)
     
     # Calculate text position
     bbox = draw.textbbox((0, 0), text, font=font)
@@ -225,14 +243,114 @@ def process_numbers(main_number_str, config, bet_amount=0):
     }
 
 
+def encode_png(img):
+    """Encode image to PNG in memory"""
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    buffer.seek(0)
+    return buffer
+
+
 class ImageGenerator:
-    def __init__(self):
-        self.config = load_config()
+    def __init__(self, save_to_disk=False):
+        """
+        Args:
+            save_to_disk (bool, optional): Also write every image and its YAML data
+                                           to output/ (debug/audit sink). Defaults to False.
+        """
+        self.settings = get_config()
+        self.config = self.settings.config_data
+        self.save_to_disk = save_to_disk
         self.output_dir = BASE_DIR.parent / "output"
-        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if self.save_to_disk:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
         self.fail_config = self.config['fail_image']  # Используем настройки из конфига
+        # Кэш декодированных шаблонов (путь -> RGBA) и шрифтов ((путь, размер) -> шрифт)
+        self._templates = {}
+        self._fonts = {}
+        self.reload_assets()
 
-    def generate_normal_image(self, bet_amount=0, template="lkr"):
+    def reload_assets(self):
+        """Reload templates and fonts from static directory
+
+        Call it after files in static/ were changed.
+        """
+        self._templates = {}
+        self._fonts = {}
+        # Декодируем все шаблоны стран один раз
+        for image_path in set(TEMPLATE_PATHS.values()) | set(TEMPLATE_FAIL_PATHS.values()):
+            try:
+                self._load_template(image_path)
+            except Exception as e:
+                print(f"Warning: Could not preload template {image_path}: {e}")
+        # Загружаем шрифты, используемые в конфиге
+        for font_settings in (
+            self.config['main_number']['font_settings'],
+            self.config['subtracted_number']['font_settings'],
+            self.config['multiplied_number']['font_settings'],
+            self.fail_config['font_settings'],
+        ):
+            self._get_font(font_settings)
+
+    def _refresh_config(self):
+        """Pick up a new config snapshot if config.yaml was changed"""
+        config = self.settings.config_data
+        if config is self.config:
+            return
+        self.config = config
+        self.fail_config = config['fail_image']
+        # Шрифты зависят от конфига, шаблоны - нет
+        self._fonts = {}
+
+    def _load_template(self, image_path):
+        """Return decoded RGBA template from cache, loading it on first access"""
+        key = str(image_path)
+        base = self._templates.get(key)
+        if base is None:
+            with Image.open(image_path) as src:
+                base = src.convert('RGBA')
+            self._templates[key] = base
+        return base
+
+    def _get_template(self, image_path):
+        """Return a copy of the cached template that is safe to draw on"""
+        return self._load_template(image_path).copy()
+
+    def _get_font(self, font_settings):
+        """Return cached font for (path, size)"""
+        key = (font_settings['path'], font_settings['size'])
+        font = self._fonts.get(key)
+        if font is None:
+            font = load_font(font_settings)
+            self._fonts[key] = font
+        return font
+
+    def _draw_text(self, draw, img, text, font_settings, position_config):
+        """Draw text using cached font"""
+        draw_text(draw, img, text, font_settings, position_config,
+                  font=self._get_font(font_settings))
+
+    def _save(self, buffer, filename, data):
+        """Write encoded image and its YAML data to output directory"""
+        output_path = self.output_dir / filename
+        with open(output_path, 'wb') as f:
+            f.write(buffer.getbuffer())
+
+        yaml_path = output_path.with_suffix('.yaml')
+        with open(yaml_path, 'w', encoding='utf-8') as f:
+            yaml.dump(dict(data), f, allow_unicode=True)
+        return output_path
+
+    def _finish(self, img, filename, data, in_memory):
+        """Encode rendered image and return it as a buffer or as a saved file path"""
+        buffer = encode_png(img)
+        if in_memory:
+            if self.save_to_disk:
+                self._save(buffer, filename, data)
+            return buffer, data
+        return self._save(buffer, filename, data), data
+
+    def generate_normal_image(self, bet_amount=0, template="lkr", in_memory=False):
         """Generate a normal image with numbers
         
         Args:
@@ -240,10 +358,11 @@ class ImageGenerator:
             template (str, optional): Template to use for image generation. Defaults to "lkr".
                                      Available options: "lkr" (Шри-Ланка), "pkr" (Пакистан), 
                                      "uzs" (Узбекистан), "pen" (Перу).
+            in_memory (bool, optional): Return PNG as BytesIO instead of a file path. Defaults to False.
         """
         try:
             # Generate main number
-            main_number_str = generate_random_number()
+            main_number_str = generate_random_number(self.settings.number_ranges)
             
             # Process numbers with bet amount
             data = process_numbers(main_number_str, self.config, bet_amount)
@@ -255,50 +374,37 @@ class ImageGenerator:
                 # Fallback to default template if specified template doesn't exist
                 image_path = BASE_IMAGE_PATH
                 
-            # Open the base image and convert to RGBA
-            img = Image.open(image_path).convert('RGBA')
+            # Take a copy of the preloaded RGBA template
+            img = self._get_template(image_path)
             draw = ImageDraw.Draw(img)
             
             # Draw main number
-            draw_text(draw, img, data['main_number'],
+            self._draw_text(draw, img, data['main_number'],
                      self.config['main_number']['font_settings'],
                      self.config['main_number']['position'])
             
             # Draw subtracted number
-            draw_text(draw, img, data['subtracted_number'],
+            self._draw_text(draw, img, data['subtracted_number'],
                      self.config['subtracted_number']['font_settings'],
                      self.config['subtracted_number']['position'])
             
             # Draw multiplied number
-            draw_text(draw, img, data['multiplied_number'],
+            self._draw_text(draw, img, data['multiplied_number'],
                      self.config['multiplied_number']['font_settings'],
                      self.config['multiplied_number']['position'])
             
             # Add noise
             img = add_noise(img, intensity=3)
             
-            # Save image
+            # Encode image (and save it if needed)
             filename = f"{datetime.now().strftime('%d_%m_%y')}_{main_number_str}.png"
-            output_path = self.output_dir / filename
-            img.save(output_path)
-            
-            # Save YAML data
-            yaml_path = output_path.with_suffix('.yaml')
-            yaml_data = {
-                'main_number': data['main_number'],
-                'subtracted_number': data['subtracted_number'],
-                'multiplied_number': data['multiplied_number']
-            }
-            with open(yaml_path, 'w', encoding='utf-8') as f:
-                yaml.dump(yaml_data, f, allow_unicode=True)
-            
-            return output_path, data
+            return self._finish(img, filename, data, in_memory)
             
         except Exception as e:
             print(f"Error generating normal image: {e}")
             raise
 
-    def generate_fail_image(self, bet_amount=0, template="lkr"):
+    def generate_fail_image(self, bet_amount=0, template="lkr", in_memory=False):
         """Generate a fail image with swapped main and subtracted numbers
         
         Args:
@@ -306,10 +412,11 @@ class ImageGenerator:
             template (str, optional): Template to use for image generation. Defaults to "lkr".
                                      Available options: "lkr" (Шри-Ланка), "pkr" (Пакистан), 
                                      "uzs" (Узбекистан), "pen" (Перу).
+            in_memory (bool, optional): Return PNG as BytesIO instead of a file path. Defaults to False.
         """
         try:
             # Сначала генерируем main_number и subtracted_number как для обычного изображения
-            main_number_str = generate_random_number()
+            main_number_str = generate_random_number(self.settings.number_ranges)
             data_normal = process_numbers(main_number_str, self.config, bet_amount)
             # Меняем местами main_number и subtracted_number
             fail_main_number = data_normal['subtracted_number']  # теперь это основной (больший)
@@ -324,8 +431,8 @@ class ImageGenerator:
                 # Используем шаблон по умолчанию, если указанный шаблон не существует
                 image_path = BASE_FAIL_IMAGE_PATH
                 
-            # Открываем fail image
-            img = Image.open(image_path).convert('RGBA')
+            # Берем копию заранее загруженного fail-шаблона
+            img = self._get_template(image_path)
             draw = ImageDraw.Draw(img)
             # Формируем данные для YAML и отрисовки
             data = {
@@ -336,23 +443,17 @@ class ImageGenerator:
             font_settings = self.fail_config['font_settings']
             position = self.fail_config['position']
             # Draw main number
-            draw_text(draw, img, data['main_number'], font_settings, position)
+            self._draw_text(draw, img, data['main_number'], font_settings, position)
             # Add noise
             img = add_noise(img, intensity=3)
-            # Save image
+            # Encode image (and save it if needed)
             filename = f"{datetime.now().strftime('%d_%m_%y')}_{main_number_str}_fail.png"
-            output_path = self.output_dir / filename
-            img.save(output_path)
-            # Save YAML data
-            yaml_path = output_path.with_suffix('.yaml')
-            with open(yaml_path, 'w', encoding='utf-8') as f:
-                yaml.dump(data, f, allow_unicode=True)
-            return output_path, data
+            return self._finish(img, filename, data, in_memory)
         except Exception as e:
             print(f"Error generating fail image: {e}")
             raise
 
-    def generate_images(self, count=5, bet_amount=0, template="lkr"):
+    def generate_images(self, count=5, bet_amount=0, template="lkr", in_memory=False):
         """Generate multiple images with one fail image
         
         Args:
@@ -361,8 +462,12 @@ class ImageGenerator:
             template (str, optional): Template to use for image generation. Defaults to "lkr".
                                      Available options: "lkr" (Шри-Ланка), "pkr" (Пакистан), 
                                      "uzs" (Узбекистан), "pen" (Перу).
+            in_memory (bool, optional): Return encoded PNG buffers (BytesIO) instead of
+                                        file paths. Defaults to False.
         """
         try:
+            self._refresh_config()
+
             # Выбираем случайную позицию для fail изображения
             fail_position = random.randint(0, count-1)
             
@@ -376,10 +481,10 @@ class ImageGenerator:
             for i in range(count):
                 if i == fail_position:
                     # Генерируем fail изображение с использованием суммы ставки и выбранного шаблона
-                    image_path, image_data = self.generate_fail_image(bet_amount, template)
+                    image_path, image_data = self.generate_fail_image(bet_amount, template, in_memory)
                 else:
                     # Генерируем обычное изображение с использованием суммы ставки и выбранного шаблона
-                    image_path, image_data = self.generate_normal_image(bet_amount, template)
+                    image_path, image_data = self.generate_normal_image(bet_amount, template, in_memory)
                 
                 images.append(image_path)
                 data_list.append(image_data)
@@ -40,11 +40,26 @@ def get_channel_management_keyboard(has_channels=False):
     return InlineKeyboardMarkup(keyboard)
 
 
-def get_schedule_management_keyboard(has_schedules=False):
+def get_page_navigation(prefix: str, first_id: int, last_id: int,
+                        has_prev: bool, has_next: bool) -> List[InlineKeyboardButton]:
+    """Кнопки перехода по страницам с keyset-пагинацией по id
+
+    callback_data: "<prefix>:<:<first_id>" - предыдущая страница, "<prefix>:>:<last_id>" - следующая.
+    """
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton("« Назад", callback_data=f"{prefix}:<:{first_id}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton("Далее »", callback_data=f"{prefix}:>:{last_id}"))
+    return buttons
+
+
+def get_schedule_management_keyboard(has_schedules=False, navigation: List[InlineKeyboardButton] = None):
     """Клавиатура для управления расписаниями"""
-    keyboard = [
-        [InlineKeyboardButton("➕ Добавить расписание", callback_data="add_schedule")],
-    ]
+    keyboard = []
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton("➕ Добавить расписание", callback_data="add_schedule")])
     if has_schedules:
         keyboard.append([InlineKeyboardButton("❌ Удалить расписание", callback_data="delete_schedule")])
 
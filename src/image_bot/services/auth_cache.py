@@ -0,0 +1,119 @@
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy import select
+
+from image_bot.config import get_config
+from image_bot.services.change_events import ChangeEvent, publish_change, ENTITY_USER
+from image_bot.database.models import User
+from image_bot.utils.logger import logger
+
+
+@dataclass(frozen=True)
+class UserPermissions:
+    """Права пользователя, достаточные для проверок в обработчиках"""
+    telegram_id: int
+    username: Optional[str]
+    is_admin: bool
+    is_authorized: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> 'UserPermissions':
+        return cls(
+            telegram_id=user.telegram_id,
+            username=user.username,
+            is_admin=bool(user.is_admin),
+            is_authorized=bool(user.is_authorized)
+        )
+
+
+class AuthCache:
+    """Кеш прав пользователей в памяти с TTL
+
+    Кешируются и отсутствующие пользователи (None), поэтому повторные обновления
+    от одного пользователя не обращаются к базе. После изменения прав запись
+    нужно обновить через put() или сбросить через invalidate().
+    """
+
+    def __init__(self, session_factory, ttl: float = 300):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self._entries = {}  # telegram_id -> (UserPermissions или None, время истечения)
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, telegram_id: int) -> Optional[UserPermissions]:
+        """Возвращает права пользователя или None, если его нет в базе"""
+        entry = self._entries.get(telegram_id)
+        if entry is not None and entry[1] > time.monotonic():
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        async with self.session_factory() as session:
+            result = await session.execute(select(User).where(User.telegram_id == telegram_id))
+            user = result.scalar_one_or_none()
+
+        permissions = UserPermissions.from_user(user) if user else None
+        self._store(telegram_id, permissions)
+        return permissions
+
+    def _store(self, telegram_id: int, permissions: Optional[UserPermissions]):
+        self._entries[telegram_id] = (permissions, time.monotonic() + self.ttl)
+
+    def put(self, user: User) -> UserPermissions:
+        """Обновляет запись после изменения пользователя в базе"""
+        permissions = UserPermissions.from_user(user)
+        self._store(user.telegram_id, permissions)
+        return permissions
+
+    def invalidate(self, telegram_id: int = None):
+        """Сбрасывает запись пользователя (или весь кеш, если telegram_id не указан)"""
+        if telegram_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(telegram_id, None)
+
+    def on_change(self, event: ChangeEvent):
+        """Сбрасывает запись пользователя, измененного другим процессом"""
+        self.invalidate(event.id)
+
+    async def ensure_admin(self, telegram_id: int, username: str = None) -> UserPermissions:
+        """Гарантирует, что администратор из конфига есть в базе с правами админа
+
+        Запись в базу выполняется только если в кеше нет подтвержденных прав админа.
+        """
+        permissions = await self.get(telegram_id)
+        if permissions is not None and permissions.is_admin and permissions.is_authorized:
+            return permissions
+
+        async with self.session_factory() as session:
+            result = await session.execute(select(User).where(User.telegram_id == telegram_id))
+            user = result.scalar_one_or_none()
+
+            if not user:
+                # Создаем пользователя с правами админа
+                user = User(
+                    telegram_id=telegram_id,
+                    username=username,
+                    is_admin=True,
+                    is_authorized=True
+                )
+                session.add(user)
+            else:
+                # Обновляем права пользователя
+                user.is_admin = True
+                user.is_authorized = True
+            await publish_change(session, ENTITY_USER, telegram_id)
+            await session.commit()
+            logger.info(f"[AUTH] Granted admin rights to config admin {telegram_id}")
+            return self.put(user)
+
+
+@lru_cache(maxsize=None)
+def get_auth_cache() -> AuthCache:
+    """Возвращает общий для процесса кеш прав пользователей"""
+    from image_bot.database.base import Session
+    return AuthCache(Session, ttl=get_config().auth_cache_ttl)
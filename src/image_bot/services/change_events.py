@@ -0,0 +1,169 @@
+import asyncio
+import json
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Optional
+
+import asyncpg
+from sqlalchemy import func, select
+
+from image_bot.config import get_config
+from image_bot.services.leader_election import process_id
+from image_bot.utils.logger import logger
+
+# Канал NOTIFY, в который пишутся изменения расписаний, каналов и пользователей
+CHANGES_CHANNEL = 'image_bot_changes'
+
+ENTITY_SCHEDULE = 'schedule'
+ENTITY_CHANNEL = 'channel'
+ENTITY_USER = 'user'
+
+OP_UPSERT = 'upsert'
+OP_DELETE = 'delete'
+
+# Проверка выделенного соединения: обрыв TCP без закрытия иначе не заметен
+KEEPALIVE_SECONDS = 30
+RECONNECT_DELAYS = (1, 2, 5, 10, 30)
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """Изменение в базе: entity (schedule/channel/user), op (upsert/delete) и id
+
+    Для расписаний и каналов id - первичный ключ, для пользователей - telegram_id.
+    """
+    entity: str
+    op: str
+    id: int
+    origin: Optional[str] = None  # Процесс, сделавший изменение
+    data: dict = field(default_factory=dict)  # Дополнительные поля (например telegram_id канала)
+
+
+async def publish_change(session, entity: str, entity_id: int, op: str = OP_UPSERT, **data):
+    """Добавляет NOTIFY об изменении в текущую транзакцию
+
+    Уведомление доставляется подписчикам только после commit, а при откате
+    транзакции не отправляется. Вызывается перед session.commit().
+    """
+    payload = json.dumps({'entity': entity, 'op': op, 'id': entity_id, 'origin': process_id(), **data})
+    await session.execute(select(func.pg_notify(CHANGES_CHANNEL, payload)))
+
+
+def parse_event(payload: str) -> ChangeEvent:
+    data = json.loads(payload)
+    return ChangeEvent(
+        entity=data.pop('entity'),
+        op=data.pop('op'),
+        id=data.pop('id'),
+        origin=data.pop('origin', None),
+        data=data
+    )
+
+
+class ChangeListener:
+    """LISTEN на выделенном соединении asyncpg и рассылка изменений подписчикам
+
+    Уведомления обрабатываются по одному в порядке поступления, поэтому обработчик,
+    читающий текущее состояние из базы, не может перезаписать более позднее удаление.
+    Изменения, сделанные этим же процессом, пропускаются: они уже применены на месте.
+    После переподключения вызываются обработчики on_reconnect - уведомления за время
+    обрыва потеряны, и состояние нужно перечитать целиком.
+    """
+
+    def __init__(self, dsn: str, channel: str = CHANGES_CHANNEL, origin: str = None):
+        self.dsn = dsn
+        self.channel = channel
+        self.origin = origin or process_id()
+        self._handlers = {}  # entity -> [обработчик(ChangeEvent)]
+        self._reconnect_handlers = []
+        self._queue = asyncio.Queue()
+        self._connected = asyncio.Event()
+        self._ever_connected = False
+        self.received = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def subscribe(self, entity: str, handler: Callable):
+        """Подписывает обработчик (функцию или корутину от ChangeEvent) на изменения entity"""
+        self._handlers.setdefault(entity, []).append(handler)
+
+    def on_reconnect(self, handler: Callable):
+        self._reconnect_handlers.append(handler)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            event = parse_event(payload)
+        except (ValueError, KeyError) as e:
+            logger.warning(f"[CHANGES] Invalid notification {payload!r}: {e}")
+            return
+        if event.origin != self.origin:
+            self._queue.put_nowait(event)
+
+    @staticmethod
+    async def _call(handler, *args):
+        result = handler(*args)
+        if asyncio.iscoroutine(result):
+            await result
+
+    async def _dispatch(self):
+        while True:
+            event = await self._queue.get()
+            self.received += 1
+            for handler in self._handlers.get(event.entity, ()):
+                try:
+                    await self._call(handler, event)
+                except Exception as e:
+                    logger.error(f"[CHANGES] Error handling {event.entity} {event.op} {event.id}: {e}")
+
+    async def _listen_once(self):
+        connection = await asyncpg.connect(self.dsn)
+        closed = asyncio.Event()
+        connection.add_termination_listener(lambda _: closed.set())
+        try:
+            await connection.add_listener(self.channel, self._on_notify)
+            self._connected.set()
+            logger.info(f"[CHANGES] Listening for changes on '{self.channel}'")
+            reconnected, self._ever_connected = self._ever_connected, True
+            if reconnected:
+                for handler in self._reconnect_handlers:
+                    try:
+                        await self._call(handler)
+                    except Exception as e:
+                        logger.error(f"[CHANGES] Error in reconnect handler: {e}")
+
+            while not closed.is_set():
+                try:
+                    await asyncio.wait_for(closed.wait(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    await connection.execute('SELECT 1')
+        finally:
+            self._connected.clear()
+            if not connection.is_closed():
+                await connection.close(timeout=5)
+
+    async def run(self):
+        """Держит подписку, переподключаясь после обрыва"""
+        dispatcher = asyncio.create_task(self._dispatch())
+        attempt = 0
+        try:
+            while True:
+                try:
+                    await self._listen_once()
+                    attempt = 0
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"[CHANGES] Listener connection error: {e}")
+                delay = RECONNECT_DELAYS[min(attempt, len(RECONNECT_DELAYS) - 1)]
+                attempt += 1
+                await asyncio.sleep(delay)
+        finally:
+            dispatcher.cancel()
+
+
+@lru_cache(maxsize=None)
+def get_change_listener() -> ChangeListener:
+    """Возвращает общую для процесса подписку на изменения"""
+    return ChangeListener(get_config().database.dsn)
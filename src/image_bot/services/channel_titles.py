@@ -0,0 +1,119 @@
+import asyncio
+import time
+from functools import lru_cache
+
+from sqlalchemy import select, update
+from telegram.ext import ExtBot
+
+from image_bot.config import get_config
+from image_bot.database.models import Channel
+from image_bot.services.change_events import ChangeEvent, OP_DELETE
+from image_bot.utils.logger import logger
+from image_bot.utils.rate_limiter import BULK_RATE_LIMIT_ARGS
+
+
+class ChannelTitleCache:
+    """Названия каналов из Telegram в памяти с TTL
+
+    Меню строится из памяти (или из channel.title в базе), а устаревшие названия
+    обновляются параллельно в фоне: не больше concurrency запросов get_chat
+    одновременно, измененные названия сохраняются одним UPDATE.
+    """
+
+    def __init__(self, session_factory, ttl: float = 600, concurrency: int = 10):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self._titles = {}  # telegram_id -> (название, time.monotonic() получения)
+        self._refresh_task = None
+
+    def _is_fresh(self, telegram_id: int, now: float) -> bool:
+        entry = self._titles.get(telegram_id)
+        return entry is not None and now - entry[1] < self.ttl
+
+    def title(self, channel: Channel) -> str:
+        """Название канала без запросов к Telegram"""
+        entry = self._titles.get(channel.telegram_id)
+        if entry is not None:
+            return entry[0]
+        return channel.title or f"Канал {channel.telegram_id}"
+
+    def forget(self, telegram_id: int):
+        self._titles.pop(telegram_id, None)
+
+    def on_change(self, event: ChangeEvent):
+        """Удаляет название канала, удаленного другим процессом"""
+        if event.op == OP_DELETE and event.data.get('telegram_id') is not None:
+            self.forget(event.data['telegram_id'])
+
+    def stale(self, channels) -> list:
+        now = time.monotonic()
+        return [channel for channel in channels if not self._is_fresh(channel.telegram_id, now)]
+
+    async def refresh(self, bot, channels):
+        """Запрашивает названия каналов параллельно и сохраняет изменившиеся одним запросом"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # Фоновые запросы не должны задерживать ответы пользователям
+        kwargs = {'rate_limit_args': BULK_RATE_LIMIT_ARGS} if isinstance(bot, ExtBot) else {}
+
+        async def fetch(channel):
+            async with semaphore:
+                try:
+                    chat = await bot.get_chat(channel.telegram_id, **kwargs)
+                    return channel, chat.title
+                except Exception as e:
+                    logger.debug(f"[CHANNELS] Error getting chat {channel.telegram_id}: {e}")
+                    return channel, None
+
+        changed = []
+        now = time.monotonic()
+        for channel, title in await asyncio.gather(*(fetch(channel) for channel in channels)):
+            if not title:
+                continue
+            self._titles[channel.telegram_id] = (title, now)
+            if title != channel.title:
+                channel.title = title
+                changed.append({'id': channel.id, 'title': title})
+
+        if changed:
+            async with self.session_factory() as session:
+                await session.execute(update(Channel), changed)
+                await session.commit()
+            logger.info(f"[CHANNELS] Updated {len(changed)} channel titles")
+
+    def refresh_in_background(self, bot, channels):
+        """Запускает обновление устаревших названий, не дожидаясь его"""
+        stale = self.stale(channels)
+        if not stale or (self._refresh_task is not None and not self._refresh_task.done()):
+            return
+        self._refresh_task = asyncio.create_task(self.refresh(bot, stale))
+        self._refresh_task.add_done_callback(self._log_refresh_error)
+
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"[CHANNELS] Error refreshing channel titles: {task.exception()}")
+
+    async def run(self, bot):
+        """Фоновое обновление: держит названия всех каналов актуальными"""
+        while True:
+            try:
+                async with self.session_factory() as session:
+                    result = await session.execute(select(Channel))
+                    channels = result.scalars().all()
+                stale = self.stale(channels)
+                if stale:
+                    await self.refresh(bot, stale)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[CHANNELS] Error refreshing channel titles: {e}")
+            await asyncio.sleep(max(self.ttl / 2, 1))
+
+
+@lru_cache(maxsize=None)
+def get_channel_title_cache() -> ChannelTitleCache:
+    """Возвращает общий для процесса кеш названий каналов"""
+    from image_bot.database.base import Session
+    config = get_config()
+    return ChannelTitleCache(Session, ttl=config.channel_title_ttl, concurrency=config.channel_refresh_concurrency)
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Iterable
+
+# Предел записей на случай, если время рассылок идет не по порядку (например, после перевода часов)
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+def fire_key(schedule_id: int, fire_at: datetime) -> tuple:
+    """Ключ срабатывания: расписание и запланированное время (с датой) рассылки"""
+    return schedule_id, fire_at.replace(second=0, microsecond=0)
+
+
+def mailing_task_key(schedule_id: int, fire_at: datetime) -> str:
+    """Ключ задачи рассылки в TaskRegistry (разные расписания одного канала не пересекаются)"""
+    return f"{schedule_id}@{fire_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class FireDedupe:
+    """Уже выполненные срабатывания расписаний с ограниченным временем хранения
+
+    Запись хранится ttl после запланированного времени рассылки, затем вытесняется;
+    число записей дополнительно ограничено max_entries. После перезапуска
+    заполняется из mailing_runs (seed), поэтому повторное срабатывание отсекается
+    еще до генерации изображений.
+    """
+
+    def __init__(self, ttl: timedelta = timedelta(hours=26), max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._fired = OrderedDict()  # fire_key -> fire_at, примерно в порядке времени рассылки
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._fired)
+
+    def seen(self, schedule_id: int, fire_at: datetime) -> bool:
+        return fire_key(schedule_id, fire_at) in self._fired
+
+    def mark(self, schedule_id: int, fire_at: datetime) -> bool:
+        """Отмечает срабатывание
+
+        Returns:
+            False, если оно уже было отмечено.
+        """
+        key = fire_key(schedule_id, fire_at)
+        if key in self._fired:
+            return False
+        self._fired[key] = key[1]
+        while len(self._fired) > self.max_entries:
+            self._fired.popitem(last=False)
+            self.evicted += 1
+        return True
+
+    def seed(self, fires: Iterable[tuple]):
+        """Добавляет срабатывания (schedule_id, fire_at), сохраненные в базе"""
+        for schedule_id, fire_at in sorted(fires, key=lambda fire: fire[1]):
+            if schedule_id is not None:
+                self.mark(schedule_id, fire_at)
+
+    def evict(self, now: datetime):
+        """Удаляет срабатывания старше ttl"""
+        cutoff = now - self.ttl
+        while self._fired:
+            key, fire_at = next(iter(self._fired.items()))
+            if fire_at >= cutoff:
+                break
+            del self._fired[key]
+            self.evicted += 1
@@ -0,0 +1,158 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import timedelta
+from functools import lru_cache
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert
+
+from image_bot.config import get_config
+from image_bot.database.models import SchedulerLease
+from image_bot.utils.logger import logger
+
+
+@lru_cache(maxsize=None)
+def process_id() -> str:
+    """Уникальный идентификатор процесса бота среди реплик"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaderElection:
+    """Выбор одного лидера среди реплик через аренду строки в scheduler_leases
+
+    Лидер продлевает аренду каждые ttl / 3 секунды. Если он упал или потерял связь
+    с базой, через ttl секунд роль забирает другая реплика. Время истечения
+    считается по часам базы, а сам лидер перестает считать себя лидером по своим
+    часам раньше, чем аренда истечет в базе: продление ограничено по времени, а
+    сторож снимает лидерство, как только аренда могла истечь, даже если запрос
+    к базе так и не вернулся. При штатной остановке аренда освобождается сразу.
+    """
+
+    def __init__(self, session_factory, name: str = 'scheduler', holder: str = None, ttl: float = 15):
+        self.session_factory = session_factory
+        self.name = name
+        self.holder = holder or process_id()
+        self.ttl = ttl
+        self.renew_interval = ttl / 3
+        self.renew_timeout = self.renew_interval * 0.8  # Зависшее продление не должно пережить аренду
+        self._valid_until = 0.0  # time.monotonic(), до которого аренда точно наша
+        self._leader = asyncio.Event()
+        self._follower = asyncio.Event()
+        self._follower.set()
+        self.reachable = True  # Удался ли последний запрос к базе (захвачена аренда или нет)
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader.is_set() and time.monotonic() < self._valid_until
+
+    async def wait_until_leader(self):
+        await self._leader.wait()
+
+    async def wait_until_follower(self):
+        await self._follower.wait()
+
+    async def try_acquire(self) -> bool:
+        """Захватывает или продлевает аренду одним запросом
+
+        Returns:
+            True, если аренда принадлежит этому процессу.
+        """
+        started = time.monotonic()
+        expires_at = func.now() + timedelta(seconds=self.ttl)
+        async with self.session_factory() as session:
+            result = await session.execute(
+                insert(SchedulerLease)
+                .values(name=self.name, holder=self.holder, expires_at=expires_at)
+                .on_conflict_do_update(
+                    index_elements=[SchedulerLease.name],
+                    set_={'holder': self.holder, 'expires_at': expires_at},
+                    # Чужую аренду можно забрать только после ее истечения
+                    where=(SchedulerLease.expires_at < func.now()) | (SchedulerLease.holder == self.holder)
+                )
+                .returning(SchedulerLease.holder)
+            )
+            acquired = result.scalar_one_or_none() == self.holder
+            await session.commit()
+        if acquired:
+            # Отсчет от начала запроса: в базе аренда истечет не раньше
+            self._valid_until = started + self.ttl
+        return acquired
+
+    async def release(self):
+        """Освобождает аренду, чтобы другая реплика стала лидером без ожидания"""
+        self._set_leader(False)
+        async with self.session_factory() as session:
+            await session.execute(
+                update(SchedulerLease)
+                .where(SchedulerLease.name == self.name, SchedulerLease.holder == self.holder)
+                .values(expires_at=func.now())
+            )
+            await session.commit()
+
+    def _set_leader(self, leader: bool):
+        if leader == self._leader.is_set():
+            return
+        if leader:
+            logger.info(f"[LEADER] {self.holder} acquired {self.name} lease")
+            self._follower.clear()
+            self._leader.set()
+        else:
+            logger.warning(f"[LEADER] {self.holder} lost {self.name} lease")
+            self._valid_until = 0.0
+            self._leader.clear()
+            self._follower.set()
+
+    async def _watchdog(self):
+        """Снимает лидерство по своим часам, как только аренда могла истечь в базе"""
+        while True:
+            if not self._leader.is_set():
+                await self._leader.wait()
+                continue
+            remaining = self._valid_until - time.monotonic()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+                continue
+            logger.warning(f"[LEADER] {self.name} lease was not renewed in time")
+            self._set_leader(False)
+
+    async def run(self):
+        """Фоновый цикл: захват и продление аренды"""
+        watchdog = asyncio.create_task(self._watchdog())
+        try:
+            while True:
+                try:
+                    self._set_leader(await asyncio.wait_for(self.try_acquire(), timeout=self.renew_timeout))
+                    self.reachable = True
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.reachable = False
+                    logger.error(f"[LEADER] Error renewing {self.name} lease: {e!r}")
+                    # Продлить аренду не удалось - остаемся лидером, только пока она точно действует
+                    if self._leader.is_set() and time.monotonic() >= self._valid_until - self.renew_interval:
+                        self._set_leader(False)
+                await asyncio.sleep(self.renew_interval)
+        finally:
+            watchdog.cancel()
+            if self._leader.is_set():
+                try:
+                    await asyncio.shield(self.release())
+                except Exception as e:
+                    logger.error(f"[LEADER] Error releasing {self.name} lease: {e}")
+
+
+@lru_cache(maxsize=None)
+def get_leader_election() -> LeaderElection:
+    """Возвращает общий для процесса выбор лидера планировщика"""
+    from image_bot.database.base import Session
+    return LeaderElection(Session, ttl=get_config().leader_lease_seconds)
+
+
+@lru_cache(maxsize=None)
+def get_polling_election() -> LeaderElection:
+    """Возвращает аренду getUpdates: опрашивает Telegram только одна реплика"""
+    from image_bot.database.base import Session
+    return LeaderElection(Session, name='updates', ttl=get_config().leader_lease_seconds)
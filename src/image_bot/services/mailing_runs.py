@@ -0,0 +1,312 @@
+import hashlib
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy import select, update, delete, or_, exists
+from sqlalchemy.dialects.postgresql import insert
+
+from image_bot.database.models import MailingBatch, MailingRun, Schedule
+from image_bot.utils.logger import logger
+
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+STATUS_ABANDONED = 'abandoned'
+
+
+def run_key(schedule_id: int, fire_at: datetime) -> str:
+    """Ключ идемпотентности рассылки: одно расписание срабатывает в момент fire_at один раз"""
+    return f"{schedule_id}:{fire_at.replace(microsecond=0).isoformat()}"
+
+
+def batch_digest(images: list) -> str:
+    """sha256 набора изображений: у каналов одной группы рассылки набор один и тот же"""
+    digest = hashlib.sha256()
+    for image in images:
+        digest.update(hashlib.sha256(image).digest())
+    return digest.hexdigest()
+
+
+class RunProgress:
+    """Ход рассылки в памяти, сохраняемый в mailing_runs
+
+    Перед отправкой шаг отмечается как начатый (sending_step). Выполнение шага
+    записывается вместе с началом следующего (или с планом, или с завершением
+    рассылки), поэтому на каждую отправку приходится одна запись в базу; перед
+    паузой между шагами выполненный шаг записывается сразу (flush).
+    Шаг, оставшийся начатым после перезапуска, не повторяется: неизвестно, дошло ли
+    сообщение, а повторная публикация хуже пропуска. Если процесс остановился после
+    отправки, но до следующей записи, шаг тоже считается прерванным и теряется только
+    его message_id. Без store (run_id None) ход рассылки не сохраняется.
+    Изображения хранятся в mailing_batches одним набором на всю группу рассылки,
+    запись ссылается на него через batch_id.
+    """
+
+    def __init__(self, store: 'MailingRunStore' = None, run_id: int = None, params: dict = None,
+                 plan: list = None, images: list = None, next_step: int = 0,
+                 sending_step: int = None, message_ids: dict = None, batch_id: int = None):
+        self.store = store
+        self.run_id = run_id
+        self.params = params or {}
+        self.plan = plan
+        self.images = images
+        self.batch_id = batch_id
+        self.next_step = next_step
+        self.sending_step = sending_step
+        self.message_ids = dict(message_ids or {})  # str(номер шага) -> message_id или None
+        self.pending = False  # выполненные шаги еще не записаны в базу
+        # Куда и когда идет рассылка (заполняется для записей из базы)
+        self.schedule_id = None
+        self.channel_id = None
+        self.telegram_id = None
+        self.fire_at = None
+
+    @classmethod
+    def from_row(cls, store: 'MailingRunStore', run: MailingRun, images: list = None) -> 'RunProgress':
+        progress = cls(store, run.id, run.params, run.plan, images, run.next_step,
+                       run.sending_step, run.message_ids, run.batch_id)
+        progress.schedule_id = run.schedule_id
+        progress.channel_id = run.channel_id
+        progress.telegram_id = run.telegram_id
+        progress.fire_at = run.fire_at
+        return progress
+
+    @property
+    def tracked(self) -> bool:
+        return self.store is not None and self.run_id is not None
+
+    def message_id(self, step: int) -> Optional[int]:
+        return self.message_ids.get(str(step))
+
+    def _progress(self) -> dict:
+        """Выполненные шаги для записи в базу"""
+        return {'next_step': self.next_step, 'sending_step': self.sending_step, 'message_ids': self.message_ids}
+
+    async def _save(self, **values):
+        if not self.tracked:
+            return
+        try:
+            await self.store.update(self.run_id, **values)
+        except Exception as e:
+            # Рассылка продолжается: без записи теряется только возможность продолжить ее после перезапуска
+            logger.warning(f"[MAILING RUNS] Error saving run {self.run_id}: {e}")
+
+    async def save_plan(self, plan: list, images: list):
+        self.plan = plan
+        self.images = images
+        if not self.tracked:
+            return
+        try:
+            self.batch_id = await self.store.save_plan(self.run_id, plan, images, **self._progress())
+        except Exception as e:
+            logger.warning(f"[MAILING RUNS] Error saving run {self.run_id}: {e}")
+
+    async def begin(self, step: int):
+        self.sending_step = step
+        self.pending = False
+        await self._save(**self._progress())
+
+    async def flush(self):
+        """Записывает выполненные шаги, еще не попавшие в базу"""
+        if self.pending:
+            self.pending = False
+            await self._save(**self._progress())
+
+    async def complete(self, step: int, message_id: Optional[int]):
+        """Отмечает шаг выполненным в памяти (в базу - со следующей записью)"""
+        self.message_ids[str(step)] = message_id
+        self.next_step = step + 1
+        self.sending_step = None
+        self.pending = True
+
+    async def skip_interrupted(self):
+        """Пропускает шаг, отправка которого была прервана перезапуском"""
+        if self.sending_step is None:
+            return
+        logger.warning(f"[MAILING RUNS] Run {self.run_id}: step {self.sending_step} was interrupted, not repeating it")
+        await self.complete(self.sending_step, None)
+
+    async def finish(self, status: str):
+        if not self.tracked:
+            return
+        try:
+            await self.store.finish(self.run_id, status, self.batch_id, **self._progress())
+        except Exception as e:
+            logger.warning(f"[MAILING RUNS] Error saving run {self.run_id}: {e}")
+
+
+class MailingRunStore:
+    """Таблица mailing_runs: запись о каждой рассылке в канал и ее шагах"""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    async def start(self, schedule_id: int, channel_id: int, telegram_id: int,
+                    fire_at: datetime, params: dict, worker_id: str = None) -> Optional[RunProgress]:
+        """Создает запись о рассылке
+
+        Returns:
+            RunProgress или None, если рассылка с этим ключом уже запускалась (в том числе до перезапуска).
+        """
+        async with self.session_factory() as session:
+            result = await session.execute(
+                insert(MailingRun)
+                .values(
+                    idempotency_key=run_key(schedule_id, fire_at),
+                    schedule_id=schedule_id,
+                    channel_id=channel_id,
+                    telegram_id=telegram_id,
+                    fire_at=fire_at,
+                    status=STATUS_RUNNING,
+                    worker_id=worker_id,
+                    params=params,
+                    next_step=0,
+                    message_ids={}
+                )
+                .on_conflict_do_nothing(index_elements=[MailingRun.idempotency_key])
+                .returning(MailingRun.id)
+            )
+            run_id = result.scalar_one_or_none()
+            if run_id is not None:
+                # Время последней рассылки для политики пропущенных рассылок (updated_at не меняется)
+                await session.execute(
+                    update(Schedule)
+                    .where(Schedule.id == schedule_id)
+                    .values(last_fired_at=fire_at, updated_at=Schedule.updated_at)
+                )
+            await session.commit()
+        if run_id is None:
+            return None
+        return RunProgress(self, run_id, params)
+
+    async def update(self, run_id: int, **values):
+        async with self.session_factory() as session:
+            await session.execute(update(MailingRun).where(MailingRun.id == run_id).values(**values))
+            await session.commit()
+
+    async def save_plan(self, run_id: int, plan: list, images: list, **values) -> int:
+        """Сохраняет план рассылки и ссылку на набор изображений (набор создается один раз на группу)
+
+        Returns:
+            id набора в mailing_batches.
+        """
+        async with self.session_factory() as session:
+            # DO UPDATE вместо DO NOTHING: возвращает id существующего набора и блокирует его до commit
+            result = await session.execute(
+                insert(MailingBatch)
+                .values(digest=batch_digest(images), images=images)
+                .on_conflict_do_update(index_elements=[MailingBatch.digest], set_={'digest': MailingBatch.digest})
+                .returning(MailingBatch.id)
+            )
+            batch_id = result.scalar_one()
+            await session.execute(
+                update(MailingRun).where(MailingRun.id == run_id).values(plan=plan, batch_id=batch_id, **values)
+            )
+            await session.commit()
+        return batch_id
+
+    @staticmethod
+    async def _release_batches(session, batch_ids: list):
+        """Удаляет наборы, на которые больше не ссылается ни одна незавершенная рассылка"""
+        batch_ids = [batch_id for batch_id in batch_ids if batch_id is not None]
+        if not batch_ids:
+            return
+        running = exists().where(MailingRun.batch_id == MailingBatch.id, MailingRun.status == STATUS_RUNNING)
+        await session.execute(delete(MailingBatch).where(MailingBatch.id.in_(batch_ids), ~running))
+
+    async def finish(self, run_id: int, status: str, batch_id: int = None, **values):
+        """Завершает рассылку и освобождает набор изображений, если другие рассылки группы тоже завершены"""
+        async with self.session_factory() as session:
+            await session.execute(update(MailingRun).where(MailingRun.id == run_id).values(status=status, **values))
+            await self._release_batches(session, [batch_id])
+            await session.commit()
+
+    async def purge(self, older_than: datetime) -> int:
+        """Удаляет завершенные записи и оставшиеся без рассылок наборы изображений старше older_than"""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                delete(MailingRun)
+                .where(MailingRun.status != STATUS_RUNNING, MailingRun.fire_at < older_than)
+            )
+            running = exists().where(MailingRun.batch_id == MailingBatch.id, MailingRun.status == STATUS_RUNNING)
+            await session.execute(delete(MailingBatch).where(MailingBatch.created_at < older_than, ~running))
+            await session.commit()
+            return result.rowcount
+
+    async def recent_fires(self, since: datetime) -> list:
+        """Срабатывания (schedule_id, fire_at), для которых рассылка запускалась после since"""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(MailingRun.schedule_id, MailingRun.fire_at).where(MailingRun.fire_at >= since)
+            )
+            return [tuple(row) for row in result.all()]
+
+    async def started_keys(self, keys: list) -> set:
+        """Ключи идемпотентности, для которых рассылка уже запускалась"""
+        if not keys:
+            return set()
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(MailingRun.idempotency_key).where(MailingRun.idempotency_key.in_(keys))
+            )
+            return set(result.scalars().all())
+
+    async def take_unfinished(self, now: datetime, resume_window: timedelta, worker_id: str = None,
+                              busy_workers=()) -> list:
+        """Забирает прерванные рассылки: еще не устаревшие - для продолжения, остальные отмечает брошенными
+
+        Строки блокируются через FOR UPDATE SKIP LOCKED, поэтому одновременно
+        запущенные воркеры забирают разные рассылки.
+
+        Args:
+            worker_id: Воркер, которому переходят рассылки.
+            busy_workers: Живые воркеры, рассылки которых не забираются.
+        """
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(MailingRun)
+                .where(
+                    MailingRun.status == STATUS_RUNNING,
+                    or_(MailingRun.worker_id.is_(None), MailingRun.worker_id.notin_(list(busy_workers)))
+                )
+                .order_by(MailingRun.fire_at)
+                .with_for_update(skip_locked=True)
+            )
+            resumable, abandoned = [], []
+            for run in result.scalars().all():
+                (resumable if now - run.fire_at <= resume_window else abandoned).append(run)
+
+            batch_ids = {run.batch_id for run in resumable if run.batch_id is not None}
+            images = {}
+            if batch_ids:
+                batches = await session.execute(
+                    select(MailingBatch.id, MailingBatch.images).where(MailingBatch.id.in_(batch_ids))
+                )
+                images = dict(batches.all())
+
+            if resumable:
+                await session.execute(
+                    update(MailingRun)
+                    .where(MailingRun.id.in_([run.id for run in resumable]))
+                    .values(worker_id=worker_id)
+                )
+            if abandoned:
+                await session.execute(
+                    update(MailingRun)
+                    .where(MailingRun.id.in_([run.id for run in abandoned]))
+                    .values(status=STATUS_ABANDONED)
+                )
+                await self._release_batches(session, list({run.batch_id for run in abandoned}))
+            await session.commit()
+
+        if abandoned:
+            logger.warning(f"[MAILING RUNS] Abandoned {len(abandoned)} interrupted runs older than {resume_window}")
+        return [RunProgress.from_row(self, run, images.get(run.batch_id)) for run in resumable]
+
+
+@lru_cache(maxsize=None)
+def get_mailing_run_store() -> MailingRunStore:
+    """Возвращает общее для процесса хранилище хода рассылок"""
+    from image_bot.database.base import Session
+    return MailingRunStore(Session)
@@ -1,13 +1,24 @@
 import asyncio
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 from pathlib import Path
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, func
 from telegram import Bot, InputMediaPhoto, InlineKeyboardButton, InlineKeyboardMarkup
-import json
+from telegram.ext import ExtBot
 
+from image_bot.config import get_config
 from image_bot.database.models import Schedule, Channel
+from image_bot.services.change_events import publish_change, ENTITY_CHANNEL, ENTITY_SCHEDULE, OP_DELETE
+from image_bot.services.channel_titles import get_channel_title_cache
+from image_bot.services.mailing_runs import RunProgress, STATUS_COMPLETED, STATUS_FAILED
+from image_bot.services.misfire import POLICY_SKIP, validate_misfire
+from image_bot.services.message_templates import CompiledMessages, compile_messages, get_compiled_messages
+from image_bot.services.photo_cache import get_photo_cache
+from image_bot.services.render_service import get_render_service
+from image_bot.services.schedule_index import get_schedule_index, schedule_payload
 from image_bot.utils.logger import logger
+from image_bot.utils.rate_limiter import BULK_RATE_LIMIT_ARGS
+from image_bot.utils.retry import Retrier, TEXT_POLICY, PHOTO_POLICY
 
 
 class MailingService:
@@ -15,7 +26,11 @@ class MailingService:
         self.bot = application.bot if hasattr(application, 'bot') else application
         self.session_factory = session_factory
         self.base_dir = Path(__file__).parent.parent.parent.parent
-        self.image_generator = None
+        self.render_service = get_render_service()
+        self.photo_cache = get_photo_cache()  # Повторные изображения отправляются по file_id
+        # Рассылки идут с низким приоритетом, чтобы не задерживать ответы админам
+        self.send_kwargs = {'rate_limit_args': BULK_RATE_LIMIT_ARGS} if isinstance(self.bot, ExtBot) else {}
+        self.retrier = Retrier("mailing")  # Повторные попытки отправки и их метрики
 
     # Методы для управления каналами
     async def add_channel(self, channel_id: int, title: str = None) -> Channel:
@@ -46,7 +61,9 @@ class MailingService:
                 
                 if channel:
                     await session.delete(channel)
+                    await publish_change(session, ENTITY_CHANNEL, channel.id, OP_DELETE, telegram_id=channel.telegram_id)
                     await session.commit()
+                    get_schedule_index().remove_channel(channel.id)
                     return True
                 return False
             except Exception as e:
@@ -94,7 +111,9 @@ class MailingService:
                 if not channel:
                     raise ValueError(f"Channel {channel_id} not found")
 
-                # Проверяем параметры
+                # Проверяем параметры и шаблоны сообщений (TemplateError - подкласс ValueError)
+                if messages:
+                    messages = compile_messages(messages).messages
                 if message_delay_seconds < 0 or image_delay_seconds < 0:
                     raise ValueError("Задержка не может быть отрицательной")
                 if images_count < 1:
@@ -103,7 +122,7 @@ class MailingService:
                 schedule = Schedule(
                     channel_id=channel.id,
                     time_of_day=schedule_time,
-                    messages=json.dumps(messages) if messages else None,
+                    messages=messages or None,
                     message_delay_seconds=message_delay_seconds,
                     image_delay_seconds=image_delay_seconds,
                     images_count=images_count,
@@ -114,7 +133,10 @@ class MailingService:
                     enabled=True
                 )
                 session.add(schedule)
+                await session.flush()
+                await publish_change(session, ENTITY_SCHEDULE, schedule.id)
                 await session.commit()
+                get_schedule_index().upsert(schedule)
                 return schedule
             except Exception as e:
                 logger.error(f"Error creating schedule: {e}")
@@ -128,7 +150,9 @@ class MailingService:
                 schedule = await session.get(Schedule, schedule_id)
                 if schedule:
                     await session.delete(schedule)
+                    await publish_change(session, ENTITY_SCHEDULE, schedule_id, OP_DELETE)
                     await session.commit()
+                    get_schedule_index().remove(schedule_id)
                     return True
                 return False
             except Exception as e:
@@ -136,8 +160,17 @@ class MailingService:
                 await session.rollback()
                 raise
 
-    async def update_schedule(self, schedule_id: int, enabled: bool = None, new_time: time = None) -> Schedule:
-        """Обновляет расписание"""
+    async def update_schedule(self, schedule_id: int, enabled: bool = None, new_time: time = None,
+                              misfire_policy: str = None, misfire_grace_seconds: int = None) -> Schedule:
+        """Обновляет расписание
+
+        Args:
+            misfire_policy: Политика пропущенных рассылок (skip, fire_late, next_slot).
+            misfire_grace_seconds: Насколько поздно можно выполнить пропущенную рассылку.
+
+        Raises:
+            ValueError: Политика вместе с опозданием (с учетом значений по умолчанию) недопустима.
+        """
         async with self.session_factory() as session:
             try:
                 schedule = await session.get(Schedule, schedule_id)
@@ -146,8 +179,21 @@ class MailingService:
                         schedule.enabled = enabled
                     if new_time is not None:
                         schedule.time_of_day = new_time
+                    if misfire_policy is not None or misfire_grace_seconds is not None:
+                        config = get_config()
+                        policy = misfire_policy or schedule.misfire_policy or config.misfire_policy
+                        grace = misfire_grace_seconds
+                        if grace is None:
+                            grace = schedule.misfire_grace_seconds
+                        validate_misfire(policy, config.misfire_grace_seconds if grace is None else grace)
+                    if misfire_policy is not None:
+                        schedule.misfire_policy = misfire_policy
+                    if misfire_grace_seconds is not None:
+                        schedule.misfire_grace_seconds = misfire_grace_seconds
                     schedule.updated_at = datetime.now()
+                    await publish_change(session, ENTITY_SCHEDULE, schedule.id)
                     await session.commit()
+                    get_schedule_index().upsert(schedule)
                     return schedule
                 return None
             except Exception as e:
@@ -169,6 +215,69 @@ class MailingService:
             result = await session.execute(query)
             return result.scalars().all()
 
+    async def get_channel_telegram_ids(self, channel_ids) -> dict:
+        """Получает telegram_id для набора каналов одним запросом: id канала -> telegram_id"""
+        if not channel_ids:
+            return {}
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Channel.id, Channel.telegram_id).where(Channel.id.in_(list(channel_ids)))
+            )
+            return {channel_id: telegram_id for channel_id, telegram_id in result.all()}
+
+    @staticmethod
+    def _payload_query():
+        """Колонки расписания, нужные для рассылки, и telegram_id канала"""
+        return (
+            select(
+                Schedule.id, Schedule.channel_id, Schedule.time_of_day, Schedule.enabled, Schedule.messages,
+                Schedule.message_delay_seconds, Schedule.image_delay_seconds, Schedule.images_count,
+                Schedule.bet_amount, Schedule.welcome_to_first_signal_seconds, Schedule.signal_to_win_seconds,
+                Schedule.between_signals_seconds, Schedule.last_signal_to_summary_seconds, Schedule.template,
+                Schedule.misfire_policy, Schedule.misfire_grace_seconds, Schedule.last_fired_at,
+                Schedule.created_at, Schedule.updated_at, Channel.telegram_id
+            )
+            .join(Channel, Schedule.channel_id == Channel.id)
+        )
+
+    async def get_schedule_payload(self, schedule_id: int):
+        """Параметры рассылки одного расписания (None, если его нет)"""
+        async with self.session_factory() as session:
+            result = await session.execute(self._payload_query().where(Schedule.id == schedule_id))
+            row = result.first()
+        return schedule_payload(row) if row is not None else None
+
+    async def get_misfire_candidates(self, default_policy: str) -> list:
+        """Активные расписания, пропущенную рассылку которых можно выполнить позже (политика не skip)"""
+        policy = func.coalesce(Schedule.misfire_policy, default_policy)
+        query = self._payload_query().where(Schedule.enabled == True, policy != POLICY_SKIP)
+        async with self.session_factory() as session:
+            result = await session.execute(query)
+            return [schedule_payload(row) for row in result.all()]
+
+    async def get_due_schedules(self, start: datetime = None, end: datetime = None) -> list:
+        """Получает активные расписания с временем рассылки в окне [start, end)
+
+        Выбирает только колонки, нужные для рассылки, и telegram_id канала одним запросом.
+        Окно может переходить через полночь. Без start/end возвращает все активные расписания.
+
+        Returns:
+            list[dict]: Параметры рассылки в формате schedule_payload.
+        """
+        query = self._payload_query().where(Schedule.enabled == True)
+
+        if start is not None and end is not None and end - start < timedelta(days=1):
+            start_time, end_time = start.time(), end.time()
+            if start_time < end_time:
+                query = query.where(and_(Schedule.time_of_day >= start_time, Schedule.time_of_day < end_time))
+            else:
+                # Окно через полночь: [start, 24:00) и [00:00, end)
+                query = query.where((Schedule.time_of_day >= start_time) | (Schedule.time_of_day < end_time))
+
+        async with self.session_factory() as session:
+            result = await session.execute(query)
+            return [schedule_payload(row) for row in result.all()]
+
     async def generate_images(self, count=5, bet_amount=0, template="lkr"):
         """Генерирует набор изображений
         
@@ -179,20 +288,29 @@ class MailingService:
                                      Доступные варианты: "lkr", "pkr", "uzs".
         """
         try:
-            # Инициализируем генератор изображений при первом использовании
-            if self.image_generator is None:
-                from image_bot.image_generation.generator import ImageGenerator
-                self.image_generator = ImageGenerator()
-            
-            # Генерируем набор изображений с использованием суммы ставки и выбранного шаблона
+            # Генерируем набор изображений в пуле процессов, не блокируя event loop
             logger.info(f"Using template: {template} for image generation")
-            images, data_list = self.image_generator.generate_images(count, bet_amount, template)
+            images, data_list = await self.render_service.render(count, bet_amount, template)
             
             return images, data_list
         except Exception as e:
             logger.error(f"Error generating images: {e}")
             return None, None
 
+    @staticmethod
+    def mailing_params(schedule: dict, compiled: CompiledMessages) -> dict:
+        """Параметры рассылки по расписанию (сохраняются в mailing_runs, чтобы продолжить ее после перезапуска)"""
+        return {
+            'messages': compiled.messages,
+            'images_count': schedule['images_count'],
+            'bet_amount': schedule['bet_amount'],
+            'template': schedule.get('template', 'lkr'),
+            'welcome_to_first_signal_seconds': schedule.get('welcome_to_first_signal_seconds', 60),
+            'signal_to_win_seconds': schedule.get('signal_to_win_seconds', 45),
+            'between_signals_seconds': schedule.get('between_signals_seconds', 25),
+            'last_signal_to_summary_seconds': schedule.get('last_signal_to_summary_seconds', 40),
+        }
+
     async def send_message_with_image(self, channel_id: int, messages: str,
                                     message_delay_seconds: int = 60,
                                     image_delay_seconds: int = 60,
@@ -202,308 +320,294 @@ class MailingService:
                                     signal_to_win_seconds: int = 45,
                                     between_signals_seconds: int = 25,
                                     last_signal_to_summary_seconds: int = 40,
-                                    template: str = "lkr"):
-        """Отправляет сообщения и изображения в канал"""
+                                    template: str = "lkr",
+                                    images_task: asyncio.Task = None,
+                                    run: RunProgress = None):
+        """Отправляет сообщения и изображения в канал
+
+        Args:
+            images_task (asyncio.Task, optional): Уже запущенная генерация изображений
+                (результат generate_images). Если не передана, генерация запускается
+                параллельно с приветственным сообщением.
+            run (RunProgress, optional): Запись в mailing_runs, в которую сохраняется
+                каждый шаг рассылки. Если не передана, ход рассылки не сохраняется.
+        """
+        # Шаблоны уже скомпилированы планировщиком; список или JSON-строку компилируем здесь
+        if isinstance(messages, CompiledMessages):
+            compiled = messages
+        else:
+            compiled = get_compiled_messages(None, None, messages)
+
+        params = {
+            'images_count': images_count,
+            'bet_amount': bet_amount,
+            'template': template,
+            'welcome_to_first_signal_seconds': welcome_to_first_signal_seconds,
+            'signal_to_win_seconds': signal_to_win_seconds,
+            'between_signals_seconds': between_signals_seconds,
+            'last_signal_to_summary_seconds': last_signal_to_summary_seconds,
+        }
+
+        # Запускаем генерацию изображений сразу, чтобы она шла во время приветствия и ожидания
+        own_task = images_task is None
+        if own_task:
+            logger.info(f"Generating {images_count} images with bet_amount={bet_amount} and template={template}")
+            images_task = asyncio.create_task(self.generate_images(images_count, bet_amount, template))
+
+        try:
+            await self._deliver(channel_id, compiled, params, images_task, run or RunProgress(params=params))
+        finally:
+            # Своя генерация не нужна после отмены или ошибки рассылки: набор, еще
+            # ждущий в очереди пула, снимается, а уже начатый воркер дорисовывает впустую
+            if own_task:
+                images_task.cancel()
+
+    async def resume_run(self, run: RunProgress):
+        """Продолжает рассылку, прерванную перезапуском, со следующего шага"""
+        params = run.params
+        compiled = compile_messages(params['messages'], strict=False)
+        images_task = None
+        if run.plan is not None and run.images is None:
+            logger.error(f"[MAILING RUNS] Run {run.run_id} has no saved images, cannot resume it")
+            await run.finish(STATUS_FAILED)
+            return
+        if run.plan is None:
+            # Процесс остановился до генерации изображений - генерируем новый набор
+            images_task = asyncio.create_task(self.generate_images(
+                params['images_count'], params['bet_amount'], params.get('template', 'lkr')
+            ))
+        logger.info(f"[MAILING RUNS] Resuming run {run.run_id} to {run.telegram_id} from step {run.next_step}")
+        try:
+            await self._deliver(run.telegram_id, compiled, params, images_task, run)
+        finally:
+            if images_task is not None:
+                images_task.cancel()
+
+    async def _deliver(self, channel_id: int, compiled: CompiledMessages, params: dict,
+                       images_task: asyncio.Task, run: RunProgress):
+        """Выполняет шаги рассылки начиная с run.next_step, сохраняя каждый шаг в run"""
         try:
-            # Парсим сообщения из JSON с сохранением форматирования
-            if isinstance(messages, str):
-                try:
-                    message_list = json.loads(messages)
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error parsing messages JSON: {e}")
-                    # Если не удалось распарсить JSON, используем строку как есть
-                    message_list = [messages, "", ""]
+            if run.plan is None:
+                if run.next_step == 0 and run.sending_step is None:
+                    # Отправляем первое сообщение с сохранением форматирования и повторными попытками
+                    logger.info("Sending welcome message")
+                    await run.begin(0)
+                    welcome = await self._send_step(channel_id, self._text_step('welcome', compiled.welcome, 0), run)
+                    await run.complete(0, welcome.message_id if welcome else None)
+
+                    if welcome:
+                        logger.info("Welcome message sent successfully")
+                    else:
+                        # Продолжаем выполнение, даже если не удалось отправить приветственное сообщение
+                        logger.error("Failed to send welcome message")
+
+                    # Используем задержку между приветственным сообщением и 1 сигналом
+                    delay = params['welcome_to_first_signal_seconds']
+                    await run.flush()
+                    logger.info(f"Waiting {delay} seconds before first signal")
+                    await asyncio.sleep(delay)
+                    logger.info("Wait completed, proceeding to signals")
+                else:
+                    # Приветствие отправлено до перезапуска
+                    await run.skip_interrupted()
+
+                # Забираем изображения, сгенерированные во время ожидания
+                # shield: задача может быть общей для нескольких каналов, отмена одной рассылки ее не отменяет
+                generated_images, data_list = await asyncio.shield(images_task)
+                if not generated_images or not data_list:
+                    logger.error("Failed to generate images")
+                    await run.finish(STATUS_FAILED)
+                    return
+
+                logger.info(f"Successfully generated {len(generated_images)} images")
+                plan = self._build_plan(compiled, params, data_list)
+                await run.save_plan(plan, list(generated_images))
             else:
-                message_list = messages
-            
-            if len(message_list) != 3:
-                raise ValueError("Необходимо указать ровно три сообщения")
-
-            # Отправляем первое сообщение с сохранением форматирования и повторными попытками
-            logger.info("Sending welcome message")
-            welcome_sent = False
-            max_welcome_retries = 3
-            welcome_retry_count = 0
-            
-            while welcome_retry_count < max_welcome_retries and not welcome_sent:
-                try:
-                    await asyncio.wait_for(
-                        self.bot.send_message(
-                            chat_id=channel_id,
-                            text=message_list[0],
-                            parse_mode='HTML'  # Используем HTML для сохранения форматирования
-                        ),
-                        timeout=15
-                    )
-                    welcome_sent = True
-                    logger.info("Welcome message sent successfully")
-                except asyncio.TimeoutError:
-                    welcome_retry_count += 1
-                    logger.warning(f"Timeout sending welcome message, retry {welcome_retry_count}/{max_welcome_retries}")
-                    await asyncio.sleep(2)
-                except Exception as e:
-                    logger.error(f"Error sending welcome message: {e}")
-                    break
-                    
-            if not welcome_sent:
-                logger.error(f"Failed to send welcome message after {max_welcome_retries} retries")
-                # Продолжаем выполнение, даже если не удалось отправить приветственное сообщение
-            
-            # Используем задержку между приветственным сообщением и 1 сигналом
-            logger.info(f"Waiting {welcome_to_first_signal_seconds} seconds before first signal")
-            await asyncio.sleep(welcome_to_first_signal_seconds)
-            logger.info("Wait completed, proceeding to signals")
+                await run.skip_interrupted()
 
-            # Генерируем изображения с использованием суммы ставки и выбранного шаблона
-            logger.info(f"Generating {images_count} images with bet_amount={bet_amount} and template={template}")
-            generated_images, data_list = await self.generate_images(images_count, bet_amount, template)
-            if not generated_images or not data_list:
-                logger.error("Failed to generate images")
-                return
-            
-            logger.info(f"Successfully generated {len(generated_images)} images")
+            await self._run_steps(channel_id, run)
+            await run.finish(STATUS_COMPLETED)
 
-            total_multiplied = 0
-            success_count = 0
-            results_list = []
+        except Exception as e:
+            # asyncio.CancelledError сюда не попадает: остановленная рассылка остается
+            # в статусе running и продолжается после перезапуска
+            logger.error(f"Error in send_message_with_image: {e}")
+            await run.finish(STATUS_FAILED)
+            raise
 
-            # Отправляем каждое изображение последовательно
-            logger.info(f"Starting to send {len(generated_images)} images one by one")
-            
-            # Подготавливаем все сообщения и данные для отправки
-            messages_to_send = []
-            
-            for i, (image_path, data) in enumerate(zip(generated_images, data_list)):
-                try:
-                    logger.info(f"Preparing data for image {i+1}/{len(generated_images)}")
-                    
-                    # Проверяем, является ли это fail-изображением
-                    multiplied_str = data.get('multiplied_number', '0')
-                    is_fail = multiplied_str == 'fail'
-
-                    if not is_fail:
-                        # Убираем 'x' с конца, удаляем запятые и преобразуем в float
-                        number_str = data['multiplied_number'].rstrip('x')
-                        # Удаляем запятые из строки перед преобразованием в float
-                        number = float(number_str.replace(',', ''))
-                        total_multiplied += number
-                        success_count += 1
-
-                        # Добавляем успешный результат в список
-                        sub_num_str = data['subtracted_number'].rstrip('x')
-                        results_list.append(f"✅ {sub_num_str}")
-
-                        # Вычисляем среднее между main_number и subtracted_number
-                        try:
-                            main_num = float(data['main_number'].rstrip('x'))
-                            sub_num = float(data['subtracted_number'].rstrip('x'))
-                            avg_number = round((main_num + sub_num) / 2)
-                            message_text = message_list[1].format(
-                                average=f"{avg_number}x",
-                                main_number=data['main_number'],
-                                subtracted_number=data['subtracted_number'],
-                                multiplied_number=data['multiplied_number']
-                            )
-                        except (ValueError, AttributeError):
-                            message_text = message_list[1].format(
-                                average="N/A",
-                                main_number=data['main_number'],
-                                subtracted_number=data['subtracted_number'],
-                                multiplied_number=data['multiplied_number']
-                            )
+    @staticmethod
+    def _text_step(name: str, text: str, delay: int) -> dict:
+        return {'kind': 'text', 'name': name, 'text': text, 'delay': delay}
 
-                    else:
-                        # Для fail-изображений добавляем отрицательное значение к общей сумме
-                        try:
-                            if multiplied_str != 'fail':
-                                number = float(multiplied_str.replace(',', ''))
-                                total_multiplied += number
-                        except (ValueError, AttributeError):
-                            pass
-
-                        # Добавляем неудачный результат в список
-                        sub_num_str = data['subtracted_number'].rstrip('x')
-                        results_list.append(f"❌ {sub_num_str}")
-
-                        # Формируем сообщение для fail-изображения
-                        try:
-                            message_text = message_list[1].format(
-                                average="FAIL",
-                                main_number=data['main_number'],
-                                subtracted_number=data['subtracted_number'],
-                                multiplied_number="FAIL"
-                            )
-                        except (ValueError, AttributeError, KeyError):
-                            message_text = f"❌ FAIL: {data['subtracted_number']}"
-                    
-                    # Добавляем данные для отправки
-                    messages_to_send.append({
-                        'message_text': message_text,
-                        'image_path': image_path
-                    })
-                    
-                except Exception as e:
-                    logger.error(f"Error preparing data for image {i}: {e}")
-                    continue
-            
-            # Последовательно отправляем все сообщения и изображения
-            logger.info(f"Starting to send {len(messages_to_send)} signals one by one")
-            
-            for i, item in enumerate(messages_to_send):
-                try:
-                    # Отправляем сообщение перед картинкой с повторными попытками
-                    logger.info(f"Sending message for signal {i+1}")
-                    max_msg_retries = 3
-                    msg_retry_count = 0
-                    msg_success = False
-                    msg = None
-                    
-                    while msg_retry_count < max_msg_retries and not msg_success:
-                        try:
-                            # Увеличиваем таймаут для отправки сообщения
-                            msg = await asyncio.wait_for(
-                                self.bot.send_message(
-                                    chat_id=channel_id,
-                                    text=item['message_text'],
-                                    parse_mode='HTML'
-                                ),
-                                timeout=15  # Увеличиваем таймаут до 15 секунд
-                            )
-                            msg_success = True
-                            logger.info(f"Message for signal {i+1} sent successfully")
-                        except asyncio.TimeoutError:
-                            msg_retry_count += 1
-                            logger.warning(f"Timeout sending message {i+1}, retry {msg_retry_count}/{max_msg_retries}")
-                            await asyncio.sleep(2)  # Небольшая пауза перед повторной попыткой
-                        except Exception as e:
-                            logger.error(f"Error sending message {i+1}: {e}")
-                            break
-                    
-                    if not msg_success or not msg:
-                        logger.error(f"Failed to send message {i+1} after {max_msg_retries} retries")
-                        # Пропускаем этот сигнал и переходим к следующему
-                        continue
-                    
-                    # Используем задержку между сигналом и выигрышем
-                    logger.info(f"Waiting {signal_to_win_seconds} seconds before sending image {i+1}")
-                    await asyncio.sleep(signal_to_win_seconds)  
-
-                    # Отправляем изображение в ответ на сообщение с повторными попытками
-                    logger.info(f"Sending image {i+1}")
-                    max_retries = 3
-                    retry_count = 0
-                    success = False
-                    
-                    while retry_count < max_retries and not success:
-                        try:
-                            with open(item['image_path'], 'rb') as photo:
-                                # Увеличиваем таймаут для отправки изображения
-                                await asyncio.wait_for(
-                                    self.bot.send_photo(
-                                        chat_id=channel_id,
-                                        photo=photo,
-                                        reply_to_message_id=msg.message_id
-                                    ),
-                                    timeout=30  # Увеличиваем таймаут до 30 секунд
-                                )
-                            success = True
-                            logger.info(f"Image {i+1} sent successfully")
-                        except asyncio.TimeoutError:
-                            retry_count += 1
-                            logger.warning(f"Timeout sending image {i+1}, retry {retry_count}/{max_retries}")
-                            await asyncio.sleep(2)  # Небольшая пауза перед повторной попыткой
-                        except Exception as e:
-                            logger.error(f"Error sending image {i+1}: {e}")
-                            break
-                    
-                    if not success:
-                        logger.error(f"Failed to send image {i+1} after {max_retries} retries")
-                        # Продолжаем с следующим сигналом, даже если этот не удался
-
-                    # Делаем паузу перед следующим сигналом
-                    if i < len(messages_to_send) - 1:
-                        # Используем задержку между сигналами
-                        logger.info(f"Waiting {between_signals_seconds} seconds before next signal")
-                        await asyncio.sleep(between_signals_seconds)
-                        logger.info("Wait completed, proceeding to next signal")  
-                except Exception as e:
-                    logger.error(f"Error sending signal {i+1}: {e}")
-                    continue
-
-            # Делаем паузу перед отправкой итогового сообщения
-            logger.info(f"Waiting {last_signal_to_summary_seconds} seconds before sending summary")
-            await asyncio.sleep(last_signal_to_summary_seconds)
-            logger.info("Wait completed, proceeding to summary")
-            
-            # Отправляем итоговое сообщение с форматированным числом
+    def _build_plan(self, compiled: CompiledMessages, params: dict, data_list: list) -> list:
+        """Готовит все шаги рассылки: тексты сигналов, ответы-изображения и итог
+
+        Шаг 0 - приветствие, затем для каждого изображения текст сигнала и фото
+        в ответ на него, последний шаг - итоговое сообщение. Изображения задаются
+        номером в наборе, задержка delay выдерживается перед шагом.
+        """
+        plan = [self._text_step('welcome', compiled.welcome, 0)]
+        total_multiplied = 0
+        results_list = []
+
+        for i, data in enumerate(data_list):
             try:
-                logger.info("Preparing summary message")
-                # Форматируем число с разделителями тысяч
-                formatted_total = "{:,.2f}".format(total_multiplied)
-                # Формируем строку с результатами
-                results_summary = "\n".join(results_list)
-                try:
-                    # Пробуем отформатировать сообщение с доступными переменными
-                    final_message = message_list[2].format(
-                        total=formatted_total, 
-                        results=results_summary
-                    )
-                except KeyError as e:
-                    # Если какая-то переменная отсутствует, логируем ошибку и используем базовый формат
-                    logger.warning(f"Missing variable in final message format: {e}")
-                    final_message = f"Итого: {formatted_total}\n\n{results_summary}"
-                
-                logger.info("Sending summary message")
-                summary_sent = False
-                max_summary_retries = 3
-                summary_retry_count = 0
-                
-                while summary_retry_count < max_summary_retries and not summary_sent:
+                logger.info(f"Preparing data for image {i+1}/{len(data_list)}")
+
+                # Проверяем, является ли это fail-изображением
+                multiplied_str = data.get('multiplied_number', '0')
+                is_fail = multiplied_str == 'fail'
+
+                if not is_fail:
+                    # Убираем 'x' с конца, удаляем запятые и преобразуем в float
+                    number_str = data['multiplied_number'].rstrip('x')
+                    # Удаляем запятые из строки перед преобразованием в float
+                    number = float(number_str.replace(',', ''))
+                    total_multiplied += number
+
+                    # Добавляем успешный результат в список
+                    sub_num_str = data['subtracted_number'].rstrip('x')
+                    results_list.append(f"✅ {sub_num_str}")
+
+                    # Вычисляем среднее между main_number и subtracted_number
                     try:
-                        await asyncio.wait_for(
-                            self.bot.send_message(
-                                chat_id=channel_id,
-                                text=final_message,
-                                parse_mode='HTML'
-                            ),
-                            timeout=15
+                        main_num = float(data['main_number'].rstrip('x'))
+                        sub_num = float(data['subtracted_number'].rstrip('x'))
+                        avg_number = round((main_num + sub_num) / 2)
+                        message_text = compiled.signal.render(
+                            average=f"{avg_number}x",
+                            main_number=data['main_number'],
+                            subtracted_number=data['subtracted_number'],
+                            multiplied_number=data['multiplied_number']
+                        )
+                    except (ValueError, AttributeError):
+                        message_text = compiled.signal.render(
+                            average="N/A",
+                            main_number=data['main_number'],
+                            subtracted_number=data['subtracted_number'],
+                            multiplied_number=data['multiplied_number']
                         )
-                        summary_sent = True
-                        logger.info("Summary message sent successfully")
-                    except asyncio.TimeoutError:
-                        summary_retry_count += 1
-                        logger.warning(f"Timeout sending summary message, retry {summary_retry_count}/{max_summary_retries}")
-                        await asyncio.sleep(2)
-                    except Exception as e:
-                        logger.error(f"Error sending summary message: {e}")
-                        break
-                        
-                if not summary_sent:
-                    logger.error(f"Failed to send summary message after {max_summary_retries} retries")
-            except Exception as e:
-                logger.error(f"Error sending final message: {e}")
 
+                else:
+                    # Добавляем неудачный результат в список
+                    sub_num_str = data['subtracted_number'].rstrip('x')
+                    results_list.append(f"❌ {sub_num_str}")
+
+                    # Формируем сообщение для fail-изображения
+                    try:
+                        message_text = compiled.signal.render(
+                            average="FAIL",
+                            main_number=data['main_number'],
+                            subtracted_number=data['subtracted_number'],
+                            multiplied_number="FAIL"
+                        )
+                    except (ValueError, AttributeError, KeyError):
+                        message_text = f"❌ FAIL: {data['subtracted_number']}"
+
+            except Exception as e:
+                logger.error(f"Error preparing data for image {i}: {e}")
+                continue
+
+            # Первый сигнал идет после задержки после приветствия, остальные - через between_signals
+            delay = params['welcome_to_first_signal_seconds'] if len(plan) == 1 else params['between_signals_seconds']
+            plan.append(self._text_step('signal', message_text, delay))
+            plan.append({
+                'kind': 'photo',
+                'image': i,
+                'reply_to': len(plan) - 1,  # Фото отправляется в ответ на сообщение сигнала
+                'delay': params['signal_to_win_seconds']
+            })
+
+        # Форматируем число с разделителями тысяч
+        formatted_total = "{:,.2f}".format(total_multiplied)
+        # Формируем строку с результатами
+        results_summary = "\n".join(results_list)
+        try:
+            # Переменные шаблона проверены при сохранении расписания
+            final_message = compiled.summary.render(
+                total=formatted_total,
+                results=results_summary
+            )
+        except ValueError as e:
+            # Неподходящий формат значения (например {total:d}) - используем базовый формат
+            logger.warning(f"Error formatting final message: {e}")
+            final_message = f"Итого: {formatted_total}\n\n{results_summary}"
+
+        plan.append(self._text_step('summary', final_message, params['last_signal_to_summary_seconds']))
+        return plan
+
+    async def _run_steps(self, channel_id: int, run: RunProgress):
+        """Последовательно отправляет шаги плана, начиная с run.next_step
+
+        Задержка перед первым выполняемым шагом уже прошла (ожидание после
+        приветствия или время перезапуска).
+        """
+        plan = run.plan
+        logger.info(f"Sending steps {run.next_step + 1}-{len(plan)} of the mailing one by one")
+        first = True
+        for number in range(run.next_step, len(plan)):
+            step = plan[number]
+            if step['kind'] == 'photo' and run.message_id(step['reply_to']) is None:
+                # Сообщение сигнала не отправлено - пропускаем и его изображение
+                logger.error(f"Skipping image {step['image'] + 1}: its signal message was not sent")
+                await run.complete(number, None)
+                continue
+
+            if not first and step['delay']:
+                await run.flush()
+                logger.info(f"Waiting {step['delay']} seconds before {step['name'] if step['kind'] == 'text' else 'image'}")
+                await asyncio.sleep(step['delay'])
+            first = False
+
+            await run.begin(number)
+            message = await self._send_step(channel_id, step, run)
+            await run.complete(number, message.message_id if message else None)
+
+    async def _send_step(self, channel_id: int, step: dict, run: RunProgress):
+        """Отправляет один шаг с повторными попытками, возвращает сообщение или None"""
+        try:
+            if step['kind'] == 'photo':
+                # Отправляем изображение в ответ на сообщение с повторными попытками
+                logger.info(f"Sending image {step['image'] + 1}")
+                message = await self.retrier.call_or_none("photo", lambda: self.photo_cache.send_photo(
+                    self.bot,
+                    channel_id,
+                    run.images[step['image']],
+                    reply_to_message_id=run.message_id(step['reply_to']),
+                    **PHOTO_POLICY.request_timeouts,
+                    **self.send_kwargs
+                ), PHOTO_POLICY)
+            else:
+                logger.info(f"Sending {step['name']} message")
+                message = await self.retrier.call_or_none(step['name'], lambda: self.bot.send_message(
+                    chat_id=channel_id,
+                    text=step['text'],
+                    parse_mode='HTML',  # Используем HTML для сохранения форматирования
+                    **TEXT_POLICY.request_timeouts,
+                    **self.send_kwargs
+                ), TEXT_POLICY)
         except Exception as e:
-            logger.error(f"Error in send_message_with_image: {e}")
-            raise
+            logger.error(f"Error sending {step['kind']} step: {e}")
+            return None
+
+        if message:
+            logger.info(f"{step['kind'].capitalize()} step sent successfully")
+        else:
+            # Продолжаем со следующим шагом, даже если этот не удался
+            logger.error(f"Failed to send {step['kind']} step")
+        return message
 
     async def show_channels_menu(self, update, context):
         """Показывает меню управления каналами"""
         keyboard = []
         channels = await self.get_channels()
-        
+
+        # Названия берем из памяти, устаревшие обновляются в фоне
+        title_cache = get_channel_title_cache()
+        title_cache.refresh_in_background(self.bot, channels)
+
         for channel in channels:
-            try:
-                chat = await self.bot.get_chat(channel.telegram_id)
-                title = chat.title
-                if title != channel.title:
-                    channel.title = title
-                    async with self.session_factory() as session:
-                        await session.merge(channel)
-                        await session.commit()
-            except:
-                title = channel.title or f"Канал {channel.telegram_id}"
-            
+            title = title_cache.title(channel)
             keyboard.append([
                 InlineKeyboardButton(
                     f"📢 {title}", 
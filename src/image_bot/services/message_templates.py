@@ -0,0 +1,139 @@
+import json
+from dataclasses import dataclass
+from string import Formatter
+from typing import Optional
+
+from image_bot.utils.logger import logger
+
+# Переменные, доступные в сообщении перед картинкой и в итоговом сообщении
+SIGNAL_FIELDS = frozenset({'average', 'main_number', 'subtracted_number', 'multiplied_number'})
+SUMMARY_FIELDS = frozenset({'total', 'results'})
+
+# Запасные шаблоны для сохраненных ранее сообщений с ошибками
+FALLBACK_SIGNAL = "{subtracted_number}"
+FALLBACK_SUMMARY = "Итого: {total}\n\n{results}"
+
+_formatter = Formatter()
+
+
+class TemplateError(ValueError):
+    """Ошибка в тексте сообщений расписания"""
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """Шаблон, разобранный один раз: список (текст, переменная, формат, преобразование)"""
+    source: str
+    pieces: tuple
+
+    def render(self, **values) -> str:
+        parts = []
+        for literal, field, format_spec, conversion in self.pieces:
+            parts.append(literal)
+            if field is None:
+                continue
+            value = values[field]
+            value = _formatter.convert_field(value, conversion) if conversion else value
+            parts.append(format(value, format_spec or ''))
+        return ''.join(parts)
+
+
+def compile_template(text: str, allowed_fields: frozenset, name: str) -> CompiledTemplate:
+    """Разбирает шаблон str.format и проверяет, что в нем только разрешенные переменные
+
+    Raises:
+        TemplateError: Синтаксическая ошибка или неизвестная переменная.
+    """
+    try:
+        pieces = tuple(_formatter.parse(text))
+    except ValueError as e:
+        raise TemplateError(f"{name}: ошибка в фигурных скобках ({e})") from e
+
+    for _, field, format_spec, _ in pieces:
+        if field is None:
+            continue
+        if field not in allowed_fields:
+            allowed = ', '.join('{' + f + '}' for f in sorted(allowed_fields))
+            raise TemplateError(f"{name}: неизвестная переменная {{{field}}}. Доступны: {allowed}")
+        if format_spec and '{' in format_spec:
+            raise TemplateError(f"{name}: вложенные переменные в формате не поддерживаются")
+    return CompiledTemplate(text, pieces)
+
+
+@dataclass(frozen=True)
+class CompiledMessages:
+    """Три сообщения рассылки, проверенные и разобранные заранее"""
+    welcome: str
+    signal: CompiledTemplate
+    summary: CompiledTemplate
+
+    @property
+    def messages(self) -> list:
+        return [self.welcome, self.signal.source, self.summary.source]
+
+
+def normalize_messages(messages) -> list:
+    """Приводит сообщения (список или JSON-строка старого формата) к списку строк"""
+    if isinstance(messages, str):
+        try:
+            messages = json.loads(messages)
+        except json.JSONDecodeError:
+            # Строка не в формате JSON - используем ее как приветствие
+            messages = [messages, "", ""]
+    if not isinstance(messages, (list, tuple)) or len(messages) != 3:
+        raise TemplateError("Необходимо указать ровно три сообщения")
+    return [str(message) for message in messages]
+
+
+def compile_messages(messages, strict: bool = True) -> CompiledMessages:
+    """Проверяет и компилирует сообщения расписания (вызывается при сохранении)
+
+    Приветствие отправляется как есть, поэтому фигурные скобки в нем не проверяются.
+
+    Args:
+        strict: Если False, шаблон с ошибкой заменяется запасным (для уже сохраненных расписаний).
+
+    Raises:
+        TemplateError: Если сообщений не три или (при strict) в шаблонах есть ошибки.
+    """
+    welcome, signal, summary = normalize_messages(messages)
+    compiled = []
+    for text, fields, name, fallback in (
+            (signal, SIGNAL_FIELDS, "Сообщение перед картинкой", FALLBACK_SIGNAL),
+            (summary, SUMMARY_FIELDS, "Итоговое сообщение", FALLBACK_SUMMARY)):
+        try:
+            compiled.append(compile_template(text, fields, name))
+        except TemplateError as e:
+            if strict:
+                raise
+            logger.warning(f"[TEMPLATES] {e}, using fallback template")
+            compiled.append(compile_template(fallback, fields, name))
+    return CompiledMessages(welcome=welcome, signal=compiled[0], summary=compiled[1])
+
+
+# schedule_id -> (updated_at, CompiledMessages)
+_compiled_cache = {}
+
+
+def get_compiled_messages(schedule_id: Optional[int], updated_at, messages) -> CompiledMessages:
+    """Скомпилированные сообщения расписания из кеша по (schedule_id, updated_at)
+
+    Шаблоны проверяются при сохранении, а расписания, сохраненные до появления
+    проверки, компилируются с запасными шаблонами вместо ошибочных.
+
+    Raises:
+        TemplateError: Если сообщений не три.
+    """
+    cached = _compiled_cache.get(schedule_id) if schedule_id is not None else None
+    if cached is not None and cached[0] == updated_at:
+        return cached[1]
+
+    compiled = compile_messages(messages, strict=False)
+    if schedule_id is not None:
+        _compiled_cache[schedule_id] = (updated_at, compiled)
+    return compiled
+
+
+def forget_compiled_messages(schedule_id: int):
+    """Удаляет расписание из кеша скомпилированных сообщений"""
+    _compiled_cache.pop(schedule_id, None)
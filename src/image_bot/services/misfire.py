@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, time
+from typing import Optional
+
+from image_bot.services.schedule_index import FIRE_GRACE_SECONDS
+
+# Политики для рассылок, время которых прошло (процесс был остановлен или цикл заблокирован)
+POLICY_SKIP = 'skip'  # Пропустить, следующая рассылка - в обычное время
+POLICY_FIRE_LATE = 'fire_late'  # Выполнить один раз сразу, если опоздание не больше grace
+POLICY_NEXT_SLOT = 'next_slot'  # Выполнить в ближайший слот (то же число минут, следующий час) в пределах grace
+POLICIES = (POLICY_SKIP, POLICY_FIRE_LATE, POLICY_NEXT_SLOT)
+
+# Шаг слотов для POLICY_NEXT_SLOT: рассылка сохраняет минуту публикации
+SLOT = timedelta(hours=1)
+
+
+def validate_policy(policy: str) -> str:
+    """Raises: ValueError, если политика неизвестна"""
+    if policy not in POLICIES:
+        raise ValueError(f"Неизвестная политика пропущенных рассылок: {policy}. Доступны: {', '.join(POLICIES)}")
+    return policy
+
+
+def validate_misfire(policy: str, grace_seconds: int) -> str:
+    """Проверяет политику вместе с допустимым опозданием
+
+    Raises:
+        ValueError: Политика неизвестна, опоздание отрицательное или для next_slot
+            меньше SLOT (тогда ни один слот не подходит и next_slot работал бы как skip).
+    """
+    validate_policy(policy)
+    if grace_seconds < 0:
+        raise ValueError("Допустимое опоздание не может быть отрицательным")
+    if policy == POLICY_NEXT_SLOT and grace_seconds < SLOT.total_seconds():
+        raise ValueError(f"Для {POLICY_NEXT_SLOT} допустимое опоздание должно быть не меньше "
+                         f"{SLOT.total_seconds():.0f} секунд (шаг слотов), указано {grace_seconds}")
+    return policy
+
+
+def resolve_misfire(policy: str, fire_at: datetime, now: datetime, grace: timedelta) -> Optional[datetime]:
+    """Когда выполнять рассылку, запланированную на fire_at
+
+    Опоздание до FIRE_GRACE_SECONDS считается выполнением вовремя при любой политике.
+
+    Returns:
+        Время выполнения (now - выполнить сейчас, позже - отложить) или None, если рассылку нужно пропустить.
+    """
+    on_time = timedelta(seconds=FIRE_GRACE_SECONDS)
+    lateness = now - fire_at
+    if lateness <= on_time:
+        return now
+    if policy == POLICY_FIRE_LATE and lateness <= grace:
+        return now
+    if policy == POLICY_NEXT_SLOT:
+        # Слот, который только что наступил, выполняем сейчас; иначе - следующий
+        previous_slot = fire_at + (lateness // SLOT) * SLOT
+        slot_at = now if now - previous_slot <= on_time else previous_slot + SLOT
+        if slot_at - fire_at <= grace:
+            return slot_at
+    return None
+
+
+def last_slot(time_of_day: time, now: datetime) -> datetime:
+    """Последнее время рассылки по расписанию, не позже now"""
+    fire_at = now.replace(hour=time_of_day.hour, minute=time_of_day.minute, second=0, microsecond=0)
+    if fire_at > now:
+        fire_at -= timedelta(days=1)
+    return fire_at
+
+
+def _local(value: Optional[datetime]) -> Optional[datetime]:
+    """Переводит время из базы (с часовым поясом) в локальное без пояса, как fire_at"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+def missed_fire(schedule: dict, now: datetime) -> Optional[datetime]:
+    """Последнее время рассылки, которое было пропущено (по сохраненному last_fired_at)
+
+    Returns:
+        fire_at пропущенной рассылки или None, если последняя рассылка выполнена или
+        расписание создано позже нее.
+    """
+    slot = last_slot(schedule['time_of_day'], now)
+    if now - slot <= timedelta(seconds=FIRE_GRACE_SECONDS):
+        # Время еще не прошло - рассылку выполнит обычный цикл
+        return None
+    last_fired_at = schedule.get('last_fired_at')
+    if last_fired_at is not None and last_fired_at >= slot:
+        return None
+    created_at = _local(schedule.get('created_at'))
+    if last_fired_at is None and (created_at is None or created_at > slot):
+        return None
+    return slot
+
+
+class LatenessStats:
+    """Метрики опозданий рассылок: сколько выполнено вовремя, с опозданием, отложено и пропущено"""
+
+    def __init__(self):
+        self.on_time = 0
+        self.late = 0
+        self.deferred = 0
+        self.skipped = 0
+        self.max_lateness = 0.0  # Секунд
+        self.total_lateness = 0.0
+
+    def record_fire(self, lateness_seconds: float):
+        lateness_seconds = max(0.0, lateness_seconds)
+        if lateness_seconds <= FIRE_GRACE_SECONDS:
+            self.on_time += 1
+        else:
+            self.late += 1
+        self.total_lateness += lateness_seconds
+        self.max_lateness = max(self.max_lateness, lateness_seconds)
+
+    def snapshot(self) -> dict:
+        fired = self.on_time + self.late
+        return {
+            'on_time': self.on_time,
+            'late': self.late,
+            'deferred': self.deferred,
+            'skipped': self.skipped,
+            'avg_lateness': round(self.total_lateness / fired, 1) if fired else 0.0,
+            'max_lateness': round(self.max_lateness, 1),
+        }
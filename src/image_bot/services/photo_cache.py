@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from telegram.error import BadRequest
+
+from image_bot.config import get_config
+from image_bot.utils.logger import logger
+
+
+def content_hash(photo: bytes) -> str:
+    """sha256 содержимого изображения"""
+    return hashlib.sha256(photo).hexdigest()
+
+
+class PhotoCache:
+    """Кеш content_hash -> Telegram file_id в памяти (LRU)
+
+    Каждая отрисовка случайна, поэтому одинаковые байты встречаются только внутри
+    одного набора изображений, который рассылается в несколько каналов группы.
+    Он загружается в Telegram один раз, остальные каналы получают его по file_id.
+    В базе file_id не хранятся: между отрисовками совпадений нет.
+    """
+
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self._memory = OrderedDict()  # content_hash -> file_id
+        self._uploads = {}  # content_hash -> Future с file_id загрузки, которая сейчас идет
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, photo_hash: str) -> Optional[str]:
+        file_id = self._memory.get(photo_hash)
+        if file_id is not None:
+            self._memory.move_to_end(photo_hash)
+        return file_id
+
+    def put(self, photo_hash: str, file_id: str):
+        self._memory[photo_hash] = file_id
+        self._memory.move_to_end(photo_hash)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def forget(self, photo_hash: str):
+        """Удаляет file_id, который Telegram больше не принимает"""
+        self._memory.pop(photo_hash, None)
+
+    async def send_photo(self, bot, chat_id, photo: bytes, **kwargs):
+        """Отправляет фото по file_id, если оно уже загружалось, иначе загружает и запоминает file_id"""
+        photo_hash = content_hash(photo)
+        file_id = self.get(photo_hash)
+        if file_id is None and photo_hash in self._uploads:
+            # То же изображение сейчас загружается для другого канала - ждем его file_id
+            file_id = await asyncio.shield(self._uploads[photo_hash])
+        if file_id is not None:
+            try:
+                message = await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+                self.hits += 1
+                return message
+            except BadRequest as e:
+                # file_id устарел или принадлежит другому боту - загружаем заново
+                logger.warning(f"[PHOTO CACHE] Cached file_id rejected ({e}), uploading again")
+                self.forget(photo_hash)
+
+        self.misses += 1
+        upload = self._uploads.get(photo_hash)
+        if upload is None:
+            upload = self._uploads[photo_hash] = asyncio.get_running_loop().create_future()
+        uploaded_file_id = None
+        try:
+            message = await bot.send_photo(chat_id=chat_id, photo=photo, **kwargs)
+            if message is not None and message.photo:
+                uploaded_file_id = message.photo[-1].file_id
+                self.put(photo_hash, uploaded_file_id)
+            return message
+        finally:
+            # Ожидающие получают file_id или None (тогда загружают сами)
+            if self._uploads.get(photo_hash) is upload:
+                del self._uploads[photo_hash]
+            if not upload.done():
+                upload.set_result(uploaded_file_id)
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._memory)}
+
+
+@lru_cache(maxsize=None)
+def get_photo_cache() -> PhotoCache:
+    """Возвращает общий для процесса кеш file_id"""
+    return PhotoCache(max_size=get_config().photo_cache_size)
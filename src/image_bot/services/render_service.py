@@ -0,0 +1,116 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from image_bot.config import get_config
+from image_bot.utils.logger import logger
+
+
+# Генератор, живущий внутри процесса-воркера (шаблоны и шрифты уже загружены)
+_worker_generator = None
+
+
+def _init_worker(save_to_disk: bool):
+    """Инициализирует воркер: загружает шаблоны и шрифты один раз на процесс"""
+    global _worker_generator
+    from image_bot.image_generation.generator import ImageGenerator
+    _worker_generator = ImageGenerator(save_to_disk=save_to_disk)
+
+
+def _ping():
+    """Пустая задача для прогрева воркеров"""
+    return _worker_generator is not None
+
+
+def _render_batch(count: int, bet_amount: int, template: str):
+    """Рендерит набор изображений в воркере и возвращает PNG-байты и данные"""
+    buffers, data_list = _worker_generator.generate_images(count, bet_amount, template, in_memory=True)
+    return [buffer.getvalue() for buffer in buffers], [dict(data) for data in data_list]
+
+
+class RenderService:
+    """Пул процессов для генерации изображений вне event loop"""
+
+    def __init__(self, workers: int = None, queue_size: int = None):
+        config = get_config()
+        self.workers = workers or config.render_workers
+        # Максимальное число наборов, которые одновременно рендерятся или ждут воркера
+        self.queue_size = queue_size or config.render_queue_size or self.workers * 2
+        self.save_to_disk = config.save_generated_images
+        self._executor = None
+        self._slots = asyncio.Semaphore(self.queue_size)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.save_to_disk,)
+            )
+        return self._executor
+
+    async def start(self):
+        """Запускает и прогревает все воркеры"""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, _ping) for _ in range(self.workers)))
+        logger.info(f"[RENDER] Started {self.workers} render workers (queue size {self.queue_size})")
+
+    async def render(self, count: int = 5, bet_amount: int = 0, template: str = "lkr"):
+        """Генерирует набор изображений в пуле процессов
+
+        Если очередь заполнена, ждет освобождения места (backpressure).
+        Отмена снимает задачу, которая еще ждет в очереди пула. Набор, который
+        воркер уже рендерит, прервать нельзя: он дорисовывается, результат
+        отбрасывается, а место в очереди освобождается только после этого.
+
+        Returns:
+            tuple[list[bytes], list[dict]]: PNG-байты изображений и данные для каждого из них.
+        """
+        if self._slots.locked():
+            logger.warning(f"[RENDER] Render queue is full ({self.queue_size}), waiting for a free slot")
+
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            future = executor.submit(_render_batch, count, bet_amount, template)
+        except BaseException:
+            self._slots.release()
+            raise
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            # Воркер упал - останавливаем сломанный пул (его поток и уцелевшие процессы)
+            # и пересоздаем при следующем вызове; пул мог уже пересоздать параллельный вызов
+            if self._executor is executor:
+                logger.error("[RENDER] Render worker pool is broken, restarting it")
+                self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            if future.cancel() or future.done():
+                self._slots.release()
+            else:
+                # Отмененный набор уже в воркере - держим место, пока воркер не освободится
+                future.add_done_callback(lambda _: self._release_from_thread(loop))
+
+    def _release_from_thread(self, loop: asyncio.AbstractEventLoop):
+        """Освобождает место в очереди из потока пула"""
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self._slots.release)
+
+    def shutdown(self):
+        """Останавливает пул воркеров"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+@lru_cache(maxsize=None)
+def get_render_service() -> RenderService:
+    """Возвращает общий для процесса пул рендеринга"""
+    return RenderService()
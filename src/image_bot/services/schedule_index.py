@@ -0,0 +1,184 @@
+import asyncio
+import heapq
+import itertools
+from datetime import datetime, timedelta, time
+from functools import lru_cache
+
+from image_bot.config import get_config
+
+# Насколько поздно (в секундах) можно выполнить рассылку, если время уже прошло
+FIRE_GRACE_SECONDS = 30
+
+
+def schedule_payload(schedule) -> dict:
+    """Преобразует модель Schedule (или строку запроса с ее колонками) в словарь с параметрами рассылки
+
+    telegram_id канала есть только у строк из MailingService.get_due_schedules.
+    """
+    return {
+        'id': schedule.id,
+        'channel_id': schedule.channel_id,
+        'telegram_id': getattr(schedule, 'telegram_id', None),
+        'time': schedule.time_of_day.strftime('%H:%M'),
+        'time_of_day': schedule.time_of_day,
+        'enabled': schedule.enabled,
+        'messages': schedule.messages,
+        'message_delay_seconds': schedule.message_delay_seconds,
+        'image_delay_seconds': schedule.image_delay_seconds,
+        'images_count': schedule.images_count,
+        'bet_amount': schedule.bet_amount,
+        'welcome_to_first_signal_seconds': schedule.welcome_to_first_signal_seconds,
+        'signal_to_win_seconds': schedule.signal_to_win_seconds,
+        'between_signals_seconds': schedule.between_signals_seconds,
+        'last_signal_to_summary_seconds': schedule.last_signal_to_summary_seconds,
+        'template': schedule.template,
+        'misfire_policy': schedule.misfire_policy,
+        'misfire_grace_seconds': schedule.misfire_grace_seconds,
+        'last_fired_at': schedule.last_fired_at,
+        'created_at': schedule.created_at,
+        'updated_at': schedule.updated_at
+    }
+
+
+def broadcast_group_key(schedule: dict, fire_at: datetime) -> tuple:
+    """Ключ группы рассылок, которые могут использовать один набор изображений
+
+    Расписания с одинаковым временем и параметрами генерации образуют группу:
+    изображения рендерятся один раз и рассылаются во все каналы группы.
+    """
+    return (fire_at, schedule.get('template', 'lkr'), schedule['bet_amount'], schedule['images_count'])
+
+
+def next_fire_time(time_of_day: time, now: datetime) -> datetime:
+    """Ближайшее время рассылки: сегодня (с учетом FIRE_GRACE_SECONDS) или завтра"""
+    fire_at = now.replace(hour=time_of_day.hour, minute=time_of_day.minute, second=0, microsecond=0)
+    if fire_at < now - timedelta(seconds=FIRE_GRACE_SECONDS):
+        fire_at += timedelta(days=1)
+    return fire_at
+
+
+class ScheduleIndex:
+    """Индекс активных расписаний в памяти, упорядоченный по времени следующей рассылки
+
+    Две кучи с ленивым удалением: по времени рассылки и по времени предварительной
+    генерации изображений (fire_at - lead). Устаревшие записи кучи пропускаются,
+    если fire_at больше не совпадает с текущим для этого расписания.
+    """
+
+    def __init__(self, lead: timedelta = timedelta(0)):
+        self.lead = lead
+        self.schedules = {}  # schedule_id -> параметры рассылки
+        self._fire_at = {}  # schedule_id -> время следующей рассылки
+        self._fire_heap = []
+        self._lead_heap = []
+        self._counter = itertools.count()
+        self.changed = asyncio.Event()
+
+    def __len__(self):
+        return len(self.schedules)
+
+    def _push(self, schedule_id: int, fire_at: datetime):
+        self._fire_at[schedule_id] = fire_at
+        heapq.heappush(self._fire_heap, (fire_at, next(self._counter), schedule_id))
+        if self.lead > timedelta(0):
+            heapq.heappush(self._lead_heap, (fire_at - self.lead, next(self._counter), schedule_id, fire_at))
+
+    def load(self, schedules, now: datetime = None, window_end: datetime = None):
+        """Синхронизирует индекс со списком расписаний из базы
+
+        Args:
+            window_end: Если список содержит только расписания до этого времени
+                (MailingService.get_due_schedules), удаляются только отсутствующие
+                в нем расписания с рассылкой до window_end.
+        """
+        now = now or datetime.now()
+        loaded_ids = set()
+        for schedule in schedules:
+            payload = schedule if isinstance(schedule, dict) else schedule_payload(schedule)
+            loaded_ids.add(payload['id'])
+            self.upsert(payload, now, notify=False)
+        for schedule_id in list(self.schedules):
+            if schedule_id in loaded_ids:
+                continue
+            if window_end is None or self._fire_at[schedule_id] <= window_end:
+                self.remove(schedule_id, notify=False)
+        self.changed.set()
+
+    def upsert(self, schedule, now: datetime = None, notify: bool = True):
+        """Добавляет или обновляет расписание (модель Schedule или словарь schedule_payload)"""
+        payload = schedule if isinstance(schedule, dict) else schedule_payload(schedule)
+        schedule_id = payload['id']
+        if not payload.get('enabled') or not payload.get('time_of_day'):
+            self.remove(schedule_id, notify=notify)
+            return
+
+        previous = self.schedules.get(schedule_id)
+        if payload.get('telegram_id') is None and previous is not None \
+                and previous['channel_id'] == payload['channel_id']:
+            # Модель Schedule из обработчиков не содержит telegram_id канала
+            payload['telegram_id'] = previous.get('telegram_id')
+        self.schedules[schedule_id] = payload
+        # Если время не изменилось, сохраняем уже запланированную рассылку,
+        # чтобы не выполнить ее повторно сразу после срабатывания
+        if previous is None or previous['time_of_day'] != payload['time_of_day'] \
+                or schedule_id not in self._fire_at:
+            self._push(schedule_id, next_fire_time(payload['time_of_day'], now or datetime.now()))
+        if notify:
+            self.changed.set()
+
+    def remove(self, schedule_id: int, notify: bool = True):
+        """Удаляет расписание из индекса"""
+        self.schedules.pop(schedule_id, None)
+        self._fire_at.pop(schedule_id, None)
+        if notify:
+            self.changed.set()
+
+    def remove_channel(self, channel_id: int):
+        """Удаляет все расписания канала (channel_id - id канала в базе)"""
+        for schedule_id, payload in list(self.schedules.items()):
+            if payload['channel_id'] == channel_id:
+                self.remove(schedule_id, notify=False)
+        self.changed.set()
+
+    def _is_current(self, schedule_id: int, fire_at: datetime) -> bool:
+        return self._fire_at.get(schedule_id) == fire_at
+
+    def _clean(self, heap, fire_at_index: int):
+        while heap and not self._is_current(heap[0][2], heap[0][fire_at_index]):
+            heapq.heappop(heap)
+
+    def next_wakeup(self):
+        """Ближайший момент, когда нужно что-то сделать (рассылка или пре-рендер)"""
+        self._clean(self._fire_heap, 0)
+        self._clean(self._lead_heap, 3)
+        candidates = [heap[0][0] for heap in (self._fire_heap, self._lead_heap) if heap]
+        return min(candidates) if candidates else None
+
+    def pop_due(self, now: datetime) -> list:
+        """Возвращает расписания, время которых наступило, и переносит их на следующий день"""
+        due = []
+        while True:
+            self._clean(self._fire_heap, 0)
+            if not self._fire_heap or self._fire_heap[0][0] > now:
+                break
+            fire_at, _, schedule_id = heapq.heappop(self._fire_heap)
+            due.append((self.schedules[schedule_id], fire_at))
+            self._push(schedule_id, fire_at + timedelta(days=1))
+        return due
+
+    def pop_lead(self, now: datetime) -> list:
+        """Возвращает расписания, для которых пора начинать предварительную генерацию"""
+        due = []
+        while True:
+            self._clean(self._lead_heap, 3)
+            if not self._lead_heap or self._lead_heap[0][0] > now:
+                break
+            _, _, schedule_id, fire_at = heapq.heappop(self._lead_heap)
+            due.append((self.schedules[schedule_id], fire_at))
+        return due
+
+
+@lru_cache(maxsize=None)
+def get_schedule_index() -> ScheduleIndex:
+    """Возвращает общий для процесса индекс расписаний"""
+    return ScheduleIndex(lead=timedelta(minutes=get_config().prerender_minutes))
@@ -1,170 +1,535 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import asyncio
+import time
 from pathlib import Path
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from telegram import Bot
 
 from image_bot.database.base import Session
-from image_bot.database.models import Schedule, Channel
+from image_bot.database.models import Schedule
 from image_bot.utils.logger import logger
 from image_bot.config import Config
 from image_bot.services.mailing_service import MailingService
+from image_bot.services.schedule_index import get_schedule_index, broadcast_group_key, FIRE_GRACE_SECONDS
+from image_bot.services.task_registry import TaskRegistry
+from image_bot.services.change_events import ChangeEvent, ChangeListener, ENTITY_CHANNEL, ENTITY_SCHEDULE, OP_DELETE
+from image_bot.services.fire_dedupe import FireDedupe, mailing_task_key
+from image_bot.services.leader_election import LeaderElection, process_id
+from image_bot.services.mailing_runs import RunProgress, get_mailing_run_store, run_key
+from image_bot.services.sharding import ShardMembership
+from image_bot.services.message_templates import forget_compiled_messages, get_compiled_messages
+from image_bot.services.misfire import LatenessStats, POLICY_NEXT_SLOT, SLOT, missed_fire, resolve_misfire, validate_misfire
+
+# Максимальное время сна планировщика (защита от перевода системных часов)
+MAX_SLEEP_SECONDS = 60
 
 
 class SchedulerService:
-    def __init__(self, application: Bot, session_factory, config: Config):
-        """Инициализация сервиса планировщика"""
+    def __init__(self, application: Bot, session_factory, config: Config, election: LeaderElection = None,
+                 listener: ChangeListener = None):
+        """Инициализация сервиса планировщика
+
+        Args:
+            election: Выбор лидера среди реплик или ShardMembership (каждая реплика выполняет
+                рассылки своих каналов). Если не передан, все рассылки выполняет этот процесс.
+            listener: Подписка на изменения в базе. Пока она подключена, индекс обновляется
+                по уведомлениям, а периодические перезагрузки расписаний не нужны.
+        """
         self.bot = application.bot if hasattr(application, 'bot') else application
         self.session_factory = session_factory
         self.config = config
-        self.last_executed = {}  # Хранит время последнего выполнения для каждого канала и времени
+        # Ошибка в MISFIRE_POLICY/MISFIRE_GRACE_SECONDS видна при запуске, а не как тихий skip
+        validate_misfire(config.misfire_policy, config.misfire_grace_seconds)
+        self.fired = FireDedupe(ttl=timedelta(hours=config.fire_dedupe_hours))  # Выполненные срабатывания расписаний
+        self.catchup = []  # Пропущенные рассылки: (когда выполнить, расписание, время рассылки)
+        self.lateness = LatenessStats()  # Метрики опозданий рассылок
         self.base_dir = Path(__file__).parent.parent.parent.parent
         self.mailing_service = MailingService(application, session_factory)
-        self.active_tasks = {}  # Хранит активные задачи рассылки
-        
-    def _should_execute(self, channel_id: str, schedule_time: str, current_time: datetime) -> bool:
-        """Проверяет, нужно ли выполнять рассылку"""
+        self.active_tasks = TaskRegistry("mailing")  # Хранит активные задачи рассылки
+        self.prerendered = {}  # Заранее запущенная генерация изображений: ключ группы -> (задача, время рассылки)
+        self.schedule_index = get_schedule_index()  # Расписания в памяти, упорядоченные по времени рассылки
+        self.runs = get_mailing_run_store()  # Ход рассылок в базе: продолжение после перезапуска
+        self.election = election
+        self.shards = election if isinstance(election, ShardMembership) else None
+        self.worker_id = election.holder if election is not None else process_id()
+        self.standby = []  # Чужие рассылки: (время перехвата, расписание, время рассылки)
+        self._claimed_at = None  # time.monotonic() последней проверки прерванных рассылок
+        self._loaded_at = None  # time.monotonic() последней полной загрузки расписаний
+        self._load_window = 0  # Секунд до следующей перезагрузки (0 - загружены все расписания)
+        self.listener = listener
+        if listener is not None:
+            listener.subscribe(ENTITY_SCHEDULE, self._on_schedule_changed)
+            listener.subscribe(ENTITY_CHANNEL, self._on_channel_changed)
+            listener.on_reconnect(self._on_listener_reconnect)
+
+    def _misfire_policy(self, schedule: dict) -> tuple:
+        """Политика пропущенных рассылок расписания и допустимое опоздание (timedelta)"""
+        policy = schedule.get('misfire_policy') or self.config.misfire_policy
+        grace = schedule.get('misfire_grace_seconds')
+        if grace is None:
+            grace = self.config.misfire_grace_seconds
+        return policy, timedelta(seconds=grace)
+
+    def _should_execute(self, schedule: dict, fire_at: datetime, current_time: datetime) -> bool:
+        """Проверяет, нужно ли выполнять рассылку, время которой наступило
+
+        Опоздавшая больше чем на FIRE_GRACE_SECONDS рассылка выполняется сейчас,
+        откладывается или пропускается по политике расписания.
+        """
+        # Это срабатывание уже выполнено (в том числе до перезапуска)
+        if self.fired.seen(schedule['id'], fire_at):
+            return False
+
+        policy, grace = self._misfire_policy(schedule)
+        lateness = (current_time - fire_at).total_seconds()
+        run_at = resolve_misfire(policy, fire_at, current_time, grace)
+        if run_at is None:
+            self.lateness.skipped += 1
+            if policy == POLICY_NEXT_SLOT and grace < SLOT:
+                logger.warning(f"[SCHEDULER] Schedule {schedule['id']} uses {policy} with grace "
+                               f"{grace.total_seconds():.0f}s shorter than the slot step - it never fires late")
+            logger.warning(f"[SCHEDULER] Missed schedule {schedule['id']} planned at {fire_at.strftime('%H:%M:%S')} "
+                           f"({lateness:.0f}s late, policy {policy})")
+            return False
+        if run_at > current_time:
+            self._defer(schedule, fire_at, run_at, policy)
+            return False
+
+        self.fired.mark(schedule['id'], fire_at)
+        schedule['last_fired_at'] = fire_at
+        self.lateness.record_fire(lateness)
+        if lateness > FIRE_GRACE_SECONDS:
+            logger.warning(f"[SCHEDULER] Firing schedule {schedule['id']} planned at {fire_at.strftime('%H:%M:%S')} "
+                           f"{lateness:.0f}s late (policy {policy})")
+        return True
+
+    def _defer(self, schedule: dict, fire_at: datetime, run_at: datetime, policy: str):
+        """Откладывает пропущенную рассылку до run_at"""
+        if any(entry[1]['id'] == schedule['id'] and entry[2] == fire_at for entry in self.catchup):
+            return
+        self.catchup.append((run_at, schedule, fire_at))
+        self.lateness.deferred += 1
+        logger.warning(f"[SCHEDULER] Schedule {schedule['id']} planned at {fire_at.strftime('%H:%M')} "
+                       f"deferred to {run_at.strftime('%H:%M')} (policy {policy})")
+
+    def _pop_catchup(self, current_time: datetime) -> list:
+        """Возвращает отложенные и пропущенные рассылки, время которых наступило"""
+        ready = [entry for entry in self.catchup if entry[0] <= current_time]
+        if not ready:
+            return []
+        self.catchup = [entry for entry in self.catchup if entry[0] > current_time]
+        # Параметры берем из индекса, если расписание там есть (могли измениться)
+        return [(self.schedule_index.schedules.get(schedule['id'], schedule), fire_at)
+                for _, schedule, fire_at in ready]
+
+    async def queue_missed_fires(self):
+        """Находит рассылки, пропущенные пока процесс не работал (по last_fired_at)
+
+        Дальше каждая выполняется, откладывается или пропускается по политике расписания.
+        """
+        now = datetime.now()
         try:
-            # Преобразуем время из формата HH:MM:SS в HH:MM
-            if len(schedule_time.split(':')) > 2:
-                schedule_time = ':'.join(schedule_time.split(':')[:2])
-            
-            # Получаем время рассылки
-            schedule_hour, schedule_minute = map(int, schedule_time.split(':'))
-            schedule_dt = current_time.replace(hour=schedule_hour, minute=schedule_minute)
-            
-            # Ключ для отслеживания выполнения
-            execution_key = f"{channel_id}_{schedule_time}"
-            
-            # Если рассылка уже была выполнена в эту минуту, пропускаем
-            if execution_key in self.last_executed:
-                last_exec = self.last_executed[execution_key]
-                if (current_time - last_exec).total_seconds() < 60:
-                    return False
-            
-            # Проверяем, что текущее время находится в пределах минуты от запланированного
-            time_diff = abs((current_time - schedule_dt).total_seconds())
-            should_execute = time_diff <= 30  # 30 секунд до или после запланированного времени
-            
-            if should_execute:
-                self.last_executed[execution_key] = current_time
-                
-            return should_execute
+            candidates = await self.mailing_service.get_misfire_candidates(self.config.misfire_policy)
         except Exception as e:
-            logger.error(f"Error in _should_execute for channel {channel_id}, time {schedule_time}: {e}")
-            return False
+            logger.error(f"[SCHEDULER] Error loading missed schedules: {e}")
+            return
 
-    async def send_to_channel(self, channel_id: int, schedule: dict):
-        """Отправляет сообщения в канал"""
-        task_key = f"{channel_id}_{schedule['time']}"
-        
+        for schedule in candidates:
+            if self.shards and not self.shards.owns(schedule['channel_id']):
+                continue
+            fire_at = missed_fire(schedule, now)
+            if fire_at is None or self.fired.seen(schedule['id'], fire_at):
+                continue
+            logger.info(f"[SCHEDULER] Schedule {schedule['id']} missed its run at {fire_at.strftime('%Y-%m-%d %H:%M')}")
+            self.catchup.append((now, schedule, fire_at))
+
+    async def _seed_fired(self):
+        """Заполняет память о выполненных срабатываниях из mailing_runs"""
+        now = datetime.now()
+        self.fired.evict(now)
         try:
-            # Получаем telegram_id канала
-            async with self.session_factory() as session:
-                result = await session.execute(
-                    select(Channel).where(Channel.id == channel_id)
-                )
-                channel = result.scalar_one_or_none()
-
-                if not channel:
-                    logger.error(f"[SCHEDULER] Channel {channel_id} not found")
-                    return
-
-                # Отправляем сообщение через mailing_service
-                await self.mailing_service.send_message_with_image(
-                    channel_id=channel.telegram_id,
-                    messages=schedule['messages'],
-                    message_delay_seconds=schedule['message_delay_seconds'],
-                    image_delay_seconds=schedule['image_delay_seconds'],
-                    images_count=schedule['images_count'],
-                    bet_amount=schedule['bet_amount'],
-                    welcome_to_first_signal_seconds=schedule.get('welcome_to_first_signal_seconds', 60),
-                    signal_to_win_seconds=schedule.get('signal_to_win_seconds', 45),
-                    between_signals_seconds=schedule.get('between_signals_seconds', 25),
-                    last_signal_to_summary_seconds=schedule.get('last_signal_to_summary_seconds', 40),
-                    template=schedule.get('template', 'lkr')
-                )
-                logger.info(f"[SCHEDULER] Successfully sent message to channel {channel_id}")
-            
+            fires = await self.runs.recent_fires(now - self.fired.ttl)
+        except Exception as e:
+            logger.error(f"[SCHEDULER] Error loading recent mailings: {e}")
+            return
+        self.fired.seed(fires)
+        logger.info(f"[SCHEDULER] Remembering {len(self.fired)} recent schedule fires")
+
+    def _render(self, schedule: dict) -> asyncio.Task:
+        """Запускает генерацию набора изображений для расписания"""
+        return asyncio.create_task(self.mailing_service.generate_images(
+            schedule['images_count'], schedule['bet_amount'], schedule.get('template', 'lkr')
+        ))
+
+    def _prerender(self, group_key: tuple, schedule: dict, run_at: datetime):
+        """Запускает генерацию изображений заранее, до времени рассылки (одну на группу)"""
+        if group_key in self.prerendered:
+            return
+
+        logger.info(f"[SCHEDULER] Pre-rendering images for {group_key[1:]} (run at {run_at.strftime('%H:%M')})")
+        self.prerendered[group_key] = (self._render(schedule), run_at)
+
+    def _drop_stale_prerenders(self, current_time: datetime):
+        """Удаляет заранее сгенерированные изображения для рассылок, которые так и не выполнились"""
+        for group_key, (images_task, run_at) in list(self.prerendered.items()):
+            if current_time - run_at > timedelta(minutes=5):
+                images_task.cancel()
+                del self.prerendered[group_key]
+
+    async def load_schedules(self):
+        """Загружает в индекс активные расписания, которые сработают до следующей перезагрузки
+
+        При подключенной подписке на изменения загружаются все расписания: дальше
+        индекс обновляется по уведомлениям.
+        """
+        now = datetime.now()
+        reload_seconds = self.config.schedule_reload_minutes * 60
+        if self.listener is not None and self.listener.connected:
+            reload_seconds = 0
+        self._load_window = reload_seconds
+        if reload_seconds > 0:
+            # Окно с запасом: предварительная генерация и опоздание на FIRE_GRACE_SECONDS
+            start = now - timedelta(seconds=FIRE_GRACE_SECONDS)
+            end = now + timedelta(seconds=reload_seconds + MAX_SLEEP_SECONDS) + self.schedule_index.lead
+            schedules = await self.mailing_service.get_due_schedules(start, end)
+            self.schedule_index.load(schedules, now, window_end=end)
+        else:
+            schedules = await self.mailing_service.get_due_schedules()
+            self.schedule_index.load(schedules, now)
+        self._loaded_at = time.monotonic()
+        logger.info(f"[SCHEDULER] Loaded {len(schedules)} due schedules, {len(self.schedule_index)} in index")
+
+    async def _on_schedule_changed(self, event: ChangeEvent):
+        """Применяет к индексу расписание, измененное другим процессом"""
+        forget_compiled_messages(event.id)
+        if event.op == OP_DELETE:
+            self.schedule_index.remove(event.id)
+            return
+        payload = await self.mailing_service.get_schedule_payload(event.id)
+        if payload is None:
+            self.schedule_index.remove(event.id)
+        else:
+            self.schedule_index.upsert(payload)
+        logger.debug(f"[SCHEDULER] Schedule {event.id} changed ({event.op}), index updated")
+
+    def _on_channel_changed(self, event: ChangeEvent):
+        if event.op == OP_DELETE:
+            self.schedule_index.remove_channel(event.id)
+
+    def _on_listener_reconnect(self):
+        """Уведомления за время обрыва потеряны - перечитываем расписания целиком"""
+        self._loaded_at = None
+        self.schedule_index.changed.set()
+
+    async def _start_run(self, schedule: dict, fire_at: datetime, telegram_id: int, params: dict):
+        """Создает запись mailing_runs для рассылки
+
+        Returns:
+            RunProgress или None, если эта рассылка уже выполнялась (например, до перезапуска).
+        """
+        try:
+            run = await self.runs.start(schedule['id'], schedule['channel_id'], telegram_id, fire_at, params,
+                                        worker_id=self.worker_id)
+        except Exception as e:
+            logger.error(f"[SCHEDULER] Error recording mailing run for schedule {schedule['id']}: {e}")
+            if self.election is not None:
+                # Несколько реплик: без записи нельзя гарантировать, что рассылку не выполнит другая
+                return None
+            # Без записи рассылка все равно выполняется, но не сможет продолжиться после перезапуска
+            return RunProgress(params=params)
+
+        if run is None:
+            logger.warning(f"[SCHEDULER] Schedule {schedule['id']} at {fire_at} was already sent, skipping")
+        return run
+
+    async def send_to_channel(self, channel_id: int, schedule: dict, images_task: asyncio.Task = None,
+                              fire_at: datetime = None):
+        """Отправляет сообщения в канал
+
+        Args:
+            images_task: Генерация изображений, общая для всей группы рассылки.
+            fire_at: Запланированное время рассылки (ключ идемпотентности в mailing_runs).
+        """
+        try:
+            # telegram_id канала определен заранее (get_due_schedules или _resolve_targets),
+            # во время рассылки соединение с базой используется только для записи шагов
+            telegram_id = schedule.get('telegram_id')
+            if telegram_id is None:
+                logger.error(f"[SCHEDULER] Channel {channel_id} not found")
+                return
+
+            compiled = get_compiled_messages(schedule['id'], schedule.get('updated_at'), schedule['messages'])
+            params = self.mailing_service.mailing_params(schedule, compiled)
+            run = await self._start_run(schedule, fire_at or datetime.now(), telegram_id, params)
+            if run is None:
+                return
+
+            # Отправляем сообщение через mailing_service
+            await self.mailing_service.send_message_with_image(
+                channel_id=telegram_id,
+                messages=compiled,
+                message_delay_seconds=schedule['message_delay_seconds'],
+                image_delay_seconds=schedule['image_delay_seconds'],
+                images_count=params['images_count'],
+                bet_amount=params['bet_amount'],
+                welcome_to_first_signal_seconds=params['welcome_to_first_signal_seconds'],
+                signal_to_win_seconds=params['signal_to_win_seconds'],
+                between_signals_seconds=params['between_signals_seconds'],
+                last_signal_to_summary_seconds=params['last_signal_to_summary_seconds'],
+                template=params['template'],
+                images_task=images_task,
+                run=run
+            )
+            logger.info(f"[SCHEDULER] Successfully sent message to channel {channel_id}")
+
         except Exception as e:
             logger.error(f"[SCHEDULER] Error sending message to channel {channel_id}: {e}")
-        finally:
-            # Удаляем задачу из активных после завершения
-            if task_key in self.active_tasks:
-                del self.active_tasks[task_key]
+            # Ошибка попадет в отчет реестра задач (active_tasks)
+            raise
+
+    async def resume_interrupted_runs(self, include_own: bool = True):
+        """Продолжает рассылки, прерванные остановкой процесса, или отмечает их брошенными
+
+        Продолжаются рассылки не старше mailing_resume_minutes, каждая со следующего
+        неотправленного шага. При распределении по воркерам забираются и рассылки
+        выбывших воркеров.
+
+        Args:
+            include_own: Забирать ли рассылки этого процесса (только при запуске
+                цикла, когда своих рассылок в работе нет).
+        """
+        now = datetime.now()
+        busy_workers = set(self.shards.workers) if self.shards else set()
+        if include_own:
+            busy_workers.discard(self.worker_id)
+        else:
+            busy_workers.add(self.worker_id)
+        self._claimed_at = time.monotonic()
+        try:
+            runs = await self.runs.take_unfinished(
+                now, timedelta(minutes=self.config.mailing_resume_minutes),
+                worker_id=self.worker_id, busy_workers=busy_workers
+            )
+            if include_own:
+                purged = await self.runs.purge(now - timedelta(days=self.config.mailing_runs_keep_days))
+                if purged:
+                    logger.info(f"[SCHEDULER] Purged {purged} old mailing runs")
+        except Exception as e:
+            logger.error(f"[SCHEDULER] Error loading interrupted mailing runs: {e}")
+            return
+
+        for run in runs:
+            if run.schedule_id is not None:
+                self.fired.mark(run.schedule_id, run.fire_at)
+                task_key = mailing_task_key(run.schedule_id, run.fire_at)
+            else:
+                # Расписание удалено после запуска рассылки
+                task_key = f"run:{run.run_id}"
+            if self.active_tasks.is_running(task_key):
+                continue
+            logger.info(f"[SCHEDULER] Resuming interrupted mailing {task_key} (run {run.run_id})")
+            self.active_tasks.spawn(task_key, self.mailing_service.resume_run(run), on_done=self._on_mailing_done)
 
     async def check_and_execute_schedules(self):
-        """Проверяет и выполняет запланированные рассылки"""
+        """Выполняет рассылки, время которых наступило"""
         try:
             current_time = datetime.now()
-            logger.info(f"[SCHEDULER] Checking schedules at {current_time.strftime('%H:%M:%S')}")
-            
-            # Получаем все активные расписания
-            schedules = await self.mailing_service.get_active_schedules()
-            logger.info(f"[SCHEDULER] Found {len(schedules)} active schedules")
-            
-            # Группируем расписания по каналам
-            channel_schedules = {}
-            for schedule in schedules:
-                if schedule.channel_id not in channel_schedules:
-                    channel_schedules[schedule.channel_id] = []
-                channel_schedules[schedule.channel_id].append({
-                    'time': schedule.time_of_day.strftime('%H:%M'),
-                    'enabled': schedule.enabled,
-                    'messages': schedule.messages,
-                    'message_delay_seconds': schedule.message_delay_seconds,
-                    'image_delay_seconds': schedule.image_delay_seconds,
-                    'images_count': schedule.images_count,
-                    'bet_amount': schedule.bet_amount,
-                    'welcome_to_first_signal_seconds': schedule.welcome_to_first_signal_seconds,
-                    'signal_to_win_seconds': schedule.signal_to_win_seconds,
-                    'between_signals_seconds': schedule.between_signals_seconds,
-                    'last_signal_to_summary_seconds': schedule.last_signal_to_summary_seconds,
-                    'template': schedule.template
-                })
-            
-            tasks = []
-            for channel_id, schedules in channel_schedules.items():
-                logger.info(f"[SCHEDULER] Checking channel {channel_id}")
-                
-                for schedule in schedules:
-                    schedule_time = schedule['time']
-                    enabled = schedule['enabled']
-                    task_key = f"{channel_id}_{schedule_time}"
-                    
-                    logger.info(f"[SCHEDULER] Schedule item - time: {schedule_time}, enabled: {enabled}")
-                    
-                    if not schedule_time or not enabled:
-                        logger.info(f"[SCHEDULER] Skipping disabled or invalid schedule: {schedule}")
-                        continue
-                    
-                    # Проверяем, не выполняется ли уже эта рассылка
-                    if task_key in self.active_tasks:
-                        if not self.active_tasks[task_key].done():
-                            logger.info(f"[SCHEDULER] Task {task_key} is still running")
-                            continue
-                        else:
-                            del self.active_tasks[task_key]
-                    
-                    if self._should_execute(str(channel_id), schedule_time, current_time):
-                        logger.info(f"[SCHEDULER] Creating task for channel {channel_id} at {current_time.strftime('%H:%M:%S')}")
-                        # Создаем новую задачу
-                        task = asyncio.create_task(self.send_to_channel(channel_id, schedule))
-                        self.active_tasks[task_key] = task
-                        tasks.append(task)
-                    else:
-                        logger.info(f"[SCHEDULER] Schedule time {schedule_time} doesn't match current time {current_time.strftime('%H:%M:%S')}")
-            
-            # Ждем завершения всех новых задач
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
-                        
+            self._drop_stale_prerenders(current_time)
+            self.fired.evict(current_time)
+
+            # Запускаем предварительную генерацию для ближайших рассылок
+            for schedule, fire_at in self.schedule_index.pop_lead(current_time):
+                if self.shards and not self.shards.owns(schedule['channel_id']):
+                    continue
+                self._prerender(broadcast_group_key(schedule, fire_at), schedule, fire_at)
+
+            due = self.schedule_index.pop_due(current_time)
+            if self.shards:
+                due = self._take_owned(due) + await self._take_over_standby(current_time)
+            due += self._pop_catchup(current_time)
+
+            # Группируем рассылки с одинаковыми параметрами генерации: один рендер на группу
+            groups = {}
+            for schedule, fire_at in due:
+                groups.setdefault(broadcast_group_key(schedule, fire_at), []).append((schedule, fire_at))
+
+            await self._resolve_targets(groups.values())
+
+            for group_key, members in groups.items():
+                self._execute_group(group_key, members, current_time)
+
         except Exception as e:
             logger.error(f"Error checking schedules: {e}")
-            
+
+    def _take_owned(self, due: list) -> list:
+        """Оставляет рассылки каналов этого воркера, остальные откладывает на случай выбывания владельца"""
+        owned = []
+        takeover_delay = timedelta(seconds=min(self.shards.ttl, FIRE_GRACE_SECONDS / 2))
+        for schedule, fire_at in due:
+            if self.shards.owns(schedule['channel_id']):
+                owned.append((schedule, fire_at))
+            else:
+                self.standby.append((fire_at + takeover_delay, schedule, fire_at))
+        return owned
+
+    async def _take_over_standby(self, current_time: datetime) -> list:
+        """Забирает чужие рассылки, которые владелец не начал (выбыл или кольцо перестраивалось)"""
+        ready = [entry for entry in self.standby if entry[0] <= current_time]
+        if not ready:
+            return []
+        self.standby = [entry for entry in self.standby if entry[0] > current_time]
+
+        keys = {run_key(schedule['id'], fire_at): (schedule, fire_at) for _, schedule, fire_at in ready}
+        try:
+            started = await self.runs.started_keys(list(keys))
+        except Exception as e:
+            logger.error(f"[SCHEDULER] Error checking standby mailings: {e}")
+            return []
+
+        taken = [target for key, target in keys.items() if key not in started]
+        for schedule, fire_at in taken:
+            logger.warning(f"[SCHEDULER] Taking over schedule {schedule['id']} at {fire_at.strftime('%H:%M')}: "
+                           f"its worker did not start it")
+        return taken
+
+    async def _resolve_targets(self, groups):
+        """Одним запросом получает telegram_id каналов для расписаний, у которых его нет
+
+        Такие расписания попадают в индекс из обработчиков (модель Schedule без канала).
+        """
+        schedules = [schedule for members in groups for schedule, _ in members if schedule.get('telegram_id') is None]
+        if not schedules:
+            return
+
+        try:
+            telegram_ids = await self.mailing_service.get_channel_telegram_ids(
+                {schedule['channel_id'] for schedule in schedules}
+            )
+        except Exception as e:
+            logger.error(f"[SCHEDULER] Error resolving channels for due schedules: {e}")
+            return
+        for schedule in schedules:
+            # Запоминаем в индексе, чтобы не запрашивать на следующий день
+            schedule['telegram_id'] = telegram_ids.get(schedule['channel_id'])
+
+    def _execute_group(self, group_key: tuple, members: list, current_time: datetime):
+        """Запускает рассылку группы в каналы параллельно с общим набором изображений"""
+        images_task = None
+        prerendered = self.prerendered.pop(group_key, None)
+        if prerendered:
+            images_task = prerendered[0]
+
+        started = 0
+        for schedule, fire_at in members:
+            channel_id = schedule['channel_id']
+            task_key = mailing_task_key(schedule['id'], fire_at)
+
+            # Проверяем, не выполняется ли уже эта рассылка
+            if self.active_tasks.is_running(task_key):
+                logger.info(f"[SCHEDULER] Task {task_key} is still running")
+                continue
+
+            if self._should_execute(schedule, fire_at, current_time):
+                if images_task is None:
+                    images_task = self._render(schedule)
+                logger.info(f"[SCHEDULER] Creating task for channel {channel_id} at {current_time.strftime('%H:%M:%S')}")
+                # Запускаем рассылку в фоне, не дожидаясь ее завершения
+                self.active_tasks.spawn(task_key, self.send_to_channel(channel_id, schedule, images_task, fire_at),
+                                        on_done=self._on_mailing_done)
+                started += 1
+
+        if started > 1:
+            logger.info(f"[SCHEDULER] Broadcast group {group_key[1:]}: one image batch for {started} channels")
+        elif started == 0 and images_task is not None:
+            images_task.cancel()
+
+    def _on_mailing_done(self, task_key: str, task: asyncio.Task):
+        """Вызывается после завершения рассылки"""
+        logger.info(f"[SCHEDULER] Mailing {task_key} finished, mailings in progress: {len(self.active_tasks)}")
+        logger.debug(f"[SCHEDULER] Send retry stats: {self.mailing_service.retrier.stats.snapshot()}")
+        logger.debug(f"[SCHEDULER] Photo cache stats: {self.mailing_service.photo_cache.stats()}")
+        logger.debug(f"[SCHEDULER] Fire lateness stats: {self.lateness.snapshot()}")
+
+    async def _sleep_until_next(self):
+        """Спит до ближайшей рассылки или до изменения расписаний"""
+        next_wakeup = self.schedule_index.next_wakeup()
+        for pending in (self.standby, self.catchup):
+            if pending:
+                pending_at = min(entry[0] for entry in pending)
+                next_wakeup = pending_at if next_wakeup is None else min(next_wakeup, pending_at)
+        timeout = MAX_SLEEP_SECONDS
+        if self.shards:
+            # Прерванные рассылки выбывших воркеров проверяются раз в срок аренды
+            timeout = min(timeout, self.shards.ttl)
+        if next_wakeup is not None:
+            timeout = min(timeout, max(0.0, (next_wakeup - datetime.now()).total_seconds()))
+
+        try:
+            await asyncio.wait_for(self.schedule_index.changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.schedule_index.changed.clear()
+
     async def run(self):
-        """Запускает планировщик"""
+        """Запускает планировщик
+
+        С выбором лидера рассылки выполняет только реплика-лидер; при потере
+        лидерства ее незавершенные рассылки отменяются и продолжаются новым
+        лидером по записям mailing_runs.
+        """
+        if self.election is None:
+            await self._run_schedules()
+            return
+
         while True:
-            await self.check_and_execute_schedules()
-            await asyncio.sleep(30)  # Проверяем каждые 30 секунд
+            await self.election.wait_until_leader()
+            schedules_task = asyncio.create_task(self._run_schedules())
+            lost_task = asyncio.create_task(self.election.wait_until_follower())
+            try:
+                await asyncio.wait({schedules_task, lost_task}, return_when=asyncio.FIRST_COMPLETED)
+                lost = lost_task.done()
+            finally:
+                lost_task.cancel()
+                if not schedules_task.done():
+                    schedules_task.cancel()
+                    await asyncio.gather(schedules_task, return_exceptions=True)
+            if lost:
+                logger.warning("[SCHEDULER] Lost leadership, waiting to become leader again")
+                continue
+            # Цикл планировщика завершился сам (ошибкой) - пробрасываем ее
+            schedules_task.result()
+            return
+
+    async def _run_schedules(self):
+        """Цикл выполнения рассылок"""
+        try:
+            await self._seed_fired()
+            await self.resume_interrupted_runs()
+            await self.queue_missed_fires()
+            while True:
+                # Полная перезагрузка расписаний из базы: при старте и раз в schedule_reload_minutes
+                try:
+                    if self._loaded_at is None or (
+                            self._load_window > 0 and time.monotonic() - self._loaded_at >= self._load_window):
+                        await self.load_schedules()
+                except Exception as e:
+                    logger.error(f"[SCHEDULER] Error loading schedules: {e}")
+                    await asyncio.sleep(MAX_SLEEP_SECONDS)
+                    continue
+
+                if self.shards and time.monotonic() - self._claimed_at >= self.shards.ttl:
+                    await self.resume_interrupted_runs(include_own=False)
+
+                await self.check_and_execute_schedules()
+                await self._sleep_until_next()
+        finally:
+            # При остановке планировщика отменяем все незавершенные рассылки
+            await self.active_tasks.cancel_all()
+            for images_task, _ in self.prerendered.values():
+                images_task.cancel()
+            self.prerendered.clear()
+            self.standby.clear()
+            self.catchup.clear()
+            # Следующий запуск (например, после возврата лидерства) начнется с полной загрузки
+            self._loaded_at = None
+            logger.info(f"[SCHEDULER] Stopped, mailing stats: {self.active_tasks.stats()}")
@@ -0,0 +1,118 @@
+import bisect
+import hashlib
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, func, select
+
+from image_bot.config import get_config
+from image_bot.database.models import SchedulerLease
+from image_bot.services.leader_election import LeaderElection, process_id
+from image_bot.utils.logger import logger
+
+# Аренды воркеров в scheduler_leases называются "worker:<id процесса>"
+WORKER_LEASE_PREFIX = 'worker:'
+
+
+def stable_hash(value: str) -> int:
+    """Хеш, одинаковый во всех процессах (в отличие от встроенного hash())"""
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Консистентное хеширование: при изменении состава воркеров переезжает ~1/N ключей"""
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 64):
+        self.nodes = tuple(sorted(set(nodes)))
+        points = sorted(
+            (stable_hash(f"{node}#{replica}"), node)
+            for node in self.nodes for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """Воркер, отвечающий за ключ (None, если воркеров нет)"""
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, stable_hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class ShardMembership(LeaderElection):
+    """Участие воркера в распределении расписаний по каналам
+
+    Каждый воркер держит свою аренду "worker:<id>" в scheduler_leases (продление
+    как у LeaderElection) и после каждого продления перечитывает список живых
+    воркеров. Каналы распределяются между ними кольцом консистентного хеширования
+    по channel_id; при появлении или исчезновении воркера кольцо перестраивается.
+    Пока воркер не может продлить аренду, он считается выбывшим и не отвечает ни за
+    один канал. У каждого процесса своя строка аренды, поэтому при остановке она
+    удаляется, а строки упавших воркеров удаляются при продлении после истечения.
+    """
+
+    def __init__(self, session_factory, worker_id: str = None, ttl: float = 15, replicas: int = 64):
+        worker_id = worker_id or process_id()
+        super().__init__(session_factory, name=WORKER_LEASE_PREFIX + worker_id, holder=worker_id, ttl=ttl)
+        self.worker_id = worker_id
+        self.replicas = replicas
+        self.ring = HashRing((), replicas)
+
+    @property
+    def workers(self) -> tuple:
+        """Живые воркеры на момент последнего продления аренды"""
+        return self.ring.nodes
+
+    def owns(self, channel_id: int) -> bool:
+        return self.is_leader and self.ring.owner(str(channel_id)) == self.worker_id
+
+    async def live_workers(self) -> list:
+        """Удаляет истекшие аренды воркеров и возвращает живых"""
+        async with self.session_factory() as session:
+            await session.execute(
+                delete(SchedulerLease)
+                .where(SchedulerLease.name.startswith(WORKER_LEASE_PREFIX), SchedulerLease.expires_at < func.now())
+            )
+            await session.commit()
+            result = await session.execute(
+                select(SchedulerLease.holder)
+                .where(SchedulerLease.name.startswith(WORKER_LEASE_PREFIX), SchedulerLease.expires_at > func.now())
+            )
+            return result.scalars().all()
+
+    async def try_acquire(self) -> bool:
+        acquired = await super().try_acquire()
+        if acquired:
+            self._rebalance(await self.live_workers())
+        return acquired
+
+    async def release(self):
+        """Удаляет аренду воркера: id процесса после перезапуска будет другим"""
+        self._set_leader(False)
+        async with self.session_factory() as session:
+            await session.execute(
+                delete(SchedulerLease)
+                .where(SchedulerLease.name == self.name, SchedulerLease.holder == self.holder)
+            )
+            await session.commit()
+
+    def _rebalance(self, workers):
+        workers = set(workers) | {self.worker_id}
+        if workers == set(self.ring.nodes):
+            return
+        previous = len(self.ring.nodes)
+        self.ring = HashRing(workers, self.replicas)
+        logger.info(f"[SHARDING] Workers changed ({previous} -> {len(workers)}), rebalanced channels: {sorted(workers)}")
+
+    def _set_leader(self, leader: bool):
+        super()._set_leader(leader)
+        if not leader:
+            self.ring = HashRing((), self.replicas)
+
+
+@lru_cache(maxsize=None)
+def get_shard_membership() -> ShardMembership:
+    """Возвращает общее для процесса участие в распределении расписаний"""
+    from image_bot.database.base import Session
+    config = get_config()
+    return ShardMembership(Session, ttl=config.leader_lease_seconds, replicas=config.shard_virtual_nodes)
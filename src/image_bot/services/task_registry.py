@@ -0,0 +1,91 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+from image_bot.utils.logger import logger
+
+
+class TaskRegistry:
+    """Реестр фоновых задач: запуск без ожидания, отслеживание, отмена и отчеты об ошибках"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks = {}  # ключ -> asyncio.Task
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.is_running(key)
+
+    def is_running(self, key: Hashable) -> bool:
+        task = self._tasks.get(key)
+        return task is not None and not task.done()
+
+    def keys(self):
+        return list(self._tasks)
+
+    def spawn(self, key: Hashable, coro: Awaitable,
+              on_done: Callable[[Hashable, asyncio.Task], None] = None) -> asyncio.Task:
+        """Запускает задачу в фоне и сразу возвращает управление
+
+        Args:
+            key: Ключ задачи. Если задача с таким ключом еще выполняется, выбрасывается ValueError.
+            on_done: Callback (key, task), вызывается после завершения задачи.
+        """
+        if self.is_running(key):
+            coro.close()
+            raise ValueError(f"Task {key} is already running")
+
+        task = asyncio.create_task(coro, name=f"{self.name}:{key}")
+        self._tasks[key] = task
+        self.started += 1
+        task.add_done_callback(lambda finished: self._on_task_done(key, finished, on_done))
+        return task
+
+    def _on_task_done(self, key: Hashable, task: asyncio.Task, on_done):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+        if task.cancelled():
+            self.cancelled += 1
+            logger.info(f"[{self.name.upper()}] Task {key} cancelled")
+        elif task.exception() is not None:
+            self.failed += 1
+            logger.opt(exception=task.exception()).error(f"[{self.name.upper()}] Task {key} failed")
+        else:
+            self.completed += 1
+
+        if on_done is not None:
+            try:
+                on_done(key, task)
+            except Exception as e:
+                logger.error(f"[{self.name.upper()}] Error in completion callback for {key}: {e}")
+
+    def cancel(self, key: Hashable) -> bool:
+        """Отменяет задачу по ключу"""
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    async def cancel_all(self):
+        """Отменяет все задачи и ждет их завершения"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            'running': len(self._tasks),
+            'started': self.started,
+            'completed': self.completed,
+            'failed': self.failed,
+            'cancelled': self.cancelled
+        }
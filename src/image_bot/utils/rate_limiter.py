@@ -0,0 +1,133 @@
+import asyncio
+import time
+from datetime import timedelta
+from typing import Any, Optional
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from image_bot.utils.logger import logger
+
+# Приоритеты запросов: интерактивные ответы админам и массовые рассылки в каналы
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+
+# rate_limit_args для отправок из MailingService
+BULK_RATE_LIMIT_ARGS = {"priority": PRIORITY_BULK}
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """Возвращает RetryAfter.retry_after в секундах (int или timedelta в разных версиях PTB)"""
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float, reserve: float = 0) -> float:
+        """Сколько секунд ждать, пока появится токен сверх reserve"""
+        self._refill(now)
+        missing = 1 + reserve - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def consume(self):
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class TelegramRateLimiter(BaseRateLimiter[dict]):
+    """Ограничитель запросов к Bot API: общий лимит, лимит на группу/канал и RetryAfter
+
+    Массовые запросы (priority=bulk) оставляют в общем bucket резерв токенов,
+    поэтому интерактивные ответы пользователям не ждут, пока разойдется очередь рассылок.
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate_per_minute: float = 20,
+                 interactive_reserve: float = 5, max_retries: int = 3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate_per_minute / 60
+        self.chat_capacity = chat_rate_per_minute
+        self.interactive_reserve = interactive_reserve
+        self.max_retries = max_retries
+        self.chat_buckets = {}  # chat_id -> TokenBucket
+        self._paused_until = 0.0  # Общая пауза после RetryAfter
+        self._lock = asyncio.Lock()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @staticmethod
+    def _is_group_chat(chat_id) -> bool:
+        """Лимит 20 сообщений в минуту действует для групп и каналов"""
+        if isinstance(chat_id, str):
+            return chat_id.startswith('@') or chat_id.startswith('-')
+        return isinstance(chat_id, int) and chat_id < 0
+
+    def _chat_bucket(self, chat_id, now: float) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= 1000:
+                # Удаляем заполненные (давно неиспользуемые) buckets
+                self.chat_buckets = {
+                    key: value for key, value in self.chat_buckets.items() if not value.is_full(now)
+                }
+            bucket = TokenBucket(self.chat_rate, self.chat_capacity)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id, priority: str):
+        reserve = self.interactive_reserve if priority == PRIORITY_BULK else 0
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                chat_bucket = self._chat_bucket(chat_id, now) if self._is_group_chat(chat_id) else None
+                wait = max(
+                    self._paused_until - now,
+                    self.global_bucket.delay(now, reserve),
+                    chat_bucket.delay(now) if chat_bucket else 0.0
+                )
+                if wait <= 0:
+                    self.global_bucket.consume()
+                    if chat_bucket:
+                        chat_bucket.consume()
+                    return
+            await asyncio.sleep(wait)
+
+    async def process_request(self, callback, args, kwargs, endpoint: str,
+                              data: dict[str, Any], rate_limit_args: Optional[dict]):
+        priority = (rate_limit_args or {}).get("priority", PRIORITY_INTERACTIVE)
+        chat_id = data.get("chat_id")
+
+        attempt = 0
+        while True:
+            await self._acquire(chat_id, priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                attempt += 1
+                retry_after = retry_after_seconds(e)
+                logger.warning(f"[RATE LIMIT] {endpoint} to {chat_id}: flood control, retry in {retry_after}s "
+                               f"(attempt {attempt}/{self.max_retries})")
+                # Ставим на паузу все запросы - лимит общий для бота
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                if attempt >= self.max_retries:
+                    raise
@@ -0,0 +1,138 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from telegram.error import BadRequest, ChatMigrated, Forbidden, InvalidToken, NetworkError, RetryAfter, TimedOut
+
+from image_bot.utils.logger import logger
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Параметры повторных попыток для одного вида запросов"""
+    max_attempts: int = 4
+    attempt_timeout: float = 15  # таймаут HTTP-запроса одной попытки (без ожидания в ограничителе), секунд
+    deadline: float = 90  # после этого времени от первой попытки новые не начинаются, секунд
+    base_delay: float = 1  # задержка перед второй попыткой
+    max_delay: float = 20
+    jitter: float = 0.5  # доля случайного разброса задержки
+    idempotent: bool = False  # можно ли повторять запрос, который мог дойти до Telegram
+
+    @property
+    def request_timeouts(self) -> dict:
+        """Таймауты для метода Bot API: действуют на сам HTTP-запрос, а не на очередь ограничителя"""
+        return {'read_timeout': self.attempt_timeout, 'write_timeout': self.attempt_timeout}
+
+
+# Политики для рассылок: фото загружается дольше текста
+TEXT_POLICY = RetryPolicy(attempt_timeout=15)
+PHOTO_POLICY = RetryPolicy(attempt_timeout=30, deadline=150)
+
+
+def request_not_sent(error: BaseException) -> bool:
+    """Таймаут наступил до отправки запроса (нет соединения из пула или не удалось подключиться)"""
+    return isinstance(error.__cause__, (httpx.PoolTimeout, httpx.ConnectTimeout))
+
+
+def is_retryable(error: BaseException, policy: RetryPolicy = TEXT_POLICY) -> bool:
+    """Можно ли повторить запрос после этой ошибки
+
+    Сетевые ошибки временные. RetryAfter уже повторил TelegramRateLimiter - повторять
+    его второй раз здесь нельзя. Таймаут отправки сообщения повторяется, только если
+    запрос точно не ушел: иначе сообщение могло быть доставлено и появится дважды.
+    BadRequest (тоже NetworkError), Forbidden (бот удален из канала), неверный токен
+    и миграция чата не повторяются.
+    """
+    if isinstance(error, (BadRequest, Forbidden, InvalidToken, ChatMigrated, RetryAfter)):
+        return False
+    if isinstance(error, (TimedOut, asyncio.TimeoutError)):
+        return policy.idempotent or request_not_sent(error)
+    return isinstance(error, NetworkError)
+
+
+def backoff_delay(policy: RetryPolicy, attempt: int) -> float:
+    """Задержка перед попыткой attempt + 1: экспонента с jitter"""
+    delay = min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1))
+    return delay * random.uniform(1 - policy.jitter, 1 + policy.jitter)
+
+
+class RetryStats:
+    """Счетчики запросов и повторов по видам операций"""
+
+    def __init__(self):
+        self.counters = defaultdict(lambda: defaultdict(int))  # операция -> счетчик -> значение
+
+    def add(self, operation: str, counter: str, value: int = 1):
+        self.counters[operation][counter] += value
+
+    def snapshot(self) -> dict:
+        return {operation: dict(counters) for operation, counters in self.counters.items()}
+
+
+class Retrier:
+    """Выполняет запросы к Bot API с повторами по политике
+
+    Первая попытка выполняется сразу, поэтому на успешный путь задержка не добавляется.
+    Таймаут попытки задает сам запрос (policy.request_timeouts), чтобы время ожидания
+    в TelegramRateLimiter не считалось временем попытки.
+    """
+
+    def __init__(self, name: str = "send"):
+        self.name = name
+        self.stats = RetryStats()
+
+    async def call(self, operation: str, request: Callable[[], Awaitable],
+                   policy: RetryPolicy = TEXT_POLICY):
+        """Выполняет request() с повторами и возвращает его результат
+
+        Args:
+            operation: Название операции для логов и метрик (например "welcome").
+            request: Функция без аргументов, создающая новую корутину запроса для каждой попытки
+                (с таймаутами policy.request_timeouts).
+
+        Raises:
+            Последнюю ошибку, если запрос так и не удался.
+        """
+        started = time.monotonic()
+        self.stats.add(operation, 'calls')
+        attempt = 0
+        while True:
+            attempt += 1
+            self.stats.add(operation, 'attempts')
+            try:
+                result = await request()
+                self.stats.add(operation, 'succeeded')
+                if attempt > 1:
+                    logger.info(f"[{self.name.upper()}] {operation} succeeded on attempt {attempt}")
+                return result
+            except Exception as e:
+                error_name = type(e).__name__
+                if not is_retryable(e, policy):
+                    self.stats.add(operation, 'fatal')
+                    logger.error(f"[{self.name.upper()}] {operation} failed with non-retryable {error_name}: {e}")
+                    raise
+
+                delay = backoff_delay(policy, attempt)
+                elapsed = time.monotonic() - started
+                if attempt >= policy.max_attempts or elapsed + delay >= policy.deadline:
+                    self.stats.add(operation, 'exhausted')
+                    logger.error(f"[{self.name.upper()}] {operation} failed after {attempt} attempts "
+                                 f"({elapsed:.1f}s): {error_name} {e}")
+                    raise
+
+                self.stats.add(operation, 'retries')
+                logger.warning(f"[{self.name.upper()}] {operation}: {error_name} {e}, "
+                               f"retry {attempt}/{policy.max_attempts - 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def call_or_none(self, operation: str, request: Callable[[], Awaitable],
+                           policy: RetryPolicy = TEXT_POLICY) -> Optional[object]:
+        """Как call(), но вместо исключения возвращает None (ошибка уже залогирована)"""
+        try:
+            return await self.call(operation, request, policy)
+        except Exception:
+            return None
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Пакет лежит в src/ и не устанавливается для тестов
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
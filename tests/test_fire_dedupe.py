@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+from image_bot.services.fire_dedupe import FireDedupe, mailing_task_key
+
+FIRE_AT = datetime(2026, 10, 17, 9, 0)
+
+
+def test_mark_rejects_repeated_fire_within_same_minute():
+    dedupe = FireDedupe()
+    assert dedupe.mark(1, FIRE_AT)
+    assert not dedupe.mark(1, FIRE_AT + timedelta(seconds=20))
+    assert dedupe.seen(1, FIRE_AT)
+
+
+def test_different_schedules_and_days_are_separate_fires():
+    dedupe = FireDedupe()
+    assert dedupe.mark(1, FIRE_AT)
+    assert dedupe.mark(2, FIRE_AT)
+    assert dedupe.mark(1, FIRE_AT + timedelta(days=1))
+    assert len(dedupe) == 3
+
+
+def test_evict_drops_fires_older_than_ttl():
+    dedupe = FireDedupe(ttl=timedelta(hours=26))
+    dedupe.mark(1, FIRE_AT)
+    dedupe.mark(2, FIRE_AT + timedelta(hours=2))
+
+    dedupe.evict(FIRE_AT + timedelta(hours=27))
+    assert not dedupe.seen(1, FIRE_AT)
+    assert dedupe.seen(2, FIRE_AT + timedelta(hours=2))
+    assert dedupe.evicted == 1
+
+
+def test_max_entries_evicts_oldest_fire():
+    dedupe = FireDedupe(max_entries=2)
+    for schedule_id in (1, 2, 3):
+        dedupe.mark(schedule_id, FIRE_AT + timedelta(minutes=schedule_id))
+
+    assert len(dedupe) == 2
+    assert not dedupe.seen(1, FIRE_AT + timedelta(minutes=1))
+    assert dedupe.evicted == 1
+
+
+def test_seed_marks_saved_fires_in_time_order_and_ignores_deleted_schedules():
+    dedupe = FireDedupe()
+    dedupe.seed([(2, FIRE_AT + timedelta(hours=1)), (None, FIRE_AT), (1, FIRE_AT)])
+
+    assert len(dedupe) == 2
+    assert not dedupe.mark(1, FIRE_AT)
+    dedupe.evict(FIRE_AT + timedelta(hours=26, minutes=30))
+    assert dedupe.seen(2, FIRE_AT + timedelta(hours=1))
+    assert not dedupe.seen(1, FIRE_AT)
+
+
+def test_mailing_task_key_includes_date():
+    assert mailing_task_key(5, FIRE_AT) != mailing_task_key(5, FIRE_AT + timedelta(days=1))
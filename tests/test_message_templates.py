@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from image_bot.services.message_templates import (
+    FALLBACK_SIGNAL, FALLBACK_SUMMARY, TemplateError, compile_messages, forget_compiled_messages,
+    get_compiled_messages, normalize_messages
+)
+
+MESSAGES = ["Привет {всем}", "Сигнал: {main_number} / {average:.2f}", "Итого: {total}\n{results}"]
+
+
+def test_compile_messages_renders_templates():
+    compiled = compile_messages(MESSAGES)
+    assert compiled.welcome == "Привет {всем}"
+    assert compiled.signal.render(main_number=3, average=1.5) == "Сигнал: 3 / 1.50"
+    assert compiled.summary.render(total=10, results="x") == "Итого: 10\nx"
+    assert compiled.messages == MESSAGES
+
+
+@pytest.mark.parametrize('signal', ["{unknown}", "{main_number", "{average:{main_number}}", "{total}"])
+def test_compile_messages_rejects_invalid_signal_template(signal):
+    with pytest.raises(TemplateError):
+        compile_messages([MESSAGES[0], signal, MESSAGES[2]])
+
+
+def test_compile_messages_rejects_invalid_summary_template():
+    with pytest.raises(TemplateError, match='main_number'):
+        compile_messages([MESSAGES[0], MESSAGES[1], "{main_number}"])
+
+
+def test_non_strict_compile_uses_fallback_templates():
+    compiled = compile_messages(["", "{unknown}", "{"], strict=False)
+    assert compiled.signal.source == FALLBACK_SIGNAL
+    assert compiled.summary.source == FALLBACK_SUMMARY
+
+
+@pytest.mark.parametrize('messages', [["a", "b"], ["a", "b", "c", "d"], json.dumps({"a": 1})])
+def test_messages_must_be_exactly_three(messages):
+    with pytest.raises(TemplateError):
+        normalize_messages(messages)
+
+
+def test_legacy_json_string_is_parsed():
+    assert normalize_messages(json.dumps(["a", "b", "c"])) == ["a", "b", "c"]
+
+
+def test_legacy_plain_string_becomes_welcome():
+    assert normalize_messages("[VIP] привет") == ["[VIP] привет", "", ""]
+
+
+def test_compiled_messages_are_cached_until_schedule_changes():
+    first = get_compiled_messages(1001, 'v1', MESSAGES)
+    assert get_compiled_messages(1001, 'v1', ["changed", "", ""]) is first
+    assert get_compiled_messages(1001, 'v2', ["changed", "", ""]).welcome == "changed"
+    forget_compiled_messages(1001)
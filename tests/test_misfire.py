@@ -0,0 +1,92 @@
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+
+from image_bot.services.misfire import (
+    POLICY_FIRE_LATE, POLICY_NEXT_SLOT, POLICY_SKIP, missed_fire, resolve_misfire, validate_misfire
+)
+
+FIRE_AT = datetime(2026, 10, 17, 10, 15)
+GRACE = timedelta(hours=4)
+
+
+@pytest.mark.parametrize('policy', [POLICY_SKIP, POLICY_FIRE_LATE, POLICY_NEXT_SLOT])
+def test_small_lateness_is_on_time_for_every_policy(policy):
+    now = FIRE_AT + timedelta(seconds=20)
+    assert resolve_misfire(policy, FIRE_AT, now, GRACE) == now
+
+
+def test_skip_drops_late_fire():
+    assert resolve_misfire(POLICY_SKIP, FIRE_AT, FIRE_AT + timedelta(minutes=5), GRACE) is None
+
+
+def test_fire_late_within_grace_fires_now():
+    now = FIRE_AT + timedelta(hours=1)
+    assert resolve_misfire(POLICY_FIRE_LATE, FIRE_AT, now, GRACE) == now
+
+
+def test_fire_late_beyond_grace_is_skipped():
+    assert resolve_misfire(POLICY_FIRE_LATE, FIRE_AT, FIRE_AT + GRACE + timedelta(seconds=1), GRACE) is None
+
+
+def test_next_slot_defers_to_next_hour_keeping_minute():
+    now = datetime(2026, 10, 17, 12, 40)
+    assert resolve_misfire(POLICY_NEXT_SLOT, FIRE_AT, now, GRACE) == datetime(2026, 10, 17, 13, 15)
+
+
+def test_next_slot_fires_now_when_slot_just_started():
+    now = datetime(2026, 10, 17, 12, 15, 10)
+    assert resolve_misfire(POLICY_NEXT_SLOT, FIRE_AT, now, GRACE) == now
+
+
+def test_next_slot_beyond_grace_is_skipped():
+    now = datetime(2026, 10, 17, 12, 40)
+    assert resolve_misfire(POLICY_NEXT_SLOT, FIRE_AT, now, timedelta(hours=2)) is None
+
+
+@pytest.mark.parametrize('policy, grace', [
+    ('unknown', 0),
+    (POLICY_FIRE_LATE, -1),
+    (POLICY_NEXT_SLOT, 3599),
+])
+def test_validate_misfire_rejects_invalid_settings(policy, grace):
+    with pytest.raises(ValueError):
+        validate_misfire(policy, grace)
+
+
+def test_validate_misfire_accepts_next_slot_with_full_slot_grace():
+    assert validate_misfire(POLICY_NEXT_SLOT, 3600) == POLICY_NEXT_SLOT
+
+
+def schedule(**values):
+    return {'time_of_day': time(9, 0), 'last_fired_at': None, 'created_at': datetime(2026, 10, 1), **values}
+
+
+def test_missed_fire_returns_todays_slot():
+    now = datetime(2026, 10, 17, 10, 0)
+    assert missed_fire(schedule(last_fired_at=datetime(2026, 10, 16, 9, 0)), now) == datetime(2026, 10, 17, 9, 0)
+
+
+def test_missed_fire_uses_yesterday_before_todays_time():
+    now = datetime(2026, 10, 17, 8, 0)
+    assert missed_fire(schedule(), now) == datetime(2026, 10, 16, 9, 0)
+
+
+def test_missed_fire_ignores_already_fired_slot():
+    now = datetime(2026, 10, 17, 10, 0)
+    assert missed_fire(schedule(last_fired_at=datetime(2026, 10, 17, 9, 0)), now) is None
+
+
+def test_missed_fire_ignores_slot_still_within_grace():
+    assert missed_fire(schedule(), datetime(2026, 10, 17, 9, 0, 20)) is None
+
+
+def test_missed_fire_ignores_schedule_created_after_slot():
+    now = datetime(2026, 10, 17, 10, 0)
+    assert missed_fire(schedule(created_at=datetime(2026, 10, 17, 9, 30)), now) is None
+
+
+def test_missed_fire_converts_aware_created_at_to_local_time():
+    now = datetime(2026, 10, 17, 10, 0)
+    created_at = datetime(2026, 10, 17, 9, 30).astimezone(timezone.utc)
+    assert missed_fire(schedule(created_at=created_at), now) is None
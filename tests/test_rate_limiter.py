@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import pytest
+
+from image_bot.utils.rate_limiter import PRIORITY_BULK, PRIORITY_INTERACTIVE, TelegramRateLimiter, TokenBucket
+
+
+def bucket(rate: float, capacity: float, now: float = 100.0) -> TokenBucket:
+    token_bucket = TokenBucket(rate, capacity)
+    token_bucket.updated = now
+    return token_bucket
+
+
+def test_full_bucket_allows_burst_up_to_capacity():
+    token_bucket = bucket(rate=1, capacity=3)
+    for _ in range(3):
+        assert token_bucket.delay(100.0) == 0
+        token_bucket.consume()
+    assert token_bucket.delay(100.0) == pytest.approx(1.0)
+
+
+def test_tokens_refill_at_rate_and_cap_at_capacity():
+    token_bucket = bucket(rate=2, capacity=4)
+    for _ in range(4):
+        token_bucket.consume()
+
+    assert token_bucket.delay(100.25) == pytest.approx(0.25)
+    assert token_bucket.delay(100.5) == 0
+    assert not token_bucket.is_full(101.0)
+    assert token_bucket.is_full(102.0)
+    token_bucket.delay(200.0)
+    assert token_bucket.tokens == 4
+
+
+def test_reserve_keeps_tokens_for_interactive_requests():
+    token_bucket = bucket(rate=10, capacity=10)
+    for _ in range(5):
+        token_bucket.consume()
+
+    assert token_bucket.delay(100.0) == 0
+    assert token_bucket.delay(100.0, reserve=5) == pytest.approx(0.1)
+
+
+@pytest.mark.parametrize('chat_id, expected', [
+    (-1001234567890, True), ('@channel', True), ('-100123', True), (12345, False), ('12345', False), (None, False),
+])
+def test_only_groups_and_channels_get_chat_limit(chat_id, expected):
+    assert TelegramRateLimiter._is_group_chat(chat_id) is expected
+
+
+def test_bulk_request_waits_for_reserve_while_interactive_passes():
+    async def scenario():
+        limiter = TelegramRateLimiter(global_rate=10, interactive_reserve=5)
+        limiter.global_bucket.tokens = 5.5
+        start = time.monotonic()
+        await limiter._acquire(12345, PRIORITY_INTERACTIVE)
+        interactive = time.monotonic() - start
+        await limiter._acquire(12345, PRIORITY_BULK)
+        return interactive, time.monotonic() - start
+
+    interactive, bulk = asyncio.run(scenario())
+    assert interactive < 0.05
+    assert bulk >= 0.1
@@ -0,0 +1,43 @@
+import asyncio
+
+import httpx
+import pytest
+from telegram.error import BadRequest, ChatMigrated, Forbidden, InvalidToken, NetworkError, RetryAfter, TimedOut
+
+from image_bot.utils.retry import PHOTO_POLICY, TEXT_POLICY, RetryPolicy, is_retryable
+
+
+def timed_out(cause: BaseException = None) -> TimedOut:
+    error = TimedOut()
+    error.__cause__ = cause
+    return error
+
+
+@pytest.mark.parametrize('error', [
+    BadRequest("Chat not found"), Forbidden("bot was kicked"), InvalidToken(), ChatMigrated(-100123), RetryAfter(5),
+])
+def test_permanent_errors_are_not_retried(error):
+    assert not is_retryable(error, TEXT_POLICY)
+
+
+def test_network_error_is_retried():
+    assert is_retryable(NetworkError("Connection reset"), TEXT_POLICY)
+
+
+@pytest.mark.parametrize('error', [timed_out(), timed_out(httpx.ReadTimeout("read")), asyncio.TimeoutError()])
+def test_timeout_after_sending_is_not_retried_for_sends(error):
+    assert not is_retryable(error, TEXT_POLICY)
+    assert not is_retryable(error, PHOTO_POLICY)
+
+
+@pytest.mark.parametrize('cause', [httpx.PoolTimeout("pool"), httpx.ConnectTimeout("connect")])
+def test_timeout_before_sending_is_retried(cause):
+    assert is_retryable(timed_out(cause), TEXT_POLICY)
+
+
+def test_idempotent_policy_retries_any_timeout():
+    assert is_retryable(timed_out(httpx.ReadTimeout("read")), RetryPolicy(idempotent=True))
+
+
+def test_unrelated_errors_are_not_retried():
+    assert not is_retryable(ValueError("bad"), TEXT_POLICY)
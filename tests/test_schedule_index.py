@@ -0,0 +1,99 @@
+from datetime import datetime, time, timedelta
+
+from image_bot.services.schedule_index import ScheduleIndex, next_fire_time
+
+
+def payload(schedule_id: int, time_of_day: time, **values) -> dict:
+    return {'id': schedule_id, 'channel_id': 1, 'telegram_id': -100, 'enabled': True,
+            'time_of_day': time_of_day, **values}
+
+
+def test_next_fire_time_keeps_today_within_grace():
+    now = datetime(2026, 10, 17, 9, 0, 20)
+    assert next_fire_time(time(9, 0), now) == datetime(2026, 10, 17, 9, 0)
+
+
+def test_next_fire_time_moves_past_time_to_tomorrow():
+    now = datetime(2026, 10, 17, 9, 1)
+    assert next_fire_time(time(9, 0), now) == datetime(2026, 10, 18, 9, 0)
+
+
+def test_pop_due_returns_due_schedules_in_order_and_reschedules_them():
+    now = datetime(2026, 10, 17, 8, 0)
+    index = ScheduleIndex()
+    index.load([payload(1, time(9, 30)), payload(2, time(9, 0)), payload(3, time(12, 0))], now)
+
+    assert index.pop_due(datetime(2026, 10, 17, 8, 59)) == []
+    due = index.pop_due(datetime(2026, 10, 17, 9, 30))
+    assert [(schedule['id'], fire_at) for schedule, fire_at in due] == [
+        (2, datetime(2026, 10, 17, 9, 0)),
+        (1, datetime(2026, 10, 17, 9, 30)),
+    ]
+    assert index.pop_due(datetime(2026, 10, 17, 9, 30)) == []
+    assert index.next_wakeup() == datetime(2026, 10, 17, 12, 0)
+
+
+def test_pop_due_wraps_past_midnight():
+    index = ScheduleIndex()
+    index.load([payload(1, time(0, 5))], datetime(2026, 10, 17, 23, 58))
+
+    assert index.next_wakeup() == datetime(2026, 10, 18, 0, 5)
+    assert index.pop_due(datetime(2026, 10, 17, 23, 59, 59)) == []
+    due = index.pop_due(datetime(2026, 10, 18, 0, 5))
+    assert [fire_at for _, fire_at in due] == [datetime(2026, 10, 18, 0, 5)]
+    assert index.next_wakeup() == datetime(2026, 10, 19, 0, 5)
+
+
+def test_pop_due_skips_removed_and_rescheduled_entries():
+    now = datetime(2026, 10, 17, 8, 0)
+    index = ScheduleIndex()
+    index.load([payload(1, time(9, 0)), payload(2, time(9, 0))], now)
+    index.remove(1)
+    index.upsert(payload(2, time(10, 0)), now)
+
+    assert index.pop_due(datetime(2026, 10, 17, 9, 30)) == []
+    due = index.pop_due(datetime(2026, 10, 17, 10, 0))
+    assert [(schedule['id'], fire_at) for schedule, fire_at in due] == [(2, datetime(2026, 10, 17, 10, 0))]
+
+
+def test_upsert_with_same_time_keeps_pending_fire():
+    now = datetime(2026, 10, 17, 8, 0)
+    index = ScheduleIndex()
+    index.load([payload(1, time(9, 0))], now)
+    index.pop_due(datetime(2026, 10, 17, 9, 0))
+
+    # Сохранение расписания сразу после срабатывания не планирует его повторно на сегодня
+    index.upsert(payload(1, time(9, 0), bet_amount=10), datetime(2026, 10, 17, 9, 0, 5))
+    assert index.pop_due(datetime(2026, 10, 17, 9, 0, 10)) == []
+    assert index.schedules[1]['bet_amount'] == 10
+
+
+def test_pop_lead_returns_schedules_lead_before_fire():
+    index = ScheduleIndex(lead=timedelta(minutes=10))
+    index.load([payload(1, time(9, 0))], datetime(2026, 10, 17, 8, 0))
+
+    assert index.next_wakeup() == datetime(2026, 10, 17, 8, 50)
+    assert index.pop_lead(datetime(2026, 10, 17, 8, 49)) == []
+    lead = index.pop_lead(datetime(2026, 10, 17, 8, 50))
+    assert [(schedule['id'], fire_at) for schedule, fire_at in lead] == [(1, datetime(2026, 10, 17, 9, 0))]
+    assert index.pop_lead(datetime(2026, 10, 17, 8, 55)) == []
+
+
+def test_pop_lead_wraps_past_midnight():
+    index = ScheduleIndex(lead=timedelta(minutes=10))
+    index.load([payload(1, time(0, 5))], datetime(2026, 10, 17, 23, 0))
+
+    lead = index.pop_lead(datetime(2026, 10, 17, 23, 55))
+    assert [fire_at for _, fire_at in lead] == [datetime(2026, 10, 18, 0, 5)]
+    index.pop_due(datetime(2026, 10, 18, 0, 5))
+    assert index.pop_lead(datetime(2026, 10, 18, 23, 54)) == []
+    assert [fire_at for _, fire_at in index.pop_lead(datetime(2026, 10, 18, 23, 55))] == [datetime(2026, 10, 19, 0, 5)]
+
+
+def test_load_with_window_keeps_schedules_outside_window():
+    now = datetime(2026, 10, 17, 8, 0)
+    index = ScheduleIndex()
+    index.load([payload(1, time(9, 0)), payload(2, time(20, 0))], now)
+
+    index.load([], now, window_end=datetime(2026, 10, 17, 12, 0))
+    assert set(index.schedules) == {2}
@@ -0,0 +1,44 @@
+from image_bot.services.sharding import HashRing
+
+KEYS = [str(channel_id) for channel_id in range(1, 2001)]
+
+
+def owners(ring: HashRing) -> dict:
+    return {key: ring.owner(key) for key in KEYS}
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing().owner('1') is None
+
+
+def test_ring_is_independent_of_node_order():
+    assert owners(HashRing(['a', 'b', 'c'])) == owners(HashRing(['c', 'a', 'b', 'a']))
+
+
+def test_keys_are_spread_across_nodes():
+    counts = {}
+    for owner in owners(HashRing(['a', 'b', 'c', 'd'])).values():
+        counts[owner] = counts.get(owner, 0) + 1
+    assert set(counts) == {'a', 'b', 'c', 'd'}
+    assert min(counts.values()) > len(KEYS) / 4 / 2
+
+
+def test_added_node_takes_keys_only_from_others():
+    before = owners(HashRing(['a', 'b', 'c']))
+    after = owners(HashRing(['a', 'b', 'c', 'd']))
+
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == 'd' for key in moved)
+    # Переезжает примерно 1/N ключей
+    assert len(KEYS) / 8 < len(moved) < len(KEYS) / 2
+
+
+def test_removed_node_gives_away_only_its_keys():
+    before = owners(HashRing(['a', 'b', 'c', 'd']))
+    after = owners(HashRing(['a', 'b', 'c']))
+
+    for key in KEYS:
+        if before[key] != 'd':
+            assert after[key] == before[key]
+        else:
+            assert after[key] in {'a', 'b', 'c'}